@@ -1,10 +1,16 @@
-from fastapi import APIRouter
-from app.api.routes import meals, meal_plans, meal_ratings, auth
+from fastapi import APIRouter, Depends
+from app.api.routes import meals, meal_plans, meal_plan_templates, meal_ratings, sync, events, batch, transfer, auth
+from app.db.diagnostics import track_route
 
-api_router = APIRouter()
+api_router = APIRouter(dependencies=[Depends(track_route)])
 api_router.include_router(meals.router)
 api_router.include_router(meal_plans.router)
+api_router.include_router(meal_plan_templates.router)
 api_router.include_router(meal_ratings.router)
+api_router.include_router(sync.router)
+api_router.include_router(events.router)
+api_router.include_router(batch.router)
+api_router.include_router(transfer.router)
 api_router.include_router(auth.router)
 
 # Add more routers here as you develop other features
@@ -0,0 +1,46 @@
+import hashlib
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Response, status
+
+# Responses are per user, so shared caches must not store them, and clients
+# revalidate with If-None-Match on every use.
+CACHE_CONTROL = "private, no-cache"
+
+
+def collection_etag(*document_groups: Iterable[Dict[str, Any]], variant: str = "") -> str:
+    """Build a strong ETag for a response from the Cosmos `_etag` of every document in it.
+
+    Pass every group of documents the response is built from (e.g. meal plans
+    and the meals they reference); any change to one of them changes the ETag.
+    ``variant`` distinguishes different renderings of the same documents, such
+    as sparse fieldsets.
+    """
+    digest = hashlib.sha256(variant.encode("utf-8"))
+    for documents in document_groups:
+        for document in documents:
+            digest.update(f"{document.get('id')}:{document.get('_etag')};".encode("utf-8"))
+        digest.update(b"|")
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches the current ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+def set_cache_headers(response: Response, etag: str) -> None:
+    """Attach the ETag and caching policy to a response."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def not_modified_response(response: Response, etag: str) -> Response:
+    """A 304 carrying the headers already set on ``response`` plus the cache headers."""
+    set_cache_headers(response, etag)
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
@@ -0,0 +1,72 @@
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type, Union, get_args, get_origin
+from uuid import UUID
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+_MISSING = object()
+
+# Field types that to_db() stores as strings; any other stored value (e.g. an
+# integer timestamp in an older document) needs validation to be converted.
+_STRING_SERIALIZED_TYPES = (date, datetime, UUID)
+
+
+def _is_string_serialized(annotation: Any) -> bool:
+    if get_origin(annotation) is Union:
+        return any(_is_string_serialized(arg) for arg in get_args(annotation) if arg is not type(None))
+    return isinstance(annotation, type) and issubclass(annotation, _STRING_SERIALIZED_TYPES)
+
+
+class DocumentProjector:
+    """Projects stored documents onto a response model's JSON shape without validating them.
+
+    Documents written through a *DB model's ``to_db()`` already hold every
+    field in its JSON form under its field name, so producing the response is
+    a matter of picking the model's fields and renaming them to their aliases.
+    Documents missing a required field, or holding a non-string value in a
+    date, datetime or UUID field, are not trusted and go through the model's
+    validation instead.
+    """
+
+    def __init__(self, model: Type[BaseModel], exclude: Iterable[str] = ()):
+        self.model = model
+        self.exclude = set(exclude)
+        self.fields: List[Tuple[str, str, Any, bool]] = []
+        for name, field in model.model_fields.items():
+            if name in self.exclude:
+                continue
+            alias = field.serialization_alias or field.alias or name
+            default = _MISSING if field.is_required() else field.get_default(call_default_factory=True)
+            if isinstance(default, BaseModel):
+                default = default.model_dump(mode="json", by_alias=True)
+            self.fields.append((name, alias, default, _is_string_serialized(field.annotation)))
+
+    def project(self, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the response shape of a trusted document, or None if it cannot be trusted."""
+        projected = {}
+        for name, alias, default, string_serialized in self.fields:
+            value = document.get(name, default)
+            if value is _MISSING or (string_serialized and value is not None and not isinstance(value, str)):
+                return None
+            projected[alias] = value
+        return projected
+
+    def validate(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the response shape of a document after validating it against the model."""
+        return self.model(**document).model_dump(mode="json", by_alias=True, exclude=self.exclude)
+
+    def render(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Project a document, falling back to validation when it cannot be trusted."""
+        projected = self.project(document)
+        return projected if projected is not None else self.validate(document)
+
+
+def fast_json_response(response: Response, content: Any) -> Response:
+    """Serialize already JSON-shaped content with orjson, keeping headers set on ``response``."""
+    return Response(
+        content=orjson.dumps(content),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
@@ -0,0 +1,57 @@
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, Field, create_model
+
+from app.api.fast_json import DocumentProjector
+from app.schemas import BaseSchema
+
+
+class InvalidFieldset(ValueError):
+    """Raised when a `fields=` parameter names a field the response does not have."""
+
+
+def split_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated `fields=` parameter, or return None when it was not given."""
+    if fields is None:
+        return None
+    return [name.strip() for name in fields.split(",") if name.strip()]
+
+
+def parse_fields(model: Type[BaseSchema], names: Iterable[str], always: Iterable[str] = ("id",)) -> List[str]:
+    """
+    Resolve requested field names (camelCase or snake_case) to the model's field names.
+
+    Fields in ``always`` are included even when not requested. Order is kept
+    and duplicates are dropped.
+    """
+    known_keys = model.__snake_case_keys__
+    selected = []
+    for name in [*always, *names]:
+        field_name = known_keys.get(name)
+        if field_name is None:
+            raise InvalidFieldset(f"Unknown field {name!r}")
+        if field_name not in selected:
+            selected.append(field_name)
+    return selected
+
+
+def projection_clause(fields: Iterable[str]) -> str:
+    """Build the SELECT list of a Cosmos query returning only ``fields``."""
+    return ", ".join(f"c.{field}" for field in fields)
+
+
+@lru_cache(maxsize=128)
+def sparse_model(model: Type[BaseSchema], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """A copy of ``model`` with only ``fields``, all optional since projections omit missing properties."""
+    definitions = {}
+    for name in fields:
+        field = model.model_fields[name]
+        definitions[name] = (Optional[field.annotation], Field(None, alias=field.alias))
+    return create_model(f"{model.__name__}Fields", __base__=BaseSchema, **definitions)
+
+
+@lru_cache(maxsize=128)
+def sparse_projector(model: Type[BaseSchema], fields: Tuple[str, ...]) -> DocumentProjector:
+    """A DocumentProjector rendering only ``fields`` of ``model``."""
+    return DocumentProjector(sparse_model(model, fields))
@@ -0,0 +1,12 @@
+from typing import Optional
+
+from fastapi import Response
+
+# Response header carrying the cursor for the next page of a paginated list
+CONTINUATION_HEADER = "X-Continuation-Token"
+
+
+def set_continuation_header(response: Response, cursor: Optional[str]) -> None:
+    """Expose the next-page cursor to the client, if there is one."""
+    if cursor:
+        response.headers[CONTINUATION_HEADER] = cursor
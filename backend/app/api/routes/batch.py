@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.core.oidc import get_token_data, TokenData
+from app.models.batch import BatchRequest, BatchResponse
+from app.services.batch import execute_operations
+
+router = APIRouter(
+    prefix="/batch",
+    tags=["batch"],
+    responses={
+        401: {"description": "Not authenticated"}
+    },
+)
+
+@router.post("/", response_model=BatchResponse)
+async def execute_batch(
+    batch: BatchRequest,
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Apply an ordered list of meal, meal plan and rating mutations.
+    
+    Creates are validated like on their own endpoints and may carry a
+    client-generated `id`; updates and deletes refer to an `id` and may carry
+    an `ifMatch` ETag. Consecutive operations on the same kind of document
+    run as one transactional batch. Every operation gets a result with the
+    status its own endpoint would have returned.
+    """
+    try:
+        results = await execute_operations(token_data.sub, token_data.sub, batch.operations)
+        return BatchResponse(results=results)
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error executing batch: {str(e)}"
+        )
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.oidc import get_token_data, TokenData
+from app.services.events import TooManySubscriptions, event_broker, stream_events
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"],
+    responses={
+        401: {"description": "Not authenticated"},
+        429: {"description": "Too many open event streams"}
+    },
+)
+
+@router.get("/", response_class=StreamingResponse)
+async def get_events(
+    request: Request,
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Stream the household's changes as Server-Sent Events.
+
+    Every message is a JSON object with a `type`: `upsert` carries the
+    `entity`, `id` and the changed `item` as its endpoint returns it, `delete`
+    the `entity` and `id` of a deleted document, and `resync` tells the client
+    it missed changes and should call /sync. A comment line is sent whenever
+    the stream is idle for EVENTS_HEARTBEAT_SECONDS. Events are not replayed
+    after a reconnect, so a reconnecting client syncs first.
+    """
+    try:
+        event_broker.check_capacity(token_data.sub)
+    except TooManySubscriptions as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e)
+        )
+
+    return StreamingResponse(
+        stream_events(token_data.sub, request.is_disconnected, settings.EVENTS_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Keep reverse proxies from buffering the stream
+            "X-Accel-Buffering": "no"
+        }
+    )
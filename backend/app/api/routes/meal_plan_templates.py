@@ -0,0 +1,246 @@
+from datetime import datetime
+from typing import List
+from uuid import UUID
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError, CosmosResourceNotFoundError
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.core.oidc import get_token_data, TokenData
+from app.models.meal_plan import MealPlanEntry
+from app.models.meal_plan_template import MealPlanTemplate, MealPlanTemplateApply, MealPlanTemplateCreate
+from app.models.meal_plan_template import MealPlanTemplateDB, MealPlanTemplateUpdate
+from app.db.repository import meal_plan_templates_repository, to_patch_operations
+from app.services.plan_expansion import InvalidExpansion, check_date_range, check_template, template_entries, write_entries
+
+router = APIRouter(
+    prefix="/meal-plan-templates",
+    tags=["meal-plan-templates"],
+    responses={
+        404: {"description": "Not found"},
+        401: {"description": "Not authenticated"}
+    },
+)
+
+MAX_UPDATE_ATTEMPTS = 3
+
+@router.post("/", response_model=MealPlanTemplate, status_code=status.HTTP_201_CREATED)
+async def create_meal_plan_template(
+    template: MealPlanTemplateCreate,
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Create a new meal plan template.
+    """
+    try:
+        check_template(template)
+        
+        # Create template with user info
+        template_db = MealPlanTemplateDB(
+            **template.model_dump(),
+            created_by=token_data.sub,
+            household_id=token_data.sub  # Using user ID as household ID for now
+        )
+        
+        # Save to database
+        await meal_plan_templates_repository.create(template_db.to_db())
+        
+        return template_db
+        
+    except InvalidExpansion as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating meal plan template: {str(e)}"
+        )
+
+@router.get("/", response_model=List[MealPlanTemplate])
+async def get_meal_plan_templates(
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Get all meal plan templates of the household.
+    """
+    try:
+        query = "SELECT * FROM c WHERE c.household_id = @household_id"
+        params = [{"name": "@household_id", "value": token_data.sub}]
+        
+        # Execute the query
+        templates = [template async for template in meal_plan_templates_repository.query(query, params, token_data.sub)]
+        
+        return [MealPlanTemplate(**template) for template in templates]
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving meal plan templates: {str(e)}"
+        )
+
+@router.get("/{template_id}", response_model=MealPlanTemplate)
+async def get_meal_plan_template(
+    template_id: UUID,
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Get a specific meal plan template by ID.
+    """
+    try:
+        # Point read within the user's household partition
+        template = await meal_plan_templates_repository.get(template_id, token_data.sub)
+        
+        if template is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Meal plan template with ID {template_id} not found"
+            )
+        
+        return MealPlanTemplate(**template)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving meal plan template: {str(e)}"
+        )
+
+@router.patch("/{template_id}", response_model=MealPlanTemplate)
+async def update_meal_plan_template(
+    template_id: UUID,
+    template_update: MealPlanTemplateUpdate,
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Update a specific meal plan template by ID.
+    
+    Only the fields present in the request are written, with a partial
+    document patch conditional on the version they were checked against.
+    """
+    try:
+        # Only the fields sent by the client are written, plus the timestamp
+        update_data = template_update.to_db(exclude_unset=True)
+        update_data["updated_at"] = datetime.utcnow().isoformat()
+        
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            template = await meal_plan_templates_repository.get(template_id, token_data.sub)
+            
+            if template is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Meal plan template with ID {template_id} not found"
+                )
+            
+            # The slots must still fit the rotation once the update is applied
+            check_template(MealPlanTemplateDB(**{**template, **update_data}))
+            
+            try:
+                patched = await meal_plan_templates_repository.patch(
+                    template_id,
+                    token_data.sub,
+                    to_patch_operations(update_data),
+                    etag=template["_etag"]
+                )
+                break
+            except CosmosAccessConditionFailedError:
+                # Changed since it was read; check the update against the new version
+                continue
+        else:
+            raise CosmosAccessConditionFailedError(status_code=412, message="Meal plan template kept changing")
+        
+        return MealPlanTemplate(**patched)
+        
+    except HTTPException:
+        raise
+    except InvalidExpansion as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except CosmosResourceNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Meal plan template with ID {template_id} not found"
+        )
+    except CosmosAccessConditionFailedError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"Meal plan template with ID {template_id} has been modified"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error updating meal plan template: {str(e)}"
+        )
+
+@router.delete("/{template_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_meal_plan_template(
+    template_id: UUID,
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Delete a specific meal plan template by ID.
+    
+    Entries already created from the template are kept.
+    """
+    try:
+        await meal_plan_templates_repository.delete(template_id, token_data.sub)
+        return None
+        
+    except CosmosResourceNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Meal plan template with ID {template_id} not found"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error deleting meal plan template: {str(e)}"
+        )
+
+@router.post("/{template_id}/apply", response_model=List[MealPlanEntry], status_code=status.HTTP_201_CREATED)
+async def apply_meal_plan_template(
+    template_id: UUID,
+    application: MealPlanTemplateApply,
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Create the meal plan entries of a template for a date range.
+    
+    The entries are written in transactional batches. With `skipExisting`
+    (the default) days and meal types that already have an entry are left
+    alone, so applying a template twice does not duplicate it.
+    """
+    try:
+        check_date_range(application.start_date, application.end_date)
+        
+        template = await meal_plan_templates_repository.get(template_id, token_data.sub)
+        
+        if template is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Meal plan template with ID {template_id} not found"
+            )
+        
+        entries = await template_entries(
+            MealPlanTemplateDB(**template),
+            token_data.sub,
+            token_data.sub,
+            application.start_date,
+            application.end_date,
+            skip_existing=application.skip_existing
+        )
+        return await write_entries(token_data.sub, entries)
+        
+    except HTTPException:
+        raise
+    except InvalidExpansion as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error applying meal plan template: {str(e)}"
+        )
@@ -1,12 +1,33 @@
-from typing import List, Optional
+import calendar
+from typing import List, Optional, Tuple
 from uuid import UUID
 from datetime import date, datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError, CosmosResourceNotFoundError
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from app.api.conditional import collection_etag, etag_matches, not_modified_response, set_cache_headers
+from app.api.fast_json import DocumentProjector, fast_json_response
+from app.api.fieldsets import InvalidFieldset, parse_fields, projection_clause, sparse_projector, split_fields
+from app.api.pagination import set_continuation_header
+from app.core.config import settings
 from app.core.oidc import get_token_data, TokenData
 from app.models.meal_plan import MealPlanEntryCreate, MealPlanEntryUpdate, MealPlanEntryDB
-from app.models.meal_plan import MealPlanEntry, MealPlanEntryWithMeal, MealPlanPeriod, MealPlanStatistics
-from app.models.meal import MealDB
-from app.db.cosmos_db import cosmos_db
+from app.models.meal_plan import MealPlanEntry, MealPlanEntryWithMeal, MealPlanPeriod, MealPlanStatistics, MealPlanStatus
+from app.models.meal_plan import MealPlanRangeStatistics
+from app.models.meal_plan_template import MealPlanCopy
+from app.models.meal import Meal
+from app.db.repository import InvalidContinuationToken, meal_plans_repository, meals_repository, to_patch_operations
+from app.services.rollups import counters_with_prefix, meal_plan_rollups
+from app.models.sync import SyncEntity
+from app.services.events import publish_delete, publish_upsert
+from app.services.sync import record_deletion
+from app.services.plan_expansion import InvalidExpansion, check_date_range, copied_entries, write_entries
+
+# Attempts at patching a meal plan that changes between the read and the write
+MAX_UPDATE_ATTEMPTS = 3
+
+# Render stored documents as the public shapes for FAST_LIST_RESPONSES
+meal_plan_projector = DocumentProjector(MealPlanEntryWithMeal, exclude={"meal"})
+meal_projector = DocumentProjector(Meal)
 
 router = APIRouter(
     prefix="/meal-plans",
@@ -19,26 +40,64 @@ router = APIRouter(
 
 @router.get("/", response_model=List[MealPlanEntryWithMeal])
 async def get_meal_plans(
+    response: Response,
     token_data: TokenData = Depends(get_token_data),
     start_date: Optional[date] = Query(None, description="Start date for meal plans"),
     end_date: Optional[date] = Query(None, description="End date for meal plans"),
-    meal_type: Optional[str] = Query(None, description="Filter by meal type")
+    meal_type: Optional[str] = Query(None, description="Filter by meal type"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.MAX_PAGE_SIZE, description="Page size; enables pagination"),
+    continuation: Optional[str] = Query(None, description="Cursor of the page to fetch, from the X-Continuation-Token header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. plannedDate,status,meal.name; id is always included"),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get all meal plans within a date range with optional filtering.
+    
+    When `limit` or `continuation` is given a single page is returned and the
+    cursor for the next page, if any, is sent in the X-Continuation-Token header.
+    
+    With `fields` only those plan fields are read from Cosmos and returned.
+    `meal` embeds the whole meal and `meal.<field>` only some of its fields;
+    without either, meals are not read at all.
+    
+    The response carries an ETag covering the plans and their meals; a request
+    whose If-None-Match matches it gets a 304 without a body.
     """
     try:
-        meal_plans_container = cosmos_db.get_container("meal_plans")
-        meals_container = cosmos_db.get_container("meals")
-        
         # Set default dates if not provided
         if not start_date:
             start_date = date.today()
         if not end_date:
             end_date = start_date + timedelta(days=7)
         
+        # Split the requested fields into plan fields and fields of the embedded meal
+        requested = split_fields(fields)
+        selected = meal_selected = None
+        embed_meal = True
+        if requested is not None:
+            selected = parse_fields(
+                MealPlanEntryWithMeal,
+                [name for name in requested if not name.startswith("meal.")]
+            )
+            meal_names = [name[len("meal."):] for name in requested if name.startswith("meal.")]
+            if meal_names:
+                meal_selected = parse_fields(Meal, meal_names)
+            embed_meal = "meal" in selected or meal_selected is not None
+            if "meal" in selected:
+                selected.remove("meal")
+                meal_selected = None
+        
+        # Read only the requested fields, plus what the ETag and meal lookup need
+        if selected is not None:
+            columns = [*selected, "_etag"]
+            if embed_meal and "meal_id" not in selected:
+                columns.append("meal_id")
+            select = projection_clause(columns)
+        else:
+            select = "*"
+        
         # Base query to filter by household ID and date range
-        query = "SELECT * FROM c WHERE c.household_id = @household_id AND c.planned_date >= @start_date AND c.planned_date <= @end_date"
+        query = f"SELECT {select} FROM c WHERE c.household_id = @household_id AND c.planned_date >= @start_date AND c.planned_date <= @end_date"
         params = [
             {"name": "@household_id", "value": token_data.sub},
             {"name": "@start_date", "value": start_date.isoformat()},
@@ -51,35 +110,69 @@ async def get_meal_plans(
             params.append({"name": "@meal_type", "value": meal_type})
         
         # Execute the query
-        meal_plans = []
-        for plan in meal_plans_container.query_items(
-            query=query,
-            parameters=params,
-            partition_key=token_data.sub
-        ):
-            meal_plan_entry = MealPlanEntryDB(**plan)
-            # Get the associated meal
-            meal_query = "SELECT * FROM c WHERE c.id = @meal_id"
-            meal_params = [{"name": "@meal_id", "value": str(meal_plan_entry.meal_id)}]
-            meals = []
-            for meal in meals_container.query_items(
-                query=meal_query,
-                parameters=meal_params,
-                enable_cross_partition_query=True
-            ):
-                meals.append(MealDB(**meal))
-            # Create the combined response object
-            if meals:
-                meal_plan_with_meal = MealPlanEntryWithMeal(
-                    **meal_plan_entry.model_dump(),
-                    meal=meals[0]
-                )
-                meal_plans.append(meal_plan_with_meal)
-            else:
-                # Handle case where meal doesn't exist anymore
-                meal_plans.append(MealPlanEntryWithMeal(**meal_plan_entry.model_dump()))
-        return meal_plans
+        if limit is None and continuation is None:
+            plans = [plan async for plan in meal_plans_repository.query(query, params, token_data.sub)]
+        else:
+            plans, next_cursor = await meal_plans_repository.query_page(
+                query,
+                params,
+                token_data.sub,
+                page_size=limit or settings.DEFAULT_PAGE_SIZE,
+                continuation=continuation
+            )
+            set_continuation_header(response, next_cursor)
+        # Resolve all referenced meals in one batched read instead of one per entry
+        meal_docs = {}
+        if embed_meal:
+            meal_docs = await meals_repository.get_many(
+                (plan.get('meal_id') for plan in plans if plan.get('meal_id')),
+                token_data.sub
+            )
+        
+        # Skip building the body when the client already has this version
+        variant = ""
+        if requested is not None:
+            variant = ",".join([*selected, *(["meal"] if embed_meal else []), *(meal_selected or [])])
+        etag = collection_etag(plans, (meal_docs[key] for key in sorted(meal_docs)), variant=variant)
+        if etag_matches(if_none_match, etag):
+            return not_modified_response(response, etag)
+        set_cache_headers(response, etag)
+        
+        if selected is not None:
+            plan_projector = sparse_projector(MealPlanEntryWithMeal, tuple(selected))
+            embedded_projector = sparse_projector(Meal, tuple(meal_selected)) if meal_selected else meal_projector
+            content = []
+            for plan in plans:
+                item = plan_projector.render(plan) if settings.FAST_LIST_RESPONSES else plan_projector.validate(plan)
+                if embed_meal:
+                    meal = meal_docs.get(plan.get('meal_id'))
+                    if meal is not None:
+                        meal = embedded_projector.render(meal) if settings.FAST_LIST_RESPONSES else embedded_projector.validate(meal)
+                    item['meal'] = meal
+                content.append(item)
+            return fast_json_response(response, content)
+        
+        if settings.FAST_LIST_RESPONSES:
+            content = []
+            for plan in plans:
+                item = meal_plan_projector.render(plan)
+                meal = meal_docs.get(plan.get('meal_id'))
+                item['meal'] = meal_projector.render(meal) if meal is not None else None
+                content.append(item)
+            return fast_json_response(response, content)
+        
+        # Validate each plan and its meal straight from the documents; the meal
+        # is None when it doesn't exist anymore
+        return [
+            MealPlanEntryWithMeal(**plan, meal=meal_docs.get(plan.get('meal_id')))
+            for plan in plans
+        ]
         
+    except (InvalidContinuationToken, InvalidFieldset) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -95,8 +188,6 @@ async def create_meal_plan(
     Create a new meal plan entry.
     """
     try:
-        meal_plans_container = cosmos_db.get_container("meal_plans")
-        
         # Create meal plan with user info
         meal_plan_db = MealPlanEntryDB(
             **meal_plan.model_dump(),
@@ -105,7 +196,9 @@ async def create_meal_plan(
         )
         
         # Save to database
-        meal_plans_container.create_item(meal_plan_db.model_dump(by_alias=True))
+        created = await meal_plans_repository.create(meal_plan_db.to_db())
+        await meal_plan_rollups.record_plan_change(token_data.sub, None, meal_plan_db)
+        publish_upsert(SyncEntity.MEAL_PLAN, created)
         
         return meal_plan_db
         
@@ -115,6 +208,109 @@ async def create_meal_plan(
             detail=f"Error creating meal plan: {str(e)}"
         )
 
+@router.post("/copy", response_model=List[MealPlanEntry], status_code=status.HTTP_201_CREATED)
+async def copy_meal_plans(
+    copy: MealPlanCopy,
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Copy the meal plan entries of one date range onto another.
+    
+    Day N of the target range gets the entries of day N of the source range;
+    a longer target range repeats the source, so one week can fill a month.
+    The copies are planned entries written in transactional batches. With
+    `skipExisting` (the default) days and meal types that already have an
+    entry are left alone.
+    """
+    try:
+        check_date_range(copy.source_start_date, copy.source_end_date)
+        target_end_date = copy.target_end_date or copy.target_start_date + (copy.source_end_date - copy.source_start_date)
+        check_date_range(copy.target_start_date, target_end_date)
+        
+        entries = await copied_entries(
+            token_data.sub,
+            token_data.sub,
+            copy.source_start_date,
+            copy.source_end_date,
+            copy.target_start_date,
+            target_end_date,
+            skip_existing=copy.skip_existing
+        )
+        return await write_entries(token_data.sub, entries)
+        
+    except InvalidExpansion as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error copying meal plans: {str(e)}"
+        )
+
+async def get_range_statistics(household_id: str, start_date: date, end_date: date) -> MealPlanRangeStatistics:
+    """
+    Compute statistics for a date range from the household's per-day rollups.
+    """
+    totals = await meal_plan_rollups.get_range_totals(household_id, start_date, end_date)
+    meal_counts = counters_with_prefix(totals, "meal:")
+    category_counts = counters_with_prefix(totals, "category:")
+    
+    # Find most common meal and category among prepared meals
+    favorite_meal_id = max(meal_counts, key=meal_counts.get) if meal_counts else None
+    favorite_meal_name = None
+    if favorite_meal_id:
+        meal = await meals_repository.get(favorite_meal_id, household_id)
+        if meal is not None:
+            favorite_meal_name = meal.get('name')
+    most_common_category = max(category_counts, key=category_counts.get) if category_counts else None
+    
+    rating_count = totals.get("rating_count", 0)
+    average_rating = round(totals.get("rating_sum", 0) / rating_count, 1) if rating_count else None
+    
+    return MealPlanRangeStatistics(
+        start_date=start_date,
+        end_date=end_date,
+        total_planned=totals.get("total", 0),
+        planned_count=totals.get(f"status:{MealPlanStatus.PLANNED.value}", 0),
+        prepared_count=totals.get(f"status:{MealPlanStatus.PREPARED.value}", 0),
+        skipped_count=totals.get(f"status:{MealPlanStatus.SKIPPED.value}", 0),
+        replaced_count=totals.get(f"status:{MealPlanStatus.REPLACED.value}", 0),
+        total_calories=totals.get("calories", 0),
+        rating_count=rating_count,
+        average_rating=average_rating,
+        favorite_meal_id=favorite_meal_id,
+        favorite_meal_name=favorite_meal_name,
+        most_common_category=most_common_category,
+        meal_counts=meal_counts,
+        category_counts=category_counts
+    )
+
+# Declared before /{meal_plan_id} so "statistics" is not parsed as an ID
+@router.get("/statistics", response_model=MealPlanRangeStatistics)
+async def get_meal_plan_range_statistics(
+    start_date: date = Query(..., description="First day of the range"),
+    end_date: date = Query(..., description="Last day of the range, inclusive"),
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Get meal plan and rating statistics for an arbitrary date range.
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+    try:
+        return await get_range_statistics(token_data.sub, start_date, end_date)
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving meal plan statistics: {str(e)}"
+        )
+
 @router.get("/{meal_plan_id}", response_model=MealPlanEntryWithMeal)
 async def get_meal_plan(
     meal_plan_id: UUID,
@@ -124,29 +320,16 @@ async def get_meal_plan(
     Get a specific meal plan entry by ID.
     """
     try:
-        meal_plans_container = cosmos_db.get_container("meal_plans")
-        meals_container = cosmos_db.get_container("meals")
-        
-        # Query by ID
-        query = "SELECT * FROM c WHERE c.id = @id"
-        params = [{"name": "@id", "value": str(meal_plan_id)}]
-        
-        # Execute query
-        meal_plans = []
-        for plan in meal_plans_container.query_items(
-            query=query,
-            parameters=params,
-            enable_cross_partition_query=True
-        ):
-            meal_plans.append(MealPlanEntryDB(**plan))
-        
-        if not meal_plans:
+        # Point read within the user's household partition
+        plan = await meal_plans_repository.get(meal_plan_id, token_data.sub)
+        
+        if plan is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Meal plan with ID {meal_plan_id} not found"
             )
             
-        meal_plan_entry = meal_plans[0]
+        meal_plan_entry = MealPlanEntryDB(**plan)
         
         # Check if user has access to this meal plan
         if str(meal_plan_entry.household_id) != token_data.sub:
@@ -156,26 +339,11 @@ async def get_meal_plan(
             )
             
         # Get the associated meal
-        meal_query = "SELECT * FROM c WHERE c.id = @meal_id"
-        meal_params = [{"name": "@meal_id", "value": str(meal_plan_entry.meal_id)}]
-        
-        meals = []
-        for meal in meals_container.query_items(
-            query=meal_query,
-            parameters=meal_params,
-            enable_cross_partition_query=True
-        ):
-            meals.append(MealDB(**meal))
-        
-        # Create the combined response object
-        if meals:
-            return MealPlanEntryWithMeal(
-                **meal_plan_entry.model_dump(),
-                meal=meals[0]
-            )
-        else:
-            # Handle case where meal doesn't exist anymore
-            return MealPlanEntryWithMeal(**meal_plan_entry.model_dump())
+        meal = await meals_repository.get(meal_plan_entry.meal_id, token_data.sub)
+        
+        # Create the combined response object from the documents; the meal is
+        # None when it doesn't exist anymore
+        return MealPlanEntryWithMeal(**plan, meal=meal)
         
     except HTTPException:
         raise
@@ -189,60 +357,64 @@ async def get_meal_plan(
 async def update_meal_plan(
     meal_plan_id: UUID,
     meal_plan_update: MealPlanEntryUpdate,
-    token_data: TokenData = Depends(get_token_data)
+    token_data: TokenData = Depends(get_token_data),
+    if_match: Optional[str] = Header(None, description="Only update if the meal plan still has this ETag")
 ):
     """
     Update a specific meal plan by ID.
+    
+    Only the fields present in the request are written, with a partial
+    document patch conditional on the version that was read.
     """
     try:
-        meal_plans_container = cosmos_db.get_container("meal_plans")
-        
-        # First get the existing meal plan
-        query = "SELECT * FROM c WHERE c.id = @id"
-        params = [{"name": "@id", "value": str(meal_plan_id)}]
-        
-        # Execute query
-        meal_plans = []
-        for plan in meal_plans_container.query_items(
-            query=query,
-            parameters=params,
-            enable_cross_partition_query=True
-        ):
-            meal_plans.append(MealPlanEntryDB(**plan))
-        
-        if not meal_plans:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Meal plan with ID {meal_plan_id} not found"
-            )
-        
-        existing_plan = meal_plans[0]
-        
-        # Check if user has access to update this meal plan
-        if str(existing_plan.household_id) != token_data.sub:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to update this meal plan"
-            )
-        
-        # Update the meal plan with new values
-        update_data = meal_plan_update.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            setattr(existing_plan, key, value)
-        
-        # Update the timestamp
-        existing_plan.updated_at = datetime.utcnow()
+        # Only the fields sent by the client are written, plus the timestamp
+        update_data = meal_plan_update.to_db(exclude_unset=True)
+        update_data["updated_at"] = datetime.utcnow().isoformat()
+        operations = to_patch_operations(update_data)
+        
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            # Point read of the current version, whose ETag the patch is conditional on
+            plan = await meal_plans_repository.get(meal_plan_id, token_data.sub)
+            
+            if plan is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Meal plan with ID {meal_plan_id} not found"
+                )
+            
+            try:
+                patched = await meal_plans_repository.patch(
+                    meal_plan_id,
+                    token_data.sub,
+                    operations,
+                    etag=if_match or plan.get("_etag")
+                )
+                break
+            except CosmosAccessConditionFailedError:
+                # A client-supplied ETag is final; otherwise re-read and try again
+                if if_match:
+                    raise
+        else:
+            raise CosmosAccessConditionFailedError(status_code=412, message="Meal plan kept changing")
         
-        # Save the updated meal plan
-        meal_plans_container.replace_item(
-            item=str(existing_plan.id), 
-            body=existing_plan.model_dump(by_alias=True)
-        )
+        updated_plan = MealPlanEntryDB(**patched)
+        await meal_plan_rollups.record_plan_change(token_data.sub, MealPlanEntryDB(**plan), updated_plan)
+        publish_upsert(SyncEntity.MEAL_PLAN, patched)
         
-        return existing_plan
+        return updated_plan
         
     except HTTPException:
         raise
+    except CosmosResourceNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Meal plan with ID {meal_plan_id} not found"
+        )
+    except CosmosAccessConditionFailedError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"Meal plan with ID {meal_plan_id} has been modified"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -258,28 +430,16 @@ async def delete_meal_plan(
     Delete a specific meal plan by ID.
     """
     try:
-        meal_plans_container = cosmos_db.get_container("meal_plans")
-        
-        # First get the existing meal plan
-        query = "SELECT * FROM c WHERE c.id = @id"
-        params = [{"name": "@id", "value": str(meal_plan_id)}]
-        
-        # Execute query
-        meal_plans = []
-        for plan in meal_plans_container.query_items(
-            query=query,
-            parameters=params,
-            enable_cross_partition_query=True
-        ):
-            meal_plans.append(MealPlanEntryDB(**plan))
-        
-        if not meal_plans:
+        # First get the existing meal plan with a point read
+        plan = await meal_plans_repository.get(meal_plan_id, token_data.sub)
+        
+        if plan is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Meal plan with ID {meal_plan_id} not found"
             )
         
-        existing_plan = meal_plans[0]
+        existing_plan = MealPlanEntryDB(**plan)
         
         # Check if user has access to delete this meal plan
         if str(existing_plan.household_id) != token_data.sub:
@@ -289,10 +449,10 @@ async def delete_meal_plan(
             )
         
         # Delete the meal plan
-        meal_plans_container.delete_item(
-            item=str(existing_plan.id),
-            partition_key=str(existing_plan.household_id)
-        )
+        await meal_plans_repository.delete(existing_plan.id, existing_plan.household_id)
+        await record_deletion(SyncEntity.MEAL_PLAN, existing_plan.id, existing_plan.household_id)
+        await meal_plan_rollups.record_plan_change(token_data.sub, existing_plan, None)
+        publish_delete(SyncEntity.MEAL_PLAN, existing_plan.id, existing_plan.household_id)
         
         return None
         
@@ -304,6 +464,21 @@ async def delete_meal_plan(
             detail=f"Error deleting meal plan: {str(e)}"
         )
 
+def get_period_window(period: MealPlanPeriod, start_date: date) -> Tuple[date, date]:
+    """
+    Return the first and last day covered by a statistics period.
+    
+    Days and weeks start at `start_date`; months are the calendar month
+    containing it.
+    """
+    if period == MealPlanPeriod.DAY:
+        return start_date, start_date
+    if period == MealPlanPeriod.WEEK:
+        return start_date, start_date + timedelta(days=6)
+    first_day = start_date.replace(day=1)
+    last_day = start_date.replace(day=calendar.monthrange(start_date.year, start_date.month)[1])
+    return first_day, last_day
+
 @router.get("/statistics/{period}", response_model=MealPlanStatistics)
 async def get_meal_plan_statistics(
     period: MealPlanPeriod,
@@ -314,95 +489,31 @@ async def get_meal_plan_statistics(
     Get meal plan statistics for a specific period.
     """
     try:
-        meal_plans_container = cosmos_db.get_container("meal_plans")
-        meals_container = cosmos_db.get_container("meals")
         # Set default start date if not provided
         if not start_date:
             start_date = date.today()
         
-        # Calculate end date based on period
-        if period == MealPlanPeriod.DAY:
-            end_date = start_date
-        elif period == MealPlanPeriod.WEEK:
-            end_date = start_date + timedelta(days=6)
-        elif period == MealPlanPeriod.MONTH:
-            end_date = start_date + timedelta(days=30)  # Approximate
-        
-        # Query to get all meal plans within the period
-        query = """
-        SELECT
-            c.status,
-            c.meal_id
-        FROM c
-        WHERE c.household_id = @household_id
-        AND c.planned_date >= @start_date
-        AND c.planned_date <= @end_date
-        """
+        start_date, end_date = get_period_window(period, start_date)
         
-        params = [
-            {"name": "@household_id", "value": token_data.sub},
-            {"name": "@start_date", "value": start_date.isoformat()},
-            {"name": "@end_date", "value": end_date.isoformat()}
-        ]
-        
-        # Execute query to collect statistics
-        total_planned = 0
-        prepared_count = 0
-        skipped_count = 0
-        replaced_count = 0
-        meal_counts = {}  # meal_id -> count
-        
-        for item in meal_plans_container.query_items(
-            query=query,
-            parameters=params,
-            partition_key=token_data.sub
-        ):
-            total_planned += 1
-            
-            # Count by status
-            if item.get('status') == 'prepared':
-                prepared_count += 1
-                meal_id = item.get('meal_id')
-                meal_counts[meal_id] = meal_counts.get(meal_id, 0) + 1
-            elif item.get('status') == 'skipped':
-                skipped_count += 1
-            elif item.get('status') == 'replaced':
-                replaced_count += 1
-        
-        # Find most common meal
-        favorite_meal_id = None
-        favorite_meal_name = None
-        most_common_count = 0
-        
-        for meal_id, count in meal_counts.items():
-            if count > most_common_count:
-                most_common_count = count
-                favorite_meal_id = meal_id
-        
-        # Get the name of the favorite meal if there is one
-        if favorite_meal_id:
-            meal_query = "SELECT c.name FROM c WHERE c.id = @meal_id"
-            meal_params = [{"name": "@meal_id", "value": favorite_meal_id}]
-            for meal in meals_container.query_items(
-                query=meal_query,
-                parameters=meal_params,
-                enable_cross_partition_query=True
-            ):
-                favorite_meal_name = meal.get('name')
-                break
+        # Two prefix sums over the rollup tree instead of a scan over the period's entries
+        range_statistics = await get_range_statistics(token_data.sub, start_date, end_date)
         
         # Create the statistics object
         statistics = MealPlanStatistics(
             period=period,
-            start_date=start_date,
-            end_date=end_date,
-            total_planned=total_planned,
-            prepared_count=prepared_count,
-            skipped_count=skipped_count,
-            replaced_count=replaced_count,
-            favorite_meal_id=favorite_meal_id,
-            favorite_meal_name=favorite_meal_name,
-            most_common_category=None  # Would require additional complexity to calculate
+            **range_statistics.model_dump(
+                include={
+                    "start_date",
+                    "end_date",
+                    "total_planned",
+                    "prepared_count",
+                    "skipped_count",
+                    "replaced_count",
+                    "favorite_meal_id",
+                    "favorite_meal_name",
+                    "most_common_category",
+                }
+            )
         )
         
         return statistics
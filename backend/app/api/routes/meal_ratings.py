@@ -1,10 +1,16 @@
 from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from app.api.conditional import collection_etag, etag_matches, not_modified_response, set_cache_headers
 from app.core.oidc import get_token_data, TokenData
 from app.models.meal_rating import MealRatingBase, MealRatingCreate, MealRatingUpdate, MealRatingDB
 from app.models.meal_rating import MealRating, MealRatingStatistics
-from app.db.cosmos_db import cosmos_db
+from app.db.repository import meal_ratings_repository, meals_repository
+from app.services.rating_aggregates import RATING_VALUES, count_meal_ratings, read_rating_seed, schedule_rating_delta
+from app.services.rollups import meal_plan_rollups
+from app.models.sync import SyncEntity
+from app.services.events import publish_delete, publish_upsert
+from app.services.sync import record_deletion
 
 router = APIRouter(
     prefix="/meal-ratings",
@@ -24,8 +30,6 @@ async def create_meal_rating(
     Create a new meal rating.
     """
     try:
-        ratings_container = cosmos_db.get_container("meal_ratings")
-        
         # Create rating with user info
         rating_db = MealRatingDB(
             **rating.model_dump(),
@@ -33,11 +37,14 @@ async def create_meal_rating(
             household_id=token_data.sub  # Using user ID as household ID for now
         )
         
-        # Save to database
-        ratings_container.create_item(rating_db.model_dump(by_alias=True))
+        # Save to database, after reading which count of the meal's ratings it follows
+        seed = await read_rating_seed(rating_db.meal_id, token_data.sub)
+        created = await meal_ratings_repository.create(rating_db.to_db())
+        await meal_plan_rollups.record_rating_change(token_data.sub, None, rating_db)
+        publish_upsert(SyncEntity.MEAL_RATING, created)
         
-        # After rating is saved, update the meal's average rating
-        await update_meal_average_rating(rating_db.meal_id, token_data.sub)
+        # After rating is saved, update the meal's rating aggregates in the background
+        schedule_rating_delta(rating_db.meal_id, token_data.sub, {rating_db.rating: 1}, seed)
         
         return rating_db
         
@@ -50,14 +57,17 @@ async def create_meal_rating(
 @router.get("/meal/{meal_id}", response_model=List[MealRating])
 async def get_meal_ratings(
     meal_id: UUID,
-    token_data: TokenData = Depends(get_token_data)
+    response: Response,
+    token_data: TokenData = Depends(get_token_data),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get all ratings for a specific meal.
+    
+    The response carries an ETag; a request whose If-None-Match matches it
+    gets a 304 without a body.
     """
     try:
-        ratings_container = cosmos_db.get_container("meal_ratings")
-        
         # Query to get all ratings for this meal
         query = "SELECT * FROM c WHERE c.household_id = @household_id AND c.meal_id = @meal_id"
         params = [
@@ -66,15 +76,15 @@ async def get_meal_ratings(
         ]
         
         # Execute the query
-        ratings = []
-        for rating in ratings_container.query_items(
-            query=query,
-            parameters=params,
-            partition_key=token_data.sub
-        ):
-            ratings.append(MealRating(**rating))
+        ratings = [rating async for rating in meal_ratings_repository.query(query, params, token_data.sub)]
+        
+        # Skip building the body when the client already has this version
+        etag = collection_etag(ratings)
+        if etag_matches(if_none_match, etag):
+            return not_modified_response(response, etag)
+        set_cache_headers(response, etag)
             
-        return ratings
+        return [MealRating(**rating) for rating in ratings]
         
     except Exception as e:
         raise HTTPException(
@@ -91,53 +101,42 @@ async def get_meal_rating_statistics(
     Get rating statistics for a specific meal.
     """
     try:
-        ratings_container = cosmos_db.get_container("meal_ratings")
-        meals_container = cosmos_db.get_container("meals")
-        
-        # Get meal name first
-        meal_query = "SELECT c.name FROM c WHERE c.id = @meal_id"
-        meal_params = [{"name": "@meal_id", "value": str(meal_id)}]
-        
+        # Get meal name and its running rating aggregates first
         meal_name = "Unknown Meal"
-        for meal in meals_container.query_items(
-            query=meal_query,
-            parameters=meal_params,
-            enable_cross_partition_query=True
-        ):
+        meal = await meals_repository.get(meal_id, token_data.sub)
+        if meal is not None:
             meal_name = meal.get('name')
-            break
-        
-        # Query to get all ratings for this meal
-        query = "SELECT * FROM c WHERE c.household_id = @household_id AND c.meal_id = @meal_id"
-        params = [
-            {"name": "@household_id", "value": token_data.sub},
-            {"name": "@meal_id", "value": str(meal_id)}
-        ]
         
-        # Execute the query and calculate statistics
-        ratings = []
-        rating_sum = 0
-        rating_distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        comments = []
-        
-        for rating in ratings_container.query_items(
-            query=query,
-            parameters=params,
-            partition_key=token_data.sub
-        ):
-            ratings.append(MealRating(**rating))
-            rating_value = rating.get('rating')
-            rating_sum += rating_value
-            rating_distribution[rating_value] = rating_distribution.get(rating_value, 0) + 1
-            if rating.get('comments'):
-                comments.append(rating.get('comments'))
+        if meal is not None and meal.get('rating_count') is not None:
+            rating_distribution = {int(value): count for value, count in meal['rating_distribution'].items()}
+            total_ratings = meal['rating_count']
+            rating_sum = meal['rating_sum']
+        else:
+            # Meal has not been aggregated yet, count its ratings
+            rating_distribution = await count_meal_ratings(meal_id, token_data.sub)
+            total_ratings = sum(rating_distribution.values())
+            rating_sum = sum(value * count for value, count in rating_distribution.items())
+        rating_distribution = {value: rating_distribution.get(value, 0) for value in RATING_VALUES}
         
         # Calculate average rating
-        total_ratings = len(ratings)
         average_rating = rating_sum / total_ratings if total_ratings > 0 else 0
         
         # Get the most recent comments (limit to 5)
-        recent_comments = comments[-5:] if comments else []
+        query = """
+        SELECT TOP 5 c.comments
+        FROM c
+        WHERE c.household_id = @household_id
+        AND c.meal_id = @meal_id
+        AND IS_STRING(c.comments)
+        AND c.comments != ''
+        ORDER BY c.date_consumed DESC
+        """
+        params = [
+            {"name": "@household_id", "value": token_data.sub},
+            {"name": "@meal_id", "value": str(meal_id)}
+        ]
+        comments = [item['comments'] async for item in meal_ratings_repository.query(query, params, token_data.sub)]
+        recent_comments = list(reversed(comments))
         
         # Create the statistics object
         statistics = MealRatingStatistics(
@@ -166,37 +165,26 @@ async def delete_meal_rating(
     Delete a specific meal rating by ID.
     """
     try:
-        ratings_container = cosmos_db.get_container("meal_ratings")
-        
-        # First get the existing rating
-        query = "SELECT * FROM c WHERE c.id = @id"
-        params = [{"name": "@id", "value": str(rating_id)}]
-        
-        # Execute query
-        ratings = []
-        for rating in ratings_container.query_items(
-            query=query,
-            parameters=params,
-            enable_cross_partition_query=True
-        ):
-            ratings.append(MealRatingDB(**rating))
-        if not ratings:
+        # First get the existing rating with a point read
+        rating = await meal_ratings_repository.get(rating_id, token_data.sub)
+        if rating is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Rating with ID {rating_id} not found"
             )
-        existing_rating = ratings[0]
+        existing_rating = MealRatingDB(**rating)
         if str(existing_rating.user_id) != token_data.sub:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You don't have permission to delete this rating"
             )
         meal_id = existing_rating.meal_id
-        ratings_container.delete_item(
-            item=str(existing_rating.id),
-            partition_key=str(existing_rating.household_id)
-        )
-        await update_meal_average_rating(meal_id, token_data.sub)
+        seed = await read_rating_seed(meal_id, token_data.sub)
+        await meal_ratings_repository.delete(existing_rating.id, existing_rating.household_id)
+        await record_deletion(SyncEntity.MEAL_RATING, existing_rating.id, existing_rating.household_id)
+        await meal_plan_rollups.record_rating_change(token_data.sub, existing_rating, None)
+        publish_delete(SyncEntity.MEAL_RATING, existing_rating.id, existing_rating.household_id)
+        schedule_rating_delta(meal_id, token_data.sub, {existing_rating.rating: -1}, seed)
         return None
         
     except HTTPException:
@@ -206,59 +194,3 @@ async def delete_meal_rating(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting meal rating: {str(e)}"
         )
-
-async def update_meal_average_rating(meal_id: UUID, household_id: str):
-    """
-    Helper function to update a meal's average rating based on all ratings.
-    """
-    try:
-        ratings_container = cosmos_db.get_container("meal_ratings")
-        meals_container = cosmos_db.get_container("meals")
-        
-        # Query to get all ratings for this meal
-        query = "SELECT c.rating FROM c WHERE c.household_id = @household_id AND c.meal_id = @meal_id"
-        params = [
-            {"name": "@household_id", "value": household_id},
-            {"name": "@meal_id", "value": str(meal_id)}
-        ]
-        
-        # Calculate average rating
-        ratings = []
-        for rating in ratings_container.query_items(
-            query=query,
-            parameters=params,
-            partition_key=household_id
-        ):
-            ratings.append(rating.get('rating'))
-        
-        # Calculate average
-        average_rating = sum(ratings) / len(ratings) if ratings else None
-        
-        # Round to nearest integer for the enum
-        if average_rating is not None:
-            average_rating = round(average_rating)
-        
-        # Update the meal with the new average rating
-        meal_query = "SELECT * FROM c WHERE c.id = @meal_id"
-        meal_params = [{"name": "@meal_id", "value": str(meal_id)}]
-        
-        meals = []
-        for meal in meals_container.query_items(
-            query=meal_query,
-            parameters=meal_params,
-            enable_cross_partition_query=True
-        ):
-            meals.append(meal)
-        
-        if meals:
-            meal = meals[0]
-            meal['rating'] = average_rating
-            meals_container.replace_item(
-                item=str(meal['id']),
-                body=meal
-            )
-            
-    except Exception as e:
-        # Log error but don't fail the request
-        print(f"Error updating meal average rating: {str(e)}")
-        pass
@@ -1,9 +1,22 @@
+from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError, CosmosResourceNotFoundError
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from app.api.conditional import collection_etag, etag_matches, not_modified_response, set_cache_headers
+from app.api.fast_json import DocumentProjector, fast_json_response
+from app.api.fieldsets import InvalidFieldset, parse_fields, projection_clause, sparse_projector, split_fields
+from app.api.pagination import set_continuation_header
+from app.core.config import settings
 from app.core.oidc import get_token_data, TokenData
 from app.models.meal import Meal, MealCreate, MealUpdate, MealDB, MealType, MealCategory
-from app.db.cosmos_db import cosmos_db
+from app.db.repository import InvalidContinuationToken, meals_repository, to_patch_operations
+from app.models.sync import SyncEntity
+from app.services.events import publish_delete, publish_upsert
+from app.services.sync import record_deletion
+
+# Renders stored meal documents as the public Meal shape for FAST_LIST_RESPONSES
+meal_projector = DocumentProjector(Meal)
 
 router = APIRouter(
     prefix="/meals",
@@ -16,19 +29,35 @@ router = APIRouter(
 
 @router.get("/", response_model=List[Meal])
 async def get_meals(
+    response: Response,
     token_data: TokenData = Depends(get_token_data),
     household_id: Optional[str] = Query(None, description="Filter by household ID"),
     meal_type: Optional[MealType] = Query(None, description="Filter by meal type"),
-    category: Optional[MealCategory] = Query(None, description="Filter by category")
+    category: Optional[MealCategory] = Query(None, description="Filter by category"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.MAX_PAGE_SIZE, description="Page size; enables pagination"),
+    continuation: Optional[str] = Query(None, description="Cursor of the page to fetch, from the X-Continuation-Token header"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. name,mealType; id is always included"),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Get all meals with optional filtering.
+    
+    When `limit` or `continuation` is given a single page is returned and the
+    cursor for the next page, if any, is sent in the X-Continuation-Token header.
+    
+    With `fields` only those fields are read from Cosmos and returned.
+    
+    The response carries an ETag; a request whose If-None-Match matches it
+    gets a 304 without a body.
     """
     try:
-        meals_container = cosmos_db.get_container("meals")
-        
-        # Base query to filter by household ID
-        query = "SELECT * FROM c WHERE "
+        # Read only the requested fields, plus the ETag of each document
+        selected = split_fields(fields)
+        if selected is not None:
+            selected = parse_fields(Meal, selected)
+            query = f"SELECT {projection_clause([*selected, '_etag'])} FROM c WHERE "
+        else:
+            query = "SELECT * FROM c WHERE "
         params = []
         
         # Always filter by current user's household
@@ -47,16 +76,37 @@ async def get_meals(
             params.append({"name": "@category", "value": category})
         
         # Execute the query
-        meals = []
-        for meal in meals_container.query_items(
-            query=query,
-            parameters=params,
-            partition_key=actual_household_id
-        ):
-            meals.append(Meal(**meal))
-            
-        return meals
-        
+        if limit is None and continuation is None:
+            meals = [meal async for meal in meals_repository.query(query, params, actual_household_id)]
+        else:
+            meals, next_cursor = await meals_repository.query_page(
+                query,
+                params,
+                actual_household_id,
+                page_size=limit or settings.DEFAULT_PAGE_SIZE,
+                continuation=continuation
+            )
+            set_continuation_header(response, next_cursor)
+        
+        # Skip building the body when the client already has this version
+        etag = collection_etag(meals, variant=",".join(selected or []))
+        if etag_matches(if_none_match, etag):
+            return not_modified_response(response, etag)
+        set_cache_headers(response, etag)
+        
+        if selected is not None:
+            projector = sparse_projector(Meal, tuple(selected))
+            render = projector.render if settings.FAST_LIST_RESPONSES else projector.validate
+            return fast_json_response(response, [render(meal) for meal in meals])
+        if settings.FAST_LIST_RESPONSES:
+            return fast_json_response(response, [meal_projector.render(meal) for meal in meals])
+        return [Meal(**meal) for meal in meals]
+        
+    except (InvalidContinuationToken, InvalidFieldset) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -72,8 +122,6 @@ async def create_meal(
     Create a new meal.
     """
     try:
-        meals_container = cosmos_db.get_container("meals")
-        
         # Create meal with user info
         meal_db = MealDB(
             **meal.model_dump(),
@@ -82,8 +130,8 @@ async def create_meal(
         )
         
         # Save to database
-        data = meal_db.model_dump(by_alias=True)
-        meals_container.create_item(data)
+        created = await meals_repository.create(meal_db.to_db())
+        publish_upsert(SyncEntity.MEAL, created)
         
         return meal_db
         
@@ -102,35 +150,25 @@ async def get_meal(
     Get a specific meal by ID.
     """
     try:
-        meals_container = cosmos_db.get_container("meals")
-        
-        # Query by ID
-        query = "SELECT * FROM c WHERE c.id = @id"
-        params = [{"name": "@id", "value": str(meal_id)}]
+        # Point read within the user's household partition
+        meal = await meals_repository.get(meal_id, token_data.sub)
         
-        # Execute query
-        meals = []
-        for meal in meals_container.query_items(
-            query=query,
-            parameters=params,
-            enable_cross_partition_query=True
-        ):
-            meals.append(MealDB(**meal))
-        
-        if not meals:
+        if meal is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Meal with ID {meal_id} not found"
             )
+        
+        existing_meal = MealDB(**meal)
             
         # Check if user has access to this meal
-        if str(meals[0].household_id) != token_data.sub:
+        if str(existing_meal.household_id) != token_data.sub:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You don't have permission to view this meal"
             )
             
-        return meals[0]
+        return existing_meal
         
     except HTTPException:
         raise
@@ -144,61 +182,41 @@ async def get_meal(
 async def update_meal(
     meal_id: UUID,
     meal_update: MealUpdate,
-    token_data: TokenData = Depends(get_token_data)
+    token_data: TokenData = Depends(get_token_data),
+    if_match: Optional[str] = Header(None, description="Only update if the meal still has this ETag")
 ):
     """
     Update a specific meal by ID.
+    
+    Only the fields present in the request are written, with a partial
+    document patch within the user's household partition.
     """
     try:
-        meals_container = cosmos_db.get_container("meals")
-        
-        # First get the existing meal
-        query = "SELECT * FROM c WHERE c.id = @id"
-        params = [{"name": "@id", "value": str(meal_id)}]
-        
-        # Execute query
-        meals = []
-        for meal in meals_container.query_items(
-            query=query,
-            parameters=params,
-            enable_cross_partition_query=True
-        ):
-            meals.append(MealDB(**meal))
-        
-        if not meals:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Meal with ID {meal_id} not found"
-            )
-        
-        existing_meal = meals[0]
-        
-        # Check if user has access to update this meal
-        if str(existing_meal.household_id) != token_data.sub:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You don't have permission to update this meal"
-            )
-        
-        # Update the meal with new values
-        update_data = meal_update.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            setattr(existing_meal, key, value)
-        
-        # Update the timestamp
-        from datetime import datetime
-        existing_meal.updated_at = datetime.utcnow()
-        
-        # Save the updated meal
-        meals_container.replace_item(
-            item=str(existing_meal.id), 
-            body=existing_meal.model_dump(by_alias=True)
+        # Only the fields sent by the client are written, plus the timestamp
+        update_data = meal_update.to_db(exclude_unset=True)
+        update_data["updated_at"] = datetime.utcnow().isoformat()
+        
+        # Patch the meal; it can only be found within the user's own household
+        meal = await meals_repository.patch(
+            meal_id,
+            token_data.sub,
+            to_patch_operations(update_data),
+            etag=if_match
         )
+        publish_upsert(SyncEntity.MEAL, meal)
         
-        return existing_meal
+        return MealDB(**meal)
         
-    except HTTPException:
-        raise
+    except CosmosResourceNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Meal with ID {meal_id} not found"
+        )
+    except CosmosAccessConditionFailedError:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=f"Meal with ID {meal_id} has been modified"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -214,28 +232,16 @@ async def delete_meal(
     Delete a specific meal by ID.
     """
     try:
-        meals_container = cosmos_db.get_container("meals")
-        
-        # First get the existing meal
-        query = "SELECT * FROM c WHERE c.id = @id"
-        params = [{"name": "@id", "value": str(meal_id)}]
+        # First get the existing meal with a point read
+        meal = await meals_repository.get(meal_id, token_data.sub)
         
-        # Execute query
-        meals = []
-        for meal in meals_container.query_items(
-            query=query,
-            parameters=params,
-            enable_cross_partition_query=True
-        ):
-            meals.append(MealDB(**meal))
-        
-        if not meals:
+        if meal is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Meal with ID {meal_id} not found"
             )
         
-        existing_meal = meals[0]
+        existing_meal = MealDB(**meal)
         
         # Check if user has access to delete this meal
         if str(existing_meal.household_id) != token_data.sub:
@@ -245,10 +251,9 @@ async def delete_meal(
             )
         
         # Delete the meal
-        meals_container.delete_item(
-            item=str(existing_meal.id),
-            partition_key=str(existing_meal.household_id)
-        )
+        await meals_repository.delete(existing_meal.id, existing_meal.household_id)
+        await record_deletion(SyncEntity.MEAL, existing_meal.id, existing_meal.household_id)
+        publish_delete(SyncEntity.MEAL, existing_meal.id, existing_meal.household_id)
         
         return None
         
@@ -0,0 +1,54 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.core.oidc import get_token_data, TokenData
+from app.db.repository import InvalidContinuationToken
+from app.models.meal import Meal
+from app.models.meal_plan import MealPlanEntry
+from app.models.meal_rating import MealRating
+from app.models.sync import SyncEntity, SyncResponse
+from app.services.sync import changes_since
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"],
+    responses={
+        400: {"description": "Invalid cursor"},
+        401: {"description": "Not authenticated"}
+    },
+)
+
+@router.get("/", response_model=SyncResponse)
+async def sync(
+    token_data: TokenData = Depends(get_token_data),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous sync; omit for a full snapshot")
+):
+    """
+    Get the meals, meal plan entries and ratings changed or deleted since `cursor`.
+    
+    Without a cursor, or with one older than deletions are kept for, the whole
+    household is returned with `reset` set and the client should replace its
+    copy. Changes are applied by ID, so documents sent again are harmless.
+    The returned `cursor` is passed to the next sync.
+    """
+    try:
+        changes = await changes_since(token_data.sub, cursor)
+        changed = changes["changed"]
+        return SyncResponse(
+            cursor=changes["cursor"],
+            reset=changes["reset"],
+            meals=[Meal(**meal) for meal in changed[SyncEntity.MEAL]],
+            meal_plans=[MealPlanEntry(**plan) for plan in changed[SyncEntity.MEAL_PLAN]],
+            meal_ratings=[MealRating(**rating) for rating in changed[SyncEntity.MEAL_RATING]],
+            deleted=changes["deleted"],
+        )
+        
+    except InvalidContinuationToken as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error syncing: {str(e)}"
+        )
@@ -0,0 +1,52 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from app.core.oidc import get_token_data, TokenData
+from app.services.bulk_transfer import export_household, import_household
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+router = APIRouter(
+    tags=["transfer"],
+    responses={
+        401: {"description": "Not authenticated"}
+    },
+)
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_data(
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Download the household's meals, meal plan entries and ratings as NDJSON.
+    
+    The file is streamed as it is read from the database. Its last line is
+    `{"type": "end", ...}`; a file without it was cut short.
+    """
+    filename = f"foodpal-export-{date.today().isoformat()}.ndjson"
+    return StreamingResponse(
+        export_household(token_data.sub),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/import")
+async def import_data(
+    request: Request,
+    token_data: TokenData = Depends(get_token_data)
+):
+    """
+    Upload an NDJSON file produced by /export into the household.
+    
+    Send the file as the raw request body. Documents keep their IDs, so
+    importing the same file twice overwrites rather than duplicates. Returns
+    per-type counts, throughput and the errors of lines that were skipped.
+    """
+    try:
+        return await import_household(token_data.sub, request.stream())
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error importing data: {str(e)}"
+        )
@@ -9,6 +9,9 @@ class Settings(BaseSettings):
     # CORS
     CORS_ORIGINS: list = ["http://localhost:3000"]
     
+    # Storage backend: "cosmos" for Azure Cosmos DB, "memory" for the in-process store
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "cosmos")
+    
     # Azure Cosmos DB
     USE_COSMOS_EMULATOR: bool = os.getenv("USE_COSMOS_EMULATOR", "true").lower() == "true"
     COSMOS_EMULATOR_ENDPOINT: str = os.getenv("COSMOS_EMULATOR_ENDPOINT", "https://localhost:8081")
@@ -16,6 +19,71 @@ class Settings(BaseSettings):
     COSMOS_KEY: str = os.getenv("COSMOS_KEY", "C2y6yDjf5/R+ob0N8A7Cgv30VRDJIWEHLM+4QDU5DE2nQ9nDuVTqobD4b8mGGyPMbIZnqyMsEcaGQy67XIw/Jw==")
     COSMOS_DATABASE: str = os.getenv("COSMOS_DATABASE", "foodpal-dev")
     
+    # Cosmos call diagnostics: calls above either threshold are logged
+    COSMOS_SLOW_QUERY_RU: float = float(os.getenv("COSMOS_SLOW_QUERY_RU", "50"))
+    COSMOS_SLOW_QUERY_MS: float = float(os.getenv("COSMOS_SLOW_QUERY_MS", "500"))
+    
+    # Serve the process counters at /metrics, to authenticated callers only
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    
+    # List pagination
+    DEFAULT_PAGE_SIZE: int = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+    MAX_PAGE_SIZE: int = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+    
+    # Serve list endpoints by projecting stored documents straight to JSON
+    # instead of validating them into response models
+    FAST_LIST_RESPONSES: bool = os.getenv("FAST_LIST_RESPONSES", "false").lower() == "true"
+    
+    # How long deletions are remembered for /sync; clients whose cursor is
+    # older get a full snapshot instead of a delta
+    SYNC_TOMBSTONE_TTL_SECONDS: int = int(os.getenv("SYNC_TOMBSTONE_TTL_SECONDS", str(30 * 24 * 3600)))
+    
+    # Server-Sent Events: events buffered per connection before the client
+    # is told to resync, seconds between heartbeats, and connections allowed
+    # per household on one worker
+    EVENTS_QUEUE_SIZE: int = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+    EVENTS_HEARTBEAT_SECONDS: float = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+    EVENTS_MAX_SUBSCRIPTIONS_PER_HOUSEHOLD: int = int(os.getenv("EVENTS_MAX_SUBSCRIPTIONS_PER_HOUSEHOLD", "20"))
+    
+    # Publish events from the Cosmos change feed instead of the local writes,
+    # so every worker sees the writes of the others
+    EVENTS_CHANGE_FEED: bool = os.getenv("EVENTS_CHANGE_FEED", "false").lower() == "true"
+    EVENTS_CHANGE_FEED_POLL_SECONDS: float = float(os.getenv("EVENTS_CHANGE_FEED_POLL_SECONDS", "1"))
+    
+    # Change feed processors: changes per handler call, seconds between
+    # reads of a caught-up feed range, how long a lease is kept without
+    # renewal and how often it is renewed, the longest wait before a failed
+    # batch is delivered again, and how often a document is delivered before
+    # it is dead-lettered
+    CHANGE_FEED_MAX_ITEMS: int = int(os.getenv("CHANGE_FEED_MAX_ITEMS", "100"))
+    CHANGE_FEED_POLL_SECONDS: float = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "1"))
+    CHANGE_FEED_LEASE_EXPIRY_SECONDS: float = float(os.getenv("CHANGE_FEED_LEASE_EXPIRY_SECONDS", "30"))
+    CHANGE_FEED_LEASE_RENEW_SECONDS: float = float(os.getenv("CHANGE_FEED_LEASE_RENEW_SECONDS", "10"))
+    CHANGE_FEED_MAX_RETRY_DELAY_SECONDS: float = float(os.getenv("CHANGE_FEED_MAX_RETRY_DELAY_SECONDS", "30"))
+    CHANGE_FEED_MAX_ATTEMPTS: int = int(os.getenv("CHANGE_FEED_MAX_ATTEMPTS", "5"))
+    
+    # Longest date range a plan template or copy is expanded over
+    PLAN_EXPANSION_MAX_DAYS: int = int(os.getenv("PLAN_EXPANSION_MAX_DAYS", "366"))
+    
+    # Most mutations accepted by one /batch request
+    BATCH_MAX_OPERATIONS: int = int(os.getenv("BATCH_MAX_OPERATIONS", "1000"))
+    
+    # NDJSON bulk import: concurrent upserts, longest accepted line and how
+    # many per-line errors are listed in the report
+    IMPORT_CONCURRENCY: int = int(os.getenv("IMPORT_CONCURRENCY", "16"))
+    IMPORT_MAX_LINE_BYTES: int = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
+    IMPORT_MAX_REPORTED_ERRORS: int = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "100"))
+    
+    # In-process meal document cache
+    MEAL_CACHE_MAX_SIZE: int = int(os.getenv("MEAL_CACHE_MAX_SIZE", "5000"))
+    MEAL_CACHE_TTL_SECONDS: float = float(os.getenv("MEAL_CACHE_TTL_SECONDS", "60"))
+    
+    # Background jobs for deferred side effects
+    JOB_QUEUE_CONCURRENCY: int = int(os.getenv("JOB_QUEUE_CONCURRENCY", "4"))
+    JOB_QUEUE_MAX_ATTEMPTS: int = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "3"))
+    JOB_QUEUE_RETRY_DELAY_SECONDS: float = float(os.getenv("JOB_QUEUE_RETRY_DELAY_SECONDS", "0.5"))
+    JOB_QUEUE_SHUTDOWN_TIMEOUT_SECONDS: float = float(os.getenv("JOB_QUEUE_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+    
     # JWT Authentication
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-for-development")
     ALGORITHM: str = "HS256"
@@ -32,6 +100,14 @@ class Settings(BaseSettings):
     AZURE_AD_B2C_POLICY_SIGNUP: str = os.getenv("AZURE_AD_B2C_POLICY_SIGNUP", "B2C_1_signup")
     AZURE_AD_B2C_POLICY: str = os.getenv("AZURE_AD_B2C_POLICY", "B2C_1_signupsignin")
     
+    # Signing key (JWKS) cache for token validation
+    JWKS_CACHE_TTL_SECONDS: float = float(os.getenv("JWKS_CACHE_TTL_SECONDS", "3600"))
+    JWKS_MIN_REFRESH_INTERVAL_SECONDS: float = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL_SECONDS", "30"))
+    
+    # Cache of already validated bearer tokens
+    TOKEN_CACHE_MAX_SIZE: int = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "10000"))
+    TOKEN_CACHE_MAX_TTL_SECONDS: float = float(os.getenv("TOKEN_CACHE_MAX_TTL_SECONDS", "3600"))
+    
     # Google OAuth
     GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "")
     GOOGLE_CLIENT_SECRET: str = os.getenv("GOOGLE_CLIENT_SECRET", "")
@@ -0,0 +1,139 @@
+import asyncio
+import base64
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from authlib.jose import JsonWebKey
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownSigningKeyError(Exception):
+    """Raised when a token is signed with a key that is not in the JWKS."""
+
+
+def get_unverified_kid(token: str) -> Optional[str]:
+    """Read the `kid` from a JWT header without verifying the token."""
+    header_segment = token.split(".", 1)[0]
+    header = json.loads(base64.urlsafe_b64decode(header_segment + "=" * (-len(header_segment) % 4)))
+    return header.get("kid")
+
+
+class JWKSCache:
+    """Process-wide cache of an identity provider's signing keys, keyed by `kid`.
+
+    Keys are parsed once and kept in memory. Once the TTL has passed the
+    cached keys keep being served while a refresh runs in the background;
+    a blocking refresh only happens on a cold cache or when a token carries
+    an unknown `kid` (rate-limited by ``min_refresh_interval``).
+    """
+
+    def __init__(self, jwks_uri: str, ttl_seconds: float = 3600, min_refresh_interval: float = 30, timeout: float = 5):
+        self.jwks_uri = jwks_uri
+        self.ttl_seconds = ttl_seconds
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._last_attempt = 0.0
+        self._last_finished = -1.0
+        self._lock = asyncio.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._background_refresh: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._fetched_at >= self.ttl_seconds
+
+    async def refresh(self, force: bool = False) -> None:
+        """Download the JWKS and replace the cached keys.
+
+        Concurrent callers share a single download: a caller that waited for
+        the lock while another one downloaded returns with its result instead
+        of downloading again. Unless ``force`` is set a refresh is also
+        skipped when one happened within ``min_refresh_interval``.
+        """
+        requested_at = time.monotonic()
+        async with self._lock:
+            if self._last_finished >= requested_at:
+                return
+            if not force and time.monotonic() - self._last_attempt < self.min_refresh_interval:
+                return
+            self._last_attempt = time.monotonic()
+            try:
+                response = await self._get_client().get(self.jwks_uri)
+            finally:
+                self._last_finished = time.monotonic()
+            response.raise_for_status()
+            keys = {}
+            for jwk in response.json()["keys"]:
+                try:
+                    keys[jwk.get("kid")] = JsonWebKey.import_key(jwk)
+                except Exception as e:
+                    logger.warning(f"Skipping unusable JWKS key {jwk.get('kid')}: {e}")
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            self.refreshes += 1
+            logger.info(f"Refreshed JWKS from {self.jwks_uri} ({len(keys)} keys)")
+
+    def _refresh_in_background(self) -> None:
+        if self._background_refresh is not None and not self._background_refresh.done():
+            return
+
+        async def run():
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Background JWKS refresh failed, keeping cached keys: {e}")
+
+        self._background_refresh = asyncio.create_task(run())
+
+    async def get_key(self, kid: Optional[str]) -> Any:
+        """Return the parsed signing key for ``kid``."""
+        if not self._keys:
+            await self.refresh(force=True)
+        elif self.is_stale:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is not None:
+            self.hits += 1
+            return key
+
+        # Unknown kid: the provider may have rotated its keys
+        self.misses += 1
+        await self.refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            raise UnknownSigningKeyError(f"No signing key with kid {kid!r}")
+        return key
+
+    async def close(self) -> None:
+        """Cancel any background refresh and close the HTTP client."""
+        if self._background_refresh is not None:
+            self._background_refresh.cancel()
+            self._background_refresh = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters."""
+        return {
+            "keys": len(self._keys),
+            "refreshes": self.refreshes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "age_seconds": time.monotonic() - self._fetched_at if self._fetched_at else None,
+        }
@@ -2,14 +2,16 @@ from typing import Dict, Optional, List, Any
 from authlib.integrations.starlette_client import OAuth
 from authlib.oidc.core import CodeIDToken
 from authlib.jose import jwt
+import hashlib
 import time
 import logging
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2AuthorizationCodeBearer
 from pydantic import BaseModel
-import httpx  # Add this import
 
 from app.core.config import settings
+from app.core.jwks import JWKSCache, get_unverified_kid
+from app.utils.cache import TTLCache
 
 # Setup logger
 logger = logging.getLogger(__name__)
@@ -19,6 +21,22 @@ b2c_tenant = settings.AZURE_AD_B2C_TENANT_NAME or settings.AZURE_AD_B2C_TENANT_N
 b2c_domain = settings.AZURE_AD_B2C_TENANT_DOMAIN or f"{b2c_tenant}.onmicrosoft.com"
 b2c_policy = settings.AZURE_AD_B2C_POLICY
 
+jwks_uri = f"https://{b2c_tenant}.b2clogin.com/{b2c_domain}/discovery/v2.0/keys?p={b2c_policy}"
+
+# Process-wide cache of the B2C signing keys
+jwks_cache = JWKSCache(
+    jwks_uri,
+    ttl_seconds=settings.JWKS_CACHE_TTL_SECONDS,
+    min_refresh_interval=settings.JWKS_MIN_REFRESH_INTERVAL_SECONDS,
+)
+
+# Tokens that already passed validation, keyed by a hash of the raw token and
+# kept until they expire
+token_cache = TTLCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl_seconds=settings.TOKEN_CACHE_MAX_TTL_SECONDS,
+)
+
 oauth2_scheme = OAuth2AuthorizationCodeBearer(
     authorizationUrl=f"https://{b2c_tenant}.b2clogin.com/{b2c_domain}/{b2c_policy}/oauth2/v2.0/authorize",
     tokenUrl=f"https://{b2c_tenant}.b2clogin.com/{b2c_domain}/{b2c_policy}/oauth2/v2.0/token"
@@ -66,23 +84,22 @@ async def get_token_data(token: str = Depends(oauth2_scheme)) -> TokenData:
     """
     Decode and validate JWT token
     """
-    try:
-        # Get Azure AD B2C JWKS using new env variables
-        b2c_tenant = settings.AZURE_AD_B2C_TENANT_NAME or settings.AZURE_AD_B2C_TENANT_NAME
-        b2c_domain = settings.AZURE_AD_B2C_TENANT_DOMAIN or f"{b2c_tenant}.onmicrosoft.com"
-        b2c_policy = settings.AZURE_AD_B2C_POLICY
-        jwks_uri = f"https://{b2c_tenant}.b2clogin.com/{b2c_domain}/discovery/v2.0/keys?p={b2c_policy}"
+    # Warm tokens skip signature verification and claim validation
+    cache_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    cached = token_cache.get(cache_key)
+    if cached is not None:
+        if cached.exp is None or cached.exp > time.time():
+            return cached
+        token_cache.pop(cache_key)
 
-        # Fetch JWKS and extract keys
-        async with httpx.AsyncClient() as client:
-            jwks_response = await client.get(jwks_uri)
-            jwks = jwks_response.json()
-            keys = jwks["keys"]
+    try:
+        # Look up the signing key in the cached B2C JWKS
+        key = await jwks_cache.get_key(get_unverified_kid(token))
 
-        # Decode the token using the JWKS keys
+        # Decode the token using the signing key
         payload = jwt.decode(
             token,
-            keys,
+            key,
             claims_options={
                 "iss": {"essential": True, "value": f"https://{b2c_tenant}.b2clogin.com/{b2c_domain}/v2.0/"},
                 "aud": {"essential": True, "value": settings.AZURE_AD_B2C_CLIENT_ID}
@@ -106,6 +123,10 @@ async def get_token_data(token: str = Depends(oauth2_scheme)) -> TokenData:
             exp=payload.get("exp")
         )
         
+        # Only cache tokens with a known expiry
+        if token_data.exp is not None:
+            token_cache.set(cache_key, token_data, ttl_seconds=token_data.exp - time.time())
+        
         return token_data
         
     except Exception as e:
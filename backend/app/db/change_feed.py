@@ -0,0 +1,554 @@
+"""
+Change feed processors: handlers that react to the writes in a container
+without adding to the latency of the writes.
+
+A processor reads the change feed of one container with one consumer task
+per feed range and passes every batch of changed documents to its handler,
+in write order within the range. A range's position is checkpointed only
+after the handler returned, so delivery is at least once: a failing handler
+gets the same batch again after a backoff, and a batch whose worker stopped
+before the checkpoint is read again by the worker taking over the range.
+Handlers must therefore be idempotent. A batch still failing after
+CHANGE_FEED_MAX_ATTEMPTS is retried one document at a time, and documents
+that keep failing are dead-lettered: logged, counted and skipped. Deleted
+documents are not in the change feed; deletions show up as tombstones
+instead.
+
+Leased processors keep a lease document per feed range in the `leases`
+container with the range's continuation and the worker owning it. Workers
+renew their leases every CHANGE_FEED_LEASE_RENEW_SECONDS and take over
+leases nobody renewed for CHANGE_FEED_LEASE_EXPIRY_SECONDS, each up to its
+share of the ranges, so the ranges are spread over the running workers.
+A worker short of its share asks the busiest one for a lease, which hands
+it over at its next checkpoint, so rebalancing does not deliver batches
+twice. Lease writes are conditional on the lease's ETag, so a range is
+never checkpointed by two workers.
+
+Broadcast processors have no leases: every worker reads every range from
+the moment it starts and keeps its position in memory. They suit state
+held per worker, such as caches or connected clients.
+"""
+import asyncio
+import logging
+import math
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError, CosmosResourceExistsError
+
+from app.core.config import settings
+from app.db.diagnostics import cosmos_diagnostics
+from app.db.repository import HOUSEHOLD_PARTITION_KEY, HouseholdRepository, leases_repository
+from app.db.storage import Storage, storage
+
+logger = logging.getLogger(__name__)
+
+# Called with a batch of changed documents; may be called again with
+# documents it already processed, so it must be idempotent
+ChangeHandler = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+# Dead-lettered documents kept per range for stats()
+MAX_RECENT_DEAD_LETTERS = 10
+
+# Identifies this worker as the owner of leases
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+class LeaseLost(Exception):
+    """Raised when another worker took over a lease."""
+
+
+class Lease:
+    """Ownership of and position in one feed range of a processor."""
+
+    def __init__(
+        self,
+        processor: str,
+        index: int,
+        feed_range: Dict[str, Any],
+        continuation: Optional[str] = None,
+        owner: Optional[str] = None,
+        renewed_at: float = 0.0,
+        requested_by: Optional[str] = None,
+        etag: Optional[str] = None,
+    ):
+        self.processor = processor
+        self.index = index
+        self.feed_range = feed_range
+        self.continuation = continuation
+        self.owner = owner
+        self.renewed_at = renewed_at
+        # A worker waiting for the owner to hand the lease over
+        self.requested_by = requested_by
+        self.etag = etag
+
+    @property
+    def id(self) -> str:
+        return f"{self.processor}:{self.index}"
+
+    def expired(self, now: float, expiry: float) -> bool:
+        return self.owner is None or now - self.renewed_at >= expiry
+
+    def to_db(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "pk": self.processor,
+            "processor": self.processor,
+            "index": self.index,
+            "feed_range": self.feed_range,
+            "continuation": self.continuation,
+            "owner": self.owner,
+            "renewed_at": self.renewed_at,
+            "requested_by": self.requested_by,
+        }
+
+    @classmethod
+    def from_db(cls, document: Dict[str, Any]) -> "Lease":
+        return cls(
+            document["processor"],
+            document["index"],
+            document["feed_range"],
+            continuation=document.get("continuation"),
+            owner=document.get("owner"),
+            renewed_at=document.get("renewed_at") or 0.0,
+            requested_by=document.get("requested_by"),
+            etag=document.get("_etag"),
+        )
+
+
+class LeaseStore:
+    """Lease documents of the leased processors, one partition per processor."""
+
+    def __init__(self, repository: HouseholdRepository = leases_repository):
+        self.repository = repository
+
+    async def load(self, processor: str) -> List[Lease]:
+        query = "SELECT * FROM c WHERE c.processor = @processor"
+        params = [{"name": "@processor", "value": processor}]
+        leases = [Lease.from_db(document) async for document in self.repository.query(query, params, processor)]
+        return sorted(leases, key=lambda lease: lease.index)
+
+    async def create_missing(self, processor: str, feed_ranges: List[Dict[str, Any]]) -> None:
+        """Create the leases of a processor that has none yet, one per feed range.
+
+        The set of leases is fixed once created: the continuation of a range
+        stays valid when Cosmos splits its partition.
+        """
+        if await self.load(processor):
+            return
+        for index, feed_range in enumerate(feed_ranges):
+            try:
+                await self.repository.create(Lease(processor, index, feed_range).to_db())
+            except CosmosResourceExistsError:
+                # Another worker is creating the same leases
+                pass
+
+    async def get(self, processor: str, index: int) -> Optional[Lease]:
+        document = await self.repository.get(f"{processor}:{index}", processor)
+        return Lease.from_db(document) if document is not None else None
+
+    async def write(self, lease: Lease) -> None:
+        """Store a lease, unless someone else wrote it since it was read."""
+        try:
+            stored = await self.repository.replace(lease.to_db(), etag=lease.etag)
+        except CosmosAccessConditionFailedError as e:
+            raise LeaseLost(f"Lease {lease.id} was taken over") from e
+        lease.etag = stored.get("_etag")
+
+
+class RangeMetrics:
+    """Progress of one feed range on this worker."""
+
+    def __init__(self):
+        self.changes = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.recent_dead_letters: List[Dict[str, Any]] = []
+        self.read_errors = 0
+        # Age of the oldest change read but not yet delivered
+        self.lag_seconds = 0.0
+        self.last_read_at: Optional[float] = None
+        self.checkpointed_at: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "changes": self.changes,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "recent_dead_letters": self.recent_dead_letters,
+            "read_errors": self.read_errors,
+            "lag_seconds": round(self.lag_seconds, 3),
+            "last_read_at": self.last_read_at,
+            "checkpointed_at": self.checkpointed_at,
+        }
+
+
+class ChangeFeedProcessor:
+    """Delivers the change feed of a container to a handler, one consumer per feed range."""
+
+    def __init__(
+        self,
+        name: str,
+        container_id: str,
+        handler: ChangeHandler,
+        leases: Optional[LeaseStore] = None,
+        start_from: Any = "Now",
+        max_items: int = 100,
+        poll_interval: float = 1.0,
+        lease_expiry: float = 30.0,
+        lease_renew: float = 10.0,
+        max_retry_delay: float = 30.0,
+        max_attempts: int = 5,
+        db: Storage = storage,
+        owner: str = INSTANCE_ID,
+    ):
+        self.name = name
+        self.container_id = container_id
+        self.handler = handler
+        self.leases = leases
+        # Where ranges without a checkpoint start: "Now", "Beginning" or a datetime
+        self.start_from = start_from
+        self.max_items = max_items
+        self.poll_interval = poll_interval
+        self.lease_expiry = lease_expiry
+        self.lease_renew = lease_renew
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.db = db
+        self.owner = owner
+        self.metrics: Dict[int, RangeMetrics] = {}
+        self._consumers: Dict[int, asyncio.Task] = {}
+        self._owned: Dict[int, Lease] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start reading on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Started change feed processor {self.name} on {self.container_id}")
+
+    async def stop(self) -> None:
+        """Stop the consumers and hand their leases back for other workers to take."""
+        owned = list(self._owned.values())
+        tasks = [task for task in (self._task, *self._consumers.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._consumers = {}
+        if self.leases is not None:
+            for lease in owned:
+                lease.owner = None
+                try:
+                    await self.leases.write(lease)
+                except Exception as e:
+                    logger.warning(f"Failed to release lease {lease.id}: {e}")
+        self._owned = {}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                container = await self.db.get_container(self.container_id, partition_key=HOUSEHOLD_PARTITION_KEY)
+                feed_ranges = [feed_range async for feed_range in container.read_feed_ranges()]
+                if self.leases is not None:
+                    await self.leases.create_missing(self.name, feed_ranges)
+                break
+            except Exception as e:
+                logger.error(f"Failed to start change feed processor {self.name}, retrying: {e}")
+                await asyncio.sleep(self.lease_renew)
+        if self.leases is None:
+            for index, feed_range in enumerate(feed_ranges):
+                self._spawn(container, Lease(self.name, index, feed_range, owner=self.owner))
+            return
+        while True:
+            try:
+                await self._balance(container)
+            except Exception as e:
+                logger.error(f"Failed to balance the leases of change feed processor {self.name}: {e}")
+            await asyncio.sleep(self.lease_renew)
+
+    async def _balance(self, container: Any) -> None:
+        """Take over free and expired leases, up to this worker's share of them.
+
+        A worker below its share with no free lease left asks the worker
+        holding the most for one lease per round. That worker releases it at
+        its next checkpoint, and it is taken over as a free lease.
+        """
+        leases = await self.leases.load(self.name)
+        now = time.time()
+        held: Dict[str, List[Lease]] = {}
+        for lease in leases:
+            if not lease.expired(now, self.lease_expiry) and lease.index not in self._consumers:
+                held.setdefault(lease.owner, []).append(lease)
+        owners = set(held) | {self.owner}
+        share = math.ceil(len(leases) / len(owners))
+        candidates = [
+            lease for lease in leases
+            if lease.index not in self._consumers
+            and (lease.owner == self.owner or lease.expired(now, self.lease_expiry))
+        ]
+        busiest = max((owned for owner, owned in held.items() if owner != self.owner), key=len, default=[])
+        if len(self._consumers) + len(candidates) < share and len(busiest) > share:
+            await self._request_handover(busiest)
+        for lease in candidates:
+            if len(self._consumers) >= share:
+                break
+            lease.owner = self.owner
+            lease.renewed_at = now
+            lease.requested_by = None
+            try:
+                await self.leases.write(lease)
+            except LeaseLost:
+                continue
+            logger.info(f"Change feed processor {self.name} acquired lease {lease.id}")
+            self._spawn(container, lease)
+
+    async def _request_handover(self, owned: List[Lease]) -> None:
+        """Ask another worker to release one of its leases, unless one is already asked for."""
+        if any(lease.requested_by is not None for lease in owned):
+            return
+        lease = owned[0]
+        lease.requested_by = self.owner
+        try:
+            await self.leases.write(lease)
+        except LeaseLost:
+            return
+        logger.info(f"Change feed processor {self.name} asked {lease.owner} for lease {lease.id}")
+
+    def _spawn(self, container: Any, lease: Lease) -> None:
+        self._owned[lease.index] = lease
+        self.metrics.setdefault(lease.index, RangeMetrics())
+        task = asyncio.create_task(self._consume(container, lease))
+        self._consumers[lease.index] = task
+        task.add_done_callback(lambda _: self._forget(lease.index, task))
+
+    def _forget(self, index: int, task: asyncio.Task) -> None:
+        if self._consumers.get(index) is task:
+            del self._consumers[index]
+            self._owned.pop(index, None)
+
+    async def _consume(self, container: Any, lease: Lease) -> None:
+        metrics = self.metrics[lease.index]
+        try:
+            while True:
+                try:
+                    changes, continuation = await self._read(container, lease)
+                except Exception as e:
+                    metrics.read_errors += 1
+                    logger.error(f"Failed to read range {lease.index} of the {self.container_id} change feed: {e}")
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                metrics.last_read_at = time.time()
+                if changes:
+                    metrics.lag_seconds = max(0.0, time.time() - changes[0].get("_ts", time.time()))
+                    await self._deliver(lease, metrics, changes)
+                    lease.continuation = continuation
+                    await self._checkpoint(lease, metrics)
+                    metrics.changes += len(changes)
+                    metrics.batches += 1
+                    metrics.lag_seconds = 0.0
+                    if len(changes) >= self.max_items:
+                        continue
+                elif continuation != lease.continuation:
+                    # Nothing was skipped, so the position is saved with the next renewal
+                    first_read = lease.continuation is None
+                    lease.continuation = continuation
+                    if first_read:
+                        await self._checkpoint(lease, metrics)
+                await self._renew_if_due(lease, metrics)
+                await asyncio.sleep(self.poll_interval)
+        except LeaseLost:
+            logger.info(f"Change feed processor {self.name} lost lease {lease.id}")
+
+    async def _read(self, container: Any, lease: Lease) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Read up to max_items changes of a range and return them with the continuation after them."""
+        # The SDK rewrites the etag header of each response into the
+        # continuation after the hook ran, so keep the headers, not a copy
+        responses: List[Any] = []
+        if lease.continuation:
+            position = {"continuation": lease.continuation}
+        else:
+            position = {"feed_range": lease.feed_range, "start_time": self.start_from}
+        with cosmos_diagnostics.track(self.container_id, "change_feed") as call:
+            def hook(headers: Any, result: Any) -> None:
+                call.hook(headers, result)
+                responses.append(headers)
+
+            pages = container.query_items_change_feed(
+                max_item_count=self.max_items,
+                response_hook=hook,
+                **position
+            ).by_page()
+            try:
+                page = await pages.__anext__()
+                changes = [change async for change in page]
+            except StopAsyncIteration:
+                changes = []
+            call.add_items(len(changes))
+        continuation = responses[-1].get("etag") if responses else None
+        return changes, continuation or lease.continuation
+
+    async def _deliver(self, lease: Lease, metrics: RangeMetrics, changes: List[Dict[str, Any]]) -> None:
+        """Pass a batch to the handler, retrying it and dead-lettering what keeps failing.
+
+        A batch that fails max_attempts times is delivered again one document
+        at a time, so only the documents the handler cannot process are
+        skipped.
+        """
+        error = await self._attempt(lease, metrics, changes)
+        if error is None:
+            return
+        if len(changes) == 1:
+            self._dead_letter(lease, metrics, changes[0], error)
+            return
+        for change in changes:
+            error = await self._attempt(lease, metrics, [change])
+            if error is not None:
+                self._dead_letter(lease, metrics, change, error)
+
+    async def _attempt(self, lease: Lease, metrics: RangeMetrics, changes: List[Dict[str, Any]]) -> Optional[Exception]:
+        """Call the handler up to max_attempts times, backing off between attempts.
+
+        Returns the last error, or None once the handler accepted the changes.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self.handler(changes)
+                return None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.failures += 1
+                if attempt == self.max_attempts:
+                    return e
+                delay = min(self.max_retry_delay, self.poll_interval * 2 ** (attempt - 1))
+                logger.error(
+                    f"Change feed processor {self.name} failed on {len(changes)} changes of range {lease.index} "
+                    f"(attempt {attempt} of {self.max_attempts}), retrying in {delay:.1f}s: {e}"
+                )
+                await asyncio.sleep(delay)
+                await self._renew_if_due(lease, metrics)
+
+    def _dead_letter(self, lease: Lease, metrics: RangeMetrics, change: Dict[str, Any], error: Exception) -> None:
+        """Skip a document the handler kept failing on, leaving a record of it."""
+        metrics.dead_lettered += 1
+        metrics.recent_dead_letters.append({
+            "id": change.get("id"),
+            "pk": change.get("pk"),
+            "ts": change.get("_ts"),
+            "error": str(error),
+        })
+        del metrics.recent_dead_letters[:-MAX_RECENT_DEAD_LETTERS]
+        logger.error(
+            f"Change feed processor {self.name} skipped document {change.get('id')} "
+            f"(pk {change.get('pk')}) of range {lease.index} after {self.max_attempts} attempts: {error}"
+        )
+
+    async def _checkpoint(self, lease: Lease, metrics: RangeMetrics) -> None:
+        """Store the lease's position and renew it, handing it over if another worker asked for it.
+
+        Raises LeaseLost once the lease belongs to another worker or was
+        handed over.
+        """
+        if self.leases is None:
+            return
+        lease.renewed_at = time.time()
+        try:
+            await self.leases.write(lease)
+        except LeaseLost:
+            # A handover request changes the lease's ETag but not its owner
+            stored = await self.leases.get(lease.processor, lease.index)
+            if stored is None or stored.owner != self.owner:
+                raise
+            lease.etag = stored.etag
+            lease.requested_by = stored.requested_by
+            await self.leases.write(lease)
+        metrics.checkpointed_at = lease.renewed_at
+        if lease.requested_by is not None:
+            lease.owner = None
+            await self.leases.write(lease)
+            logger.info(f"Change feed processor {self.name} handed lease {lease.id} over to {lease.requested_by}")
+            raise LeaseLost(f"Lease {lease.id} was handed over")
+
+    async def _renew_if_due(self, lease: Lease, metrics: RangeMetrics) -> None:
+        if self.leases is not None and time.time() - lease.renewed_at >= self.lease_renew:
+            await self._checkpoint(lease, metrics)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "container": self.container_id,
+            "leased": self.leases is not None,
+            "running": self._task is not None and (not self._task.done() or bool(self._consumers)),
+            "ranges": sorted(self._consumers),
+            "changes": sum(metrics.changes for metrics in self.metrics.values()),
+            "failures": sum(metrics.failures for metrics in self.metrics.values()),
+            "dead_lettered": sum(metrics.dead_lettered for metrics in self.metrics.values()),
+            "lag_seconds": max((metrics.lag_seconds for metrics in self.metrics.values()), default=0.0),
+            "range_metrics": {index: metrics.as_dict() for index, metrics in sorted(self.metrics.items())},
+        }
+
+
+class ChangeFeedHost:
+    """The change feed processors registered in this worker."""
+
+    def __init__(self, db: Storage = storage):
+        self.db = db
+        self.processors: Dict[str, ChangeFeedProcessor] = {}
+
+    def register(
+        self,
+        name: str,
+        container_id: str,
+        handler: ChangeHandler,
+        broadcast: bool = False,
+        start_from: Any = "Now",
+        poll_interval: Optional[float] = None,
+    ) -> ChangeFeedProcessor:
+        """Register a handler for the changes of a container.
+
+        ``name`` identifies the processor's leases, so renaming a leased
+        processor starts it over from ``start_from``. Broadcast processors
+        run on every worker without leases.
+
+        Delivery is at least once: after a handler failure, a worker crash
+        or a lease expiry the handler gets documents it may already have
+        processed, so it must be idempotent. Documents it still fails on
+        after CHANGE_FEED_MAX_ATTEMPTS are skipped and counted as
+        ``dead_lettered`` in stats().
+        """
+        if name in self.processors:
+            raise ValueError(f"Change feed processor {name} is already registered")
+        processor = ChangeFeedProcessor(
+            name,
+            container_id,
+            handler,
+            leases=None if broadcast else LeaseStore(HouseholdRepository(leases_repository.container_id, self.db)),
+            start_from=start_from,
+            max_items=settings.CHANGE_FEED_MAX_ITEMS,
+            poll_interval=settings.CHANGE_FEED_POLL_SECONDS if poll_interval is None else poll_interval,
+            lease_expiry=settings.CHANGE_FEED_LEASE_EXPIRY_SECONDS,
+            lease_renew=settings.CHANGE_FEED_LEASE_RENEW_SECONDS,
+            max_retry_delay=settings.CHANGE_FEED_MAX_RETRY_DELAY_SECONDS,
+            max_attempts=settings.CHANGE_FEED_MAX_ATTEMPTS,
+            db=self.db,
+        )
+        self.processors[name] = processor
+        return processor
+
+    def start(self) -> None:
+        for processor in self.processors.values():
+            processor.start()
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(processor.stop() for processor in self.processors.values()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: processor.stats() for name, processor in self.processors.items()}
+
+
+change_feed_host = ChangeFeedHost()
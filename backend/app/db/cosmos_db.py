@@ -8,15 +8,40 @@ from typing import Dict, List, Optional, Union
 import tempfile
 
 from azure.cosmos import CosmosClient, PartitionKey, ContainerProxy
+from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
+from azure.cosmos.aio import ContainerProxy as AsyncContainerProxy
 from azure.cosmos.exceptions import CosmosResourceNotFoundError
 
 from app.core.config import settings
+from app.db.diagnostics import cosmos_diagnostics
 
 # Disable SSL warning when using the emulator
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logger = logging.getLogger(__name__)
 
+# Operations Cosmos DB accepts in one transactional batch
+MAX_BATCH_OPERATIONS = 100
+
+
+class PartitionKeyMismatch(RuntimeError):
+    """Raised when an existing container is partitioned on another path than the one expected.
+
+    Cosmos DB cannot change the partition key of a container, so its
+    documents have to be copied to a new one, see
+    app/utils/migrate_partition_keys.py.
+    """
+
+
+def check_partition_key(container_id: str, properties: Dict, partition_key: str) -> None:
+    """Raise PartitionKeyMismatch unless the container properties are partitioned on ``partition_key``."""
+    paths = properties.get("partitionKey", {}).get("paths", [])
+    if paths != [partition_key]:
+        raise PartitionKeyMismatch(
+            f"Container {container_id} is partitioned on {', '.join(paths) or 'nothing'} but {partition_key} "
+            f"is expected; run `python -m app.utils.migrate_partition_keys` to move its documents"
+        )
+
 
 class CosmosDB:
     def __init__(self):
@@ -71,14 +96,27 @@ class CosmosDB:
             logger.error(f"Failed to connect to Cosmos DB: {e}")
             raise
     
-    def get_container(self, container_id: str, partition_key: str = "/id") -> ContainerProxy:
-        """Get or create a container in the database."""
+    def get_container(
+        self,
+        container_id: str,
+        partition_key: str = "/id",
+        default_ttl: Optional[int] = None,
+    ) -> ContainerProxy:
+        """Get or create a container in the database.
+
+        ``default_ttl`` is only applied when the container is created; -1
+        enables per-document `ttl` without expiring other documents. An
+        existing container on another partition key raises
+        PartitionKeyMismatch.
+        """
         if container_id not in self.containers:
             try:
                 container = self.database.create_container_if_not_exists(
                     id=container_id,
-                    partition_key=PartitionKey(path=partition_key)
+                    partition_key=PartitionKey(path=partition_key),
+                    default_ttl=default_ttl
                 )
+                check_partition_key(container_id, container.read(), partition_key)
                 self.containers[container_id] = container
                 logger.info(f"Container {container_id} initialized")
             except Exception as e:
@@ -91,7 +129,9 @@ class CosmosDB:
         """Create an item in a container."""
         container = self.get_container(container_id)
         try:
-            response = container.create_item(body=item)
+            with cosmos_diagnostics.track(container_id, "create") as call:
+                response = container.create_item(body=item, response_hook=call.hook)
+                call.add_items()
             return response
         except Exception as e:
             logger.error(f"Failed to create item in {container_id}: {e}")
@@ -101,7 +141,9 @@ class CosmosDB:
         """Get an item from a container by ID."""
         container = self.get_container(container_id)
         try:
-            response = container.read_item(item=item_id, partition_key=partition_key or item_id)
+            with cosmos_diagnostics.track(container_id, "read") as call:
+                response = container.read_item(item=item_id, partition_key=partition_key or item_id, response_hook=call.hook)
+                call.add_items()
             return response
         except CosmosResourceNotFoundError:
             return None
@@ -113,7 +155,9 @@ class CosmosDB:
         """Update an item in a container."""
         container = self.get_container(container_id)
         try:
-            response = container.replace_item(item=item["id"], body=item)
+            with cosmos_diagnostics.track(container_id, "replace") as call:
+                response = container.replace_item(item=item["id"], body=item, response_hook=call.hook)
+                call.add_items()
             return response
         except Exception as e:
             logger.error(f"Failed to update item in {container_id}: {e}")
@@ -123,7 +167,8 @@ class CosmosDB:
         """Delete an item from a container by ID."""
         container = self.get_container(container_id)
         try:
-            response = container.delete_item(item=item_id, partition_key=partition_key or item_id)
+            with cosmos_diagnostics.track(container_id, "delete") as call:
+                response = container.delete_item(item=item_id, partition_key=partition_key or item_id, response_hook=call.hook)
             return response
         except Exception as e:
             logger.error(f"Failed to delete item {item_id} from {container_id}: {e}")
@@ -133,19 +178,162 @@ class CosmosDB:
         """Query items in a container."""
         container = self.get_container(container_id)
         try:
-            items = container.query_items(
-                query=query,
-                parameters=parameters,
-                enable_cross_partition_query=True
+            with cosmos_diagnostics.track(container_id, "query", query) as call:
+                items = list(container.query_items(
+                    query=query,
+                    parameters=parameters,
+                    enable_cross_partition_query=True,
+                    response_hook=call.hook
+                ))
+                call.add_items(len(items))
+            return items
+        except Exception as e:
+            logger.error(f"Failed to query items in {container_id}: {e}")
+            raise
+
+
+class AsyncCosmosDB:
+    """Asyncio counterpart of CosmosDB built on azure.cosmos.aio.
+
+    Exposes the same API as CosmosDB but every network call is awaitable,
+    so Cosmos round-trips no longer block the event loop.
+    """
+
+    def __init__(self):
+        """Initialize the async Azure Cosmos DB client."""
+        self.client = None
+        self.database = None
+        self.containers = {}
+
+    async def connect(self):
+        """Connect to Azure Cosmos DB."""
+        try:
+            connection_kwargs = {
+                "url": settings.COSMOS_ENDPOINT,
+                "credential": settings.COSMOS_KEY
+            }
+            if settings.USE_COSMOS_EMULATOR:
+                logger.info("Connecting to CosmosDB Emulator (async)")
+                connection_kwargs["connection_verify"] = False
+            else:
+                logger.info("Connecting to Azure CosmosDB (async)")
+            self.client = AsyncCosmosClient(**connection_kwargs)
+            self.database = await self.client.create_database_if_not_exists(
+                id=settings.COSMOS_DATABASE
             )
-            return list(items)
+            logger.info(f"Connected to {'emulator' if settings.USE_COSMOS_EMULATOR else 'Azure'} Cosmos DB: {settings.COSMOS_DATABASE}")
+        except Exception as e:
+            logger.error(f"Failed to connect to Cosmos DB: {e}")
+            raise
+
+    async def close(self):
+        """Close the underlying client and its connection pool."""
+        if self.client is not None:
+            await self.client.close()
+            logger.info("Closed async Cosmos DB client")
+        self.client = None
+        self.database = None
+        self.containers = {}
+
+    async def get_container(
+        self,
+        container_id: str,
+        partition_key: str = "/id",
+        default_ttl: Optional[int] = None,
+    ) -> AsyncContainerProxy:
+        """Get or create a container in the database.
+
+        ``default_ttl`` is only applied when the container is created; -1
+        enables per-document `ttl` without expiring other documents. An
+        existing container on another partition key raises
+        PartitionKeyMismatch.
+        """
+        if container_id not in self.containers:
+            try:
+                container = await self.database.create_container_if_not_exists(
+                    id=container_id,
+                    partition_key=PartitionKey(path=partition_key),
+                    default_ttl=default_ttl
+                )
+                check_partition_key(container_id, await container.read(), partition_key)
+                self.containers[container_id] = container
+                logger.info(f"Container {container_id} initialized")
+            except Exception as e:
+                logger.error(f"Failed to create container {container_id}: {e}")
+                raise
+
+        return self.containers[container_id]
+
+    async def create_item(self, container_id: str, item: Dict):
+        """Create an item in a container."""
+        container = await self.get_container(container_id)
+        try:
+            with cosmos_diagnostics.track(container_id, "create") as call:
+                response = await container.create_item(body=item, response_hook=call.hook)
+                call.add_items()
+            return response
+        except Exception as e:
+            logger.error(f"Failed to create item in {container_id}: {e}")
+            raise
+
+    async def get_item(self, container_id: str, item_id: str, partition_key: str = None):
+        """Get an item from a container by ID."""
+        container = await self.get_container(container_id)
+        try:
+            with cosmos_diagnostics.track(container_id, "read") as call:
+                response = await container.read_item(item=item_id, partition_key=partition_key or item_id, response_hook=call.hook)
+                call.add_items()
+            return response
+        except CosmosResourceNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Failed to get item {item_id} from {container_id}: {e}")
+            raise
+
+    async def update_item(self, container_id: str, item: Dict):
+        """Update an item in a container."""
+        container = await self.get_container(container_id)
+        try:
+            with cosmos_diagnostics.track(container_id, "replace") as call:
+                response = await container.replace_item(item=item["id"], body=item, response_hook=call.hook)
+                call.add_items()
+            return response
+        except Exception as e:
+            logger.error(f"Failed to update item in {container_id}: {e}")
+            raise
+
+    async def delete_item(self, container_id: str, item_id: str, partition_key: str = None):
+        """Delete an item from a container by ID."""
+        container = await self.get_container(container_id)
+        try:
+            with cosmos_diagnostics.track(container_id, "delete") as call:
+                response = await container.delete_item(item=item_id, partition_key=partition_key or item_id, response_hook=call.hook)
+            return response
+        except Exception as e:
+            logger.error(f"Failed to delete item {item_id} from {container_id}: {e}")
+            raise
+
+    async def query_items(self, container_id: str, query: str, parameters: Optional[List[Dict]] = None):
+        """Query items in a container."""
+        container = await self.get_container(container_id)
+        try:
+            # The async SDK fans out across partitions when no partition key is given
+            with cosmos_diagnostics.track(container_id, "query", query) as call:
+                items = [item async for item in container.query_items(
+                    query=query,
+                    parameters=parameters,
+                    response_hook=call.hook
+                )]
+                call.add_items(len(items))
+            return items
         except Exception as e:
             logger.error(f"Failed to query items in {container_id}: {e}")
             raise
 
 
-# Create a singleton instance
+# Create singleton instances
 cosmos_db = CosmosDB()
+async_cosmos_db = AsyncCosmosDB()
 
 
 # Standalone function for accessing containers
@@ -0,0 +1,153 @@
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Mapping, Optional, Tuple
+
+from fastapi import Request
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST_CHARGE_HEADER = "x-ms-request-charge"
+
+# Route template of the API request currently being served, used to attribute
+# Cosmos calls to endpoints.
+current_route: ContextVar[str] = ContextVar("current_route", default="-")
+
+
+async def track_route(request: Request) -> None:
+    """Router dependency that records the matched route for Cosmos diagnostics."""
+    route = request.scope.get("route")
+    current_route.set(f"{request.method} {getattr(route, 'path', request.url.path)}")
+
+
+class CosmosCall:
+    """Measures a single logical Cosmos operation.
+
+    Pass ``call.hook`` as the SDK ``response_hook``; for queries it is invoked
+    once per page so the request charge of every page is summed.
+    """
+
+    def __init__(self, diagnostics: "CosmosDiagnostics", container_id: str, operation: str, query: Optional[str] = None):
+        self.diagnostics = diagnostics
+        self.container_id = container_id
+        self.operation = operation
+        self.query = query
+        self.request_charge = 0.0
+        self.item_count = 0
+        self._started = 0.0
+
+    def hook(self, headers: Mapping[str, Any], *args: Any) -> None:
+        charge = headers.get(REQUEST_CHARGE_HEADER) if headers else None
+        if charge:
+            self.request_charge += float(charge)
+
+    def add_items(self, count: int = 1) -> None:
+        self.item_count += count
+
+    def __enter__(self) -> "CosmosCall":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        duration_ms = (time.perf_counter() - self._started) * 1000
+        self.diagnostics.record(
+            container_id=self.container_id,
+            operation=self.operation,
+            request_charge=self.request_charge,
+            duration_ms=duration_ms,
+            item_count=self.item_count,
+            query=self.query,
+            failed=exc_type is not None and exc_type is not GeneratorExit,
+        )
+
+
+class CosmosDiagnostics:
+    """In-process aggregates of request charge and latency per route and container."""
+
+    def __init__(self, slow_ru: float, slow_ms: float, max_slow_records: int = 100):
+        self.slow_ru = slow_ru
+        self.slow_ms = slow_ms
+        self.aggregates: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self.slow_calls: Deque[Dict[str, Any]] = deque(maxlen=max_slow_records)
+
+    def track(self, container_id: str, operation: str, query: Optional[str] = None) -> CosmosCall:
+        """Start measuring a Cosmos call; use as a context manager."""
+        return CosmosCall(self, container_id, operation, query)
+
+    def record(
+        self,
+        container_id: str,
+        operation: str,
+        request_charge: float,
+        duration_ms: float,
+        item_count: int,
+        query: Optional[str] = None,
+        failed: bool = False,
+    ) -> None:
+        """Add one call to the aggregates and log it if it is slow or expensive."""
+        route = current_route.get()
+        key = (route, container_id, operation)
+        stats = self.aggregates.get(key)
+        if stats is None:
+            stats = self.aggregates[key] = {
+                "calls": 0,
+                "errors": 0,
+                "request_charge": 0.0,
+                "max_request_charge": 0.0,
+                "duration_ms": 0.0,
+                "max_duration_ms": 0.0,
+                "items": 0,
+            }
+        stats["calls"] += 1
+        stats["errors"] += int(failed)
+        stats["request_charge"] += request_charge
+        stats["max_request_charge"] = max(stats["max_request_charge"], request_charge)
+        stats["duration_ms"] += duration_ms
+        stats["max_duration_ms"] = max(stats["max_duration_ms"], duration_ms)
+        stats["items"] += item_count
+
+        if request_charge >= self.slow_ru or duration_ms >= self.slow_ms:
+            record = {
+                "route": route,
+                "container": container_id,
+                "operation": operation,
+                "request_charge": round(request_charge, 2),
+                "duration_ms": round(duration_ms, 1),
+                "items": item_count,
+                "query": query,
+            }
+            self.slow_calls.append(record)
+            logger.warning(f"Slow or expensive Cosmos call: {record}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the aggregates in a JSON-friendly shape."""
+        calls = []
+        for (route, container_id, operation), stats in self.aggregates.items():
+            calls.append({
+                "route": route,
+                "container": container_id,
+                "operation": operation,
+                **stats,
+                "avg_request_charge": stats["request_charge"] / stats["calls"],
+                "avg_duration_ms": stats["duration_ms"] / stats["calls"],
+            })
+        calls.sort(key=lambda c: c["request_charge"], reverse=True)
+        return {
+            "total_request_charge": sum(c["request_charge"] for c in calls),
+            "calls": calls,
+            "slow_calls": list(self.slow_calls),
+        }
+
+    def reset(self) -> None:
+        """Drop all collected data."""
+        self.aggregates.clear()
+        self.slow_calls.clear()
+
+
+cosmos_diagnostics = CosmosDiagnostics(
+    slow_ru=settings.COSMOS_SLOW_QUERY_RU,
+    slow_ms=settings.COSMOS_SLOW_QUERY_MS,
+)
@@ -0,0 +1,616 @@
+"""
+In-memory storage backend mirroring the subset of the azure.cosmos.aio
+container API used by the application.
+
+Documents are partitioned like in Cosmos DB, carry `_etag`/`_ts` system
+properties and are stored as JSON round-tripped copies, so callers get
+the same isolation and serialisation errors as with the real service.
+Queries are evaluated with app.db.memory_query; equality on `id` and
+ranges on the configured indexed paths are answered from per-partition
+sorted indexes instead of scanning the partition.
+
+Every write stamps the document with a container-wide sequence number
+(`_lsn`), which serves its change feed: like the latest-version change feed
+of Cosmos DB it returns the current version of each document written after
+a continuation, in write order, split into FEED_RANGE_COUNT feed ranges by
+partition key, and leaves out deleted documents.
+"""
+import json
+import logging
+import time
+import zlib
+from datetime import datetime, timezone
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+from uuid import uuid4
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosBatchOperationError,
+    CosmosHttpResponseError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from app.db.cosmos_db import MAX_BATCH_OPERATIONS, AsyncCosmosDB
+from app.db.memory_query import UNDEFINED, QuerySyntaxError, compile_query
+
+logger = logging.getLogger(__name__)
+
+# Secondary indexes maintained per container, on top of the partition key
+DEFAULT_INDEXED_PATHS: Dict[str, Tuple[str, ...]] = {
+    "meals": ("household_id",),
+    "meal_plans": ("household_id", "planned_date"),
+    "meal_ratings": ("household_id", "meal_id"),
+    "meal_plan_rollups": ("household_id",),
+    "meal_plan_templates": ("household_id",),
+    "tombstones": ("household_id",),
+    "leases": ("processor",),
+}
+
+# Feed ranges the partitions of a container are hashed into
+FEED_RANGE_COUNT = 4
+
+_first = itemgetter(0)
+
+
+def _get_path(doc: Mapping[str, Any], path: str) -> Any:
+    value: Any = doc
+    for part in path.strip("/").split("/"):
+        if not isinstance(value, Mapping) or part not in value:
+            return UNDEFINED
+        value = value[part]
+    return value
+
+
+def _headers(item: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    headers = {"x-ms-request-charge": "0"}
+    if item is not None and "_etag" in item:
+        headers["etag"] = item["_etag"]
+    return headers
+
+
+class _AsyncList:
+    """Async iterable over an already materialised list."""
+
+    def __init__(self, items: List[Any]):
+        self._items = items
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        for item in self._items:
+            yield item
+
+
+class _MemoryPageIterator:
+    """Mimics AsyncItemPaged.by_page(): yields pages and exposes continuation_token."""
+
+    def __init__(self, results: Callable[[], List[Any]], page_size: Optional[int], offset: int,
+                 response_hook: Optional[Callable[..., None]]):
+        self._results = results
+        self._page_size = page_size
+        self._offset = offset
+        self._response_hook = response_hook
+        self._materialised: Optional[List[Any]] = None
+        self._done = False
+        self.continuation_token: Optional[str] = None
+
+    def __aiter__(self) -> "_MemoryPageIterator":
+        return self
+
+    async def __anext__(self) -> _AsyncList:
+        if self._done:
+            raise StopAsyncIteration
+        if self._materialised is None:
+            self._materialised = self._results()
+        end = len(self._materialised) if not self._page_size else self._offset + self._page_size
+        page = self._materialised[self._offset:end]
+        if end < len(self._materialised):
+            self._offset = end
+            self.continuation_token = json.dumps({"offset": end})
+        else:
+            self._done = True
+            self.continuation_token = None
+        if self._response_hook:
+            self._response_hook(_headers(), page)
+        return _AsyncList(page)
+
+
+class _MemoryItemPaged:
+    """Mimics the AsyncItemPaged returned by ContainerProxy.query_items."""
+
+    def __init__(self, results: Callable[[], List[Any]], page_size: Optional[int],
+                 response_hook: Optional[Callable[..., None]]):
+        self._results = results
+        self._page_size = page_size
+        self._response_hook = response_hook
+
+    def by_page(self, continuation_token: Optional[str] = None) -> _MemoryPageIterator:
+        offset = 0
+        if continuation_token:
+            try:
+                offset = int(json.loads(continuation_token)["offset"])
+            except (ValueError, KeyError, TypeError) as e:
+                raise CosmosHttpResponseError(status_code=400, message="Invalid continuation token") from e
+        return _MemoryPageIterator(self._results, self._page_size, offset, self._response_hook)
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        async for page in self.by_page():
+            async for item in page:
+                yield item
+
+
+class _MemoryChangeFeed:
+    """Mimics the AsyncItemPaged returned by ContainerProxy.query_items_change_feed.
+
+    Continuations are JSON ``{"range": <feed range index or null>, "lsn": n,
+    "ts": <earliest _ts or null>}``; every page passes the continuation after
+    it to the response hook as the ``etag`` header, as the SDK does.
+    """
+
+    def __init__(self, container: "InMemoryContainer", feed_range: Optional[int], lsn: int, min_ts: Optional[int],
+                 page_size: Optional[int], response_hook: Optional[Callable[..., None]]):
+        self._container = container
+        self._feed_range = feed_range
+        self._lsn = lsn
+        self._min_ts = min_ts
+        self._page_size = page_size
+        self._response_hook = response_hook
+
+    def _continuation(self) -> str:
+        return json.dumps({"range": self._feed_range, "lsn": self._lsn, "ts": self._min_ts})
+
+    def by_page(self, continuation_token: Optional[str] = None) -> AsyncIterator[_AsyncList]:
+        return self._pages()
+
+    async def _pages(self) -> AsyncIterator[_AsyncList]:
+        while True:
+            page, self._lsn = self._container._changes_after(self._feed_range, self._lsn, self._min_ts, self._page_size)
+            if self._response_hook:
+                self._response_hook({**_headers(), "etag": self._continuation()}, page)
+            if not page:
+                return
+            yield _AsyncList(page)
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Any]:
+        async for page in self._pages():
+            async for item in page:
+                yield item
+
+
+class InMemoryContainer:
+    """In-memory stand-in for azure.cosmos.aio.ContainerProxy."""
+
+    def __init__(self, container_id: str, partition_key: str = "/id", indexed_paths: Iterable[str] = ()):
+        self.id = container_id
+        self.partition_key_path = partition_key
+        self.indexed_paths = tuple(indexed_paths)
+        # partition key value -> id -> document
+        self._partitions: Dict[Any, Dict[str, Dict[str, Any]]] = {}
+        # partition key value -> indexed path -> sorted [(value, id)]
+        self._indexes: Dict[Any, Dict[str, List[Tuple[Any, str]]]] = {}
+        # Sequence number of the last write, for the change feed
+        self._lsn = 0
+        # partition key value -> feed range index
+        self._feed_ranges: Dict[Any, int] = {}
+
+    # Internal helpers
+
+    def _partition_value(self, doc: Mapping[str, Any]) -> Any:
+        value = _get_path(doc, self.partition_key_path)
+        return None if value is UNDEFINED else value
+
+    def _index_add(self, partition: Any, doc: Dict[str, Any]) -> None:
+        indexes = self._indexes.setdefault(partition, {path: [] for path in self.indexed_paths})
+        for path in self.indexed_paths:
+            value = doc.get(path, UNDEFINED)
+            if isinstance(value, str):
+                insort(indexes[path], (value, doc["id"]))
+
+    def _index_remove(self, partition: Any, doc: Dict[str, Any]) -> None:
+        indexes = self._indexes.get(partition)
+        if not indexes:
+            return
+        for path in self.indexed_paths:
+            value = doc.get(path, UNDEFINED)
+            if isinstance(value, str):
+                entries = indexes[path]
+                position = bisect_left(entries, (value, doc["id"]))
+                if position < len(entries) and entries[position] == (value, doc["id"]):
+                    del entries[position]
+
+    def _store(self, doc: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        partition = self._partition_value(doc)
+        if previous is not None:
+            self._index_remove(self._partition_value(previous), previous)
+        self._lsn += 1
+        doc["_etag"] = f'"{uuid4()}"'
+        doc["_ts"] = int(time.time())
+        doc["_lsn"] = self._lsn
+        self._partitions.setdefault(partition, {})[doc["id"]] = doc
+        self._index_add(partition, doc)
+        return doc
+
+    def _lookup(self, item_id: str, partition_key: Any) -> Dict[str, Any]:
+        doc = self._partitions.get(partition_key, {}).get(item_id)
+        if doc is None:
+            raise CosmosResourceNotFoundError(status_code=404, message=f"Entity with id {item_id} not found")
+        return doc
+
+    def _feed_range(self, partition: Any) -> int:
+        if partition not in self._feed_ranges:
+            self._feed_ranges[partition] = zlib.crc32(json.dumps(partition).encode("utf-8")) % FEED_RANGE_COUNT
+        return self._feed_ranges[partition]
+
+    def _changes_after(
+        self,
+        feed_range: Optional[int],
+        lsn: int,
+        min_ts: Optional[int],
+        limit: Optional[int],
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Return the documents of a feed range written after ``lsn`` and the continuation lsn."""
+        if lsn >= self._lsn:
+            return [], lsn
+        changes = [
+            doc
+            for partition, docs in self._partitions.items()
+            if feed_range is None or self._feed_range(partition) == feed_range
+            for doc in docs.values()
+            if doc["_lsn"] > lsn and (min_ts is None or doc["_ts"] >= min_ts)
+        ]
+        if not changes:
+            # Nothing in this range up to the latest write
+            return [], self._lsn
+        changes.sort(key=itemgetter("_lsn"))
+        if limit:
+            changes = changes[:limit]
+        return self._copy(changes), changes[-1]["_lsn"]
+
+    @staticmethod
+    def _copy(doc: Any) -> Any:
+        return json.loads(json.dumps(doc))
+
+    @staticmethod
+    def _check_condition(doc: Dict[str, Any], etag: Optional[str], match_condition: Optional[MatchConditions]) -> None:
+        if match_condition == MatchConditions.IfNotModified and doc.get("_etag") != etag:
+            raise CosmosAccessConditionFailedError(status_code=412, message="Precondition failed")
+        if match_condition == MatchConditions.IfModified and doc.get("_etag") == etag:
+            raise CosmosAccessConditionFailedError(status_code=412, message="Precondition failed")
+
+    def _prepare(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        doc = self._copy(body)
+        if not isinstance(doc.get("id"), str) or not doc["id"]:
+            raise CosmosHttpResponseError(status_code=400, message="Document is missing a string 'id'")
+        return doc
+
+    def _candidates(self, compiled, params: Dict[str, Any], partition_key: Any) -> List[Dict[str, Any]]:
+        if partition_key is not None:
+            partitions = [partition_key] if partition_key in self._partitions else []
+        else:
+            partitions = list(self._partitions)
+        ids = compiled.equality_filters("id", params)
+        candidates: List[Dict[str, Any]] = []
+        for partition in partitions:
+            docs = self._partitions[partition]
+            if ids is not None:
+                candidates.extend(docs[i] for i in ids if isinstance(i, str) and i in docs)
+                continue
+            for path in self.indexed_paths:
+                lower, upper = compiled.range_filters(path, params)
+                if lower is None and upper is None:
+                    continue
+                if any(bound is not None and not isinstance(bound[0], str) for bound in (lower, upper)):
+                    continue
+                entries = self._indexes.get(partition, {}).get(path, [])
+                start, end = 0, len(entries)
+                if lower is not None:
+                    start = (bisect_left if lower[1] else bisect_right)(entries, lower[0], key=_first)
+                if upper is not None:
+                    end = (bisect_right if upper[1] else bisect_left)(entries, upper[0], key=_first)
+                candidates.extend(docs[item_id] for _, item_id in entries[start:end])
+                break
+            else:
+                candidates.extend(docs.values())
+        return candidates
+
+    # ContainerProxy API
+
+    async def read_item(self, item: Union[str, Mapping[str, Any]], partition_key: Any, **kwargs: Any) -> Dict[str, Any]:
+        item_id = item["id"] if isinstance(item, Mapping) else item
+        doc = self._lookup(item_id, partition_key)
+        if kwargs.get("response_hook"):
+            kwargs["response_hook"](_headers(doc), doc)
+        return self._copy(doc)
+
+    async def create_item(self, body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        doc = self._prepare(body)
+        partition = self._partition_value(doc)
+        if doc["id"] in self._partitions.get(partition, {}):
+            raise CosmosResourceExistsError(status_code=409, message=f"Entity with id {doc['id']} already exists")
+        self._store(doc)
+        if kwargs.get("response_hook"):
+            kwargs["response_hook"](_headers(doc), doc)
+        return self._copy(doc)
+
+    async def upsert_item(self, body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        doc = self._prepare(body)
+        previous = self._partitions.get(self._partition_value(doc), {}).get(doc["id"])
+        if previous is not None:
+            self._check_condition(previous, kwargs.get("etag"), kwargs.get("match_condition"))
+        self._store(doc, previous)
+        if kwargs.get("response_hook"):
+            kwargs["response_hook"](_headers(doc), doc)
+        return self._copy(doc)
+
+    async def replace_item(self, item: Union[str, Mapping[str, Any]], body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        item_id = item["id"] if isinstance(item, Mapping) else item
+        doc = self._prepare(body)
+        if doc["id"] != item_id:
+            raise CosmosHttpResponseError(status_code=400, message="Replace cannot change the document id")
+        previous = self._lookup(item_id, self._partition_value(doc))
+        self._check_condition(previous, kwargs.get("etag"), kwargs.get("match_condition"))
+        self._store(doc, previous)
+        if kwargs.get("response_hook"):
+            kwargs["response_hook"](_headers(doc), doc)
+        return self._copy(doc)
+
+    async def delete_item(self, item: Union[str, Mapping[str, Any]], partition_key: Any, **kwargs: Any) -> None:
+        item_id = item["id"] if isinstance(item, Mapping) else item
+        doc = self._lookup(item_id, partition_key)
+        self._check_condition(doc, kwargs.get("etag"), kwargs.get("match_condition"))
+        self._index_remove(partition_key, doc)
+        del self._partitions[partition_key][item_id]
+        if kwargs.get("response_hook"):
+            kwargs["response_hook"](_headers(), None)
+
+    async def patch_item(
+        self,
+        item: Union[str, Mapping[str, Any]],
+        partition_key: Any,
+        patch_operations: List[Dict[str, Any]],
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        item_id = item["id"] if isinstance(item, Mapping) else item
+        previous = self._lookup(item_id, partition_key)
+        self._check_condition(previous, kwargs.get("etag"), kwargs.get("match_condition"))
+        filter_predicate = kwargs.get("filter_predicate")
+        if filter_predicate and not compile_query(f"SELECT * {filter_predicate}").execute([previous]):
+            raise CosmosAccessConditionFailedError(status_code=412, message="Filter predicate did not match")
+        doc = self._copy(previous)
+        for operation in patch_operations:
+            _apply_patch(doc, operation)
+        self._store(doc, previous)
+        if kwargs.get("response_hook"):
+            kwargs["response_hook"](_headers(doc), doc)
+        return self._copy(doc)
+
+    async def execute_item_batch(
+        self,
+        batch_operations: List[Tuple[Any, ...]],
+        partition_key: Any,
+        **kwargs: Any,
+    ) -> List[Dict[str, Any]]:
+        """Run operations atomically: if one fails, none of them is applied.
+
+        The item methods never suspend, so no other request can interleave
+        with a batch.
+        """
+        if len(batch_operations) > MAX_BATCH_OPERATIONS:
+            raise CosmosHttpResponseError(status_code=400, message="Batch request has more operations than allowed")
+        saved_documents = dict(self._partitions[partition_key]) if partition_key in self._partitions else None
+        saved_indexes = (
+            {path: list(entries) for path, entries in self._indexes[partition_key].items()}
+            if partition_key in self._indexes else None
+        )
+        results = []
+        for index, operation in enumerate(batch_operations):
+            try:
+                results.append(await self._batch_operation(operation, partition_key))
+            except CosmosHttpResponseError as e:
+                self._restore_partition(partition_key, saved_documents, saved_indexes)
+                responses = [{"statusCode": 424} for _ in batch_operations]
+                responses[index] = {"statusCode": e.status_code, "message": e.http_error_message}
+                raise CosmosBatchOperationError(
+                    error_index=index,
+                    headers={},
+                    status_code=e.status_code,
+                    message=f"Batch operation {index} failed: {e.http_error_message}",
+                    operation_responses=responses
+                ) from e
+        if kwargs.get("response_hook"):
+            kwargs["response_hook"](_headers(), results)
+        return self._copy(results)
+
+    def _restore_partition(
+        self,
+        partition_key: Any,
+        documents: Optional[Dict[str, Dict[str, Any]]],
+        indexes: Optional[Dict[str, List[Tuple[Any, str]]]],
+    ) -> None:
+        for state, saved in ((self._partitions, documents), (self._indexes, indexes)):
+            if saved is None:
+                state.pop(partition_key, None)
+            else:
+                state[partition_key] = saved
+
+    async def _batch_operation(self, operation: Tuple[Any, ...], partition_key: Any) -> Dict[str, Any]:
+        operation_type, args = operation[0].lower(), operation[1]
+        options = operation[2] if len(operation) > 2 else {}
+        etag = options.get("if_match_etag")
+        conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+        if operation_type in ("create", "upsert", "replace"):
+            if self._partition_value(args[-1]) != partition_key:
+                raise CosmosHttpResponseError(status_code=400, message="Document is not in the batch partition")
+        if operation_type == "create":
+            doc, status_code = await self.create_item(args[0]), 201
+        elif operation_type == "upsert":
+            doc, status_code = await self.upsert_item(args[0], **conditions), 200
+        elif operation_type == "replace":
+            doc, status_code = await self.replace_item(args[0], args[1], **conditions), 200
+        elif operation_type == "patch":
+            doc, status_code = await self.patch_item(args[0], partition_key, args[1], **conditions), 200
+        elif operation_type == "delete":
+            doc, status_code = await self.delete_item(args[0], partition_key, **conditions), 204
+        elif operation_type == "read":
+            doc, status_code = await self.read_item(args[0], partition_key), 200
+        else:
+            raise CosmosHttpResponseError(status_code=400, message=f"Unsupported batch operation {operation_type!r}")
+        result = {"statusCode": status_code, "requestCharge": 0.0}
+        if doc is not None:
+            result["eTag"] = doc["_etag"]
+            result["resourceBody"] = doc
+        return result
+
+    def query_items(
+        self,
+        query: str,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        partition_key: Any = None,
+        max_item_count: Optional[int] = None,
+        **kwargs: Any,
+    ) -> _MemoryItemPaged:
+        try:
+            compiled = compile_query(query)
+        except QuerySyntaxError as e:
+            raise CosmosHttpResponseError(status_code=400, message=str(e)) from e
+        params = {p["name"]: p["value"] for p in (parameters or [])}
+
+        def results() -> List[Any]:
+            documents = self._candidates(compiled, params, partition_key)
+            try:
+                return self._copy(compiled.execute(documents, parameters))
+            except QuerySyntaxError as e:
+                raise CosmosHttpResponseError(status_code=400, message=str(e)) from e
+
+        return _MemoryItemPaged(results, max_item_count, kwargs.get("response_hook"))
+
+
+    async def read_feed_ranges(self, **kwargs: Any) -> AsyncIterator[Dict[str, Any]]:
+        for index in range(FEED_RANGE_COUNT):
+            yield {"memoryRange": index}
+
+    def query_items_change_feed(self, **kwargs: Any) -> _MemoryChangeFeed:
+        """Read the change feed from a continuation or a start time.
+
+        Takes the SDK keywords ``continuation``, ``feed_range``,
+        ``start_time`` ("Now", the default, "Beginning" or a datetime),
+        ``max_item_count`` and ``response_hook``.
+        """
+        continuation = kwargs.get("continuation")
+        if continuation:
+            try:
+                state = json.loads(continuation)
+                feed_range, lsn, min_ts = state["range"], int(state["lsn"]), state["ts"]
+            except (ValueError, KeyError, TypeError) as e:
+                raise CosmosHttpResponseError(status_code=400, message="Invalid change feed continuation") from e
+        else:
+            feed_range = kwargs["feed_range"]["memoryRange"] if kwargs.get("feed_range") else None
+            start_time = kwargs.get("start_time") or "Now"
+            min_ts = None
+            if start_time == "Now":
+                lsn = self._lsn
+            elif start_time == "Beginning":
+                lsn = 0
+            elif isinstance(start_time, datetime):
+                lsn = 0
+                moment = start_time if start_time.tzinfo else start_time.replace(tzinfo=timezone.utc)
+                min_ts = int(moment.timestamp())
+            else:
+                raise CosmosHttpResponseError(status_code=400, message=f"Invalid change feed start time {start_time!r}")
+        return _MemoryChangeFeed(self, feed_range, lsn, min_ts, kwargs.get("max_item_count"), kwargs.get("response_hook"))
+
+
+def _resolve_parent(doc: Dict[str, Any], path: str, create: bool = False) -> Tuple[Any, Union[str, int]]:
+    parts = [part for part in path.split("/") if part]
+    if not parts:
+        raise CosmosHttpResponseError(status_code=400, message=f"Invalid patch path {path!r}")
+    parent: Any = doc
+    for part in parts[:-1]:
+        if isinstance(parent, list):
+            parent = parent[int(part)]
+        elif part in parent:
+            parent = parent[part]
+        elif create:
+            parent = parent.setdefault(part, {})
+        else:
+            raise CosmosHttpResponseError(status_code=400, message=f"Patch path {path!r} does not exist")
+    key: Union[str, int] = parts[-1]
+    if isinstance(parent, list):
+        key = len(parent) if key == "-" else int(key)
+    return parent, key
+
+
+def _apply_patch(doc: Dict[str, Any], operation: Mapping[str, Any]) -> None:
+    """Apply one Cosmos patch operation (add/set/replace/remove/incr/move) in place."""
+    op = operation["op"]
+    path = operation["path"]
+    value = operation.get("value")
+    if op == "move":
+        source_parent, source_key = _resolve_parent(doc, operation["from"])
+        moved = source_parent.pop(source_key)
+        parent, key = _resolve_parent(doc, path, create=True)
+        parent[key] = moved
+        return
+    parent, key = _resolve_parent(doc, path, create=op in ("add", "set", "incr"))
+    exists = (key < len(parent)) if isinstance(parent, list) else key in parent
+    if op in ("replace", "remove") and not exists:
+        raise CosmosHttpResponseError(status_code=400, message=f"Patch path {path!r} does not exist")
+    if op == "remove":
+        del parent[key]
+    elif op == "incr":
+        current = parent[key] if exists else 0
+        if isinstance(current, bool) or not isinstance(current, (int, float)):
+            raise CosmosHttpResponseError(status_code=400, message=f"Cannot increment non-numeric {path!r}")
+        parent[key] = current + value
+    elif op == "add" and isinstance(parent, list):
+        parent.insert(key, value)
+    elif op in ("add", "set", "replace"):
+        parent[key] = value
+    else:
+        raise CosmosHttpResponseError(status_code=400, message=f"Unsupported patch operation {op!r}")
+
+
+class InMemoryDB(AsyncCosmosDB):
+    """Process-local storage backend with the same API as AsyncCosmosDB."""
+
+    def __init__(self, indexed_paths: Optional[Dict[str, Tuple[str, ...]]] = None):
+        super().__init__()
+        self.indexed_paths = DEFAULT_INDEXED_PATHS if indexed_paths is None else indexed_paths
+
+    async def connect(self):
+        """Nothing to connect to; containers are created on first use."""
+        logger.info("Using in-memory storage backend")
+
+    async def close(self):
+        """Drop all containers and their data."""
+        self.containers = {}
+
+    async def get_container(
+        self,
+        container_id: str,
+        partition_key: str = "/id",
+        default_ttl: Optional[int] = None,
+    ) -> InMemoryContainer:
+        """Get or create a container.
+
+        ``default_ttl`` is accepted for parity with Cosmos; documents never
+        expire in memory.
+        """
+        if container_id not in self.containers:
+            self.containers[container_id] = InMemoryContainer(
+                container_id,
+                partition_key=partition_key,
+                indexed_paths=self.indexed_paths.get(container_id, ())
+            )
+        return self.containers[container_id]
@@ -0,0 +1,581 @@
+"""
+Evaluator for the subset of the Cosmos DB SQL dialect used by the API.
+
+Supported: SELECT [TOP n] [VALUE] with `*`, expressions and aliases,
+WHERE with AND/OR/NOT, comparisons, IN, BETWEEN, the system functions in
+FUNCTIONS, COUNT/SUM/AVG/MIN/MAX aggregates with GROUP BY, ORDER BY and
+OFFSET/LIMIT. Semantics follow Cosmos DB: missing properties are
+"undefined", comparisons between different types are undefined and only
+documents whose filter evaluates to true are returned.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class QuerySyntaxError(ValueError):
+    """Raised for queries outside the supported SQL subset."""
+
+
+class _Undefined:
+    def __repr__(self) -> str:
+        return "undefined"
+
+    def __bool__(self) -> bool:
+        return False
+
+
+UNDEFINED = _Undefined()
+
+KEYWORDS = {
+    "SELECT", "VALUE", "TOP", "DISTINCT", "FROM", "WHERE", "AND", "OR", "NOT", "IN",
+    "BETWEEN", "GROUP", "BY", "ORDER", "ASC", "DESC", "OFFSET", "LIMIT", "AS",
+    "TRUE", "FALSE", "NULL", "UNDEFINED",
+}
+
+AGGREGATES = {"COUNT", "SUM", "AVG", "MIN", "MAX"}
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+)
+    |(?P<number>\d+(?:\.\d+)?)
+    |(?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    |(?P<param>@\w+)
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>>=|<=|!=|<>|=|<|>|\(|\)|,|\.|\*|\[|\]|\+|-|/|%)
+    """,
+    re.VERBOSE,
+)
+
+
+def _tokenize(text: str) -> List[Tuple[str, Any]]:
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise QuerySyntaxError(f"Unexpected character {text[pos]!r} at {pos}")
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "ws":
+            continue
+        if kind == "number":
+            tokens.append(("literal", float(value) if "." in value else int(value)))
+        elif kind == "string":
+            tokens.append(("literal", bytes(value[1:-1], "utf-8").decode("unicode_escape")))
+        elif kind == "name" and value.upper() in KEYWORDS:
+            tokens.append(("keyword", value.upper()))
+        else:
+            tokens.append((kind, value))
+    tokens.append(("end", None))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing a tuple-based AST."""
+
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Tuple[str, Any]:
+        return self.tokens[self.pos + offset]
+
+    def next(self) -> Tuple[str, Any]:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def accept(self, kind: str, value: Any = None) -> bool:
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1] == value):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, kind: str, value: Any = None) -> Any:
+        token = self.next()
+        if token[0] != kind or (value is not None and token[1] != value):
+            raise QuerySyntaxError(f"Expected {value or kind}, got {token[1]!r}")
+        return token[1]
+
+    def parse_query(self) -> Dict[str, Any]:
+        query: Dict[str, Any] = {
+            "top": None, "value": False, "select": None, "where": None,
+            "group_by": [], "order_by": [], "offset": None, "limit": None,
+        }
+        self.expect("keyword", "SELECT")
+        if self.accept("keyword", "TOP"):
+            query["top"] = self.expect("literal")
+        if self.accept("keyword", "VALUE"):
+            query["value"] = True
+            query["select"] = [(self.parse_expr(), None)]
+        elif self.accept("op", "*"):
+            query["select"] = None
+        else:
+            query["select"] = [self.parse_select_item()]
+            while self.accept("op", ","):
+                query["select"].append(self.parse_select_item())
+        self.expect("keyword", "FROM")
+        query["alias"] = self.expect("name")
+        if self.accept("keyword", "WHERE"):
+            query["where"] = self.parse_expr()
+        if self.accept("keyword", "GROUP"):
+            self.expect("keyword", "BY")
+            query["group_by"].append(self.parse_expr())
+            while self.accept("op", ","):
+                query["group_by"].append(self.parse_expr())
+        if self.accept("keyword", "ORDER"):
+            self.expect("keyword", "BY")
+            query["order_by"].append(self.parse_order_item())
+            while self.accept("op", ","):
+                query["order_by"].append(self.parse_order_item())
+        if self.accept("keyword", "OFFSET"):
+            query["offset"] = self.parse_primary()
+            self.expect("keyword", "LIMIT")
+            query["limit"] = self.parse_primary()
+        self.expect("end")
+        return query
+
+    def parse_select_item(self) -> Tuple[tuple, Optional[str]]:
+        expr = self.parse_expr()
+        alias = None
+        if self.accept("keyword", "AS"):
+            alias = self.expect("name")
+        return expr, alias
+
+    def parse_order_item(self) -> Tuple[tuple, bool]:
+        expr = self.parse_expr()
+        descending = False
+        if self.accept("keyword", "DESC"):
+            descending = True
+        else:
+            self.accept("keyword", "ASC")
+        return expr, descending
+
+    def parse_expr(self) -> tuple:
+        left = self.parse_and()
+        while self.accept("keyword", "OR"):
+            left = ("or", left, self.parse_and())
+        return left
+
+    def parse_and(self) -> tuple:
+        left = self.parse_not()
+        while self.accept("keyword", "AND"):
+            left = ("and", left, self.parse_not())
+        return left
+
+    def parse_not(self) -> tuple:
+        if self.accept("keyword", "NOT"):
+            return ("not", self.parse_not())
+        return self.parse_comparison()
+
+    def parse_comparison(self) -> tuple:
+        left = self.parse_additive()
+        token = self.peek()
+        if token[0] == "op" and token[1] in ("=", "!=", "<>", "<", "<=", ">", ">="):
+            self.next()
+            op = "!=" if token[1] == "<>" else token[1]
+            return ("cmp", op, left, self.parse_additive())
+        negate = False
+        if token == ("keyword", "NOT") and self.peek(1) in (("keyword", "IN"), ("keyword", "BETWEEN")):
+            self.next()
+            negate = True
+        if self.accept("keyword", "IN"):
+            self.expect("op", "(")
+            values = [self.parse_expr()]
+            while self.accept("op", ","):
+                values.append(self.parse_expr())
+            self.expect("op", ")")
+            node = ("in", left, values)
+            return ("not", node) if negate else node
+        if self.accept("keyword", "BETWEEN"):
+            low = self.parse_additive()
+            self.expect("keyword", "AND")
+            high = self.parse_additive()
+            node = ("and", ("cmp", ">=", left, low), ("cmp", "<=", left, high))
+            return ("not", node) if negate else node
+        return left
+
+    def parse_additive(self) -> tuple:
+        left = self.parse_multiplicative()
+        while self.peek()[0] == "op" and self.peek()[1] in ("+", "-"):
+            op = self.next()[1]
+            left = ("arith", op, left, self.parse_multiplicative())
+        return left
+
+    def parse_multiplicative(self) -> tuple:
+        left = self.parse_primary()
+        while self.peek()[0] == "op" and self.peek()[1] in ("*", "/", "%"):
+            op = self.next()[1]
+            left = ("arith", op, left, self.parse_primary())
+        return left
+
+    def parse_primary(self) -> tuple:
+        kind, value = self.next()
+        if kind == "literal":
+            return ("const", value)
+        if kind == "param":
+            return ("param", value)
+        if kind == "keyword" and value in ("TRUE", "FALSE"):
+            return ("const", value == "TRUE")
+        if kind == "keyword" and value == "NULL":
+            return ("const", None)
+        if kind == "keyword" and value == "UNDEFINED":
+            return ("const", UNDEFINED)
+        if kind == "op" and value == "-":
+            return ("arith", "-", ("const", 0), self.parse_primary())
+        if kind == "op" and value == "(":
+            expr = self.parse_expr()
+            self.expect("op", ")")
+            return expr
+        if kind == "op" and value == "[":
+            items = []
+            if not self.accept("op", "]"):
+                items.append(self.parse_expr())
+                while self.accept("op", ","):
+                    items.append(self.parse_expr())
+                self.expect("op", "]")
+            return ("array", items)
+        if kind == "name":
+            if self.accept("op", "("):
+                args = []
+                if not self.accept("op", ")"):
+                    args.append(self.parse_expr())
+                    while self.accept("op", ","):
+                        args.append(self.parse_expr())
+                    self.expect("op", ")")
+                name = value.upper()
+                if name in AGGREGATES:
+                    return ("agg", name, args[0] if args else ("const", 1))
+                if name not in FUNCTIONS:
+                    raise QuerySyntaxError(f"Unsupported function {value}")
+                return ("func", name, args)
+            path = [value]
+            while True:
+                if self.accept("op", "."):
+                    path.append(self.expect("name"))
+                elif self.accept("op", "["):
+                    path.append(self.expect("literal"))
+                    self.expect("op", "]")
+                else:
+                    break
+            return ("path", tuple(path))
+        raise QuerySyntaxError(f"Unexpected token {value!r}")
+
+
+def _type_rank(value: Any) -> int:
+    if value is UNDEFINED:
+        return 0
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 2
+    if isinstance(value, (int, float)):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, list):
+        return 5
+    return 6
+
+
+def sort_key(value: Any) -> Tuple[int, Any]:
+    """Key ordering values the way Cosmos ORDER BY does across types."""
+    rank = _type_rank(value)
+    if rank in (2, 3, 4):
+        return rank, value
+    return rank, 0
+
+
+def _compare(op: str, left: Any, right: Any) -> Any:
+    rank = _type_rank(left)
+    if rank == 0 or rank != _type_rank(right):
+        return UNDEFINED
+    if op == "=":
+        return left == right
+    if op == "!=":
+        return left != right
+    if rank not in (2, 3, 4):
+        return UNDEFINED
+    if op == "<":
+        return left < right
+    if op == "<=":
+        return left <= right
+    if op == ">":
+        return left > right
+    return left >= right
+
+
+def _array_contains(array: Any, value: Any, partial: bool = False) -> Any:
+    if not isinstance(array, list):
+        return UNDEFINED
+    if partial and isinstance(value, dict):
+        return any(
+            isinstance(item, dict) and all(item.get(k, UNDEFINED) == v for k, v in value.items())
+            for item in array
+        )
+    return value in array
+
+
+def _string_function(func: Callable[..., Any]) -> Callable[..., Any]:
+    def wrapper(*args: Any) -> Any:
+        if not all(isinstance(arg, str) for arg in args[:2]):
+            return UNDEFINED
+        return func(*args)
+    return wrapper
+
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "ARRAY_CONTAINS": _array_contains,
+    "ARRAY_LENGTH": lambda a: len(a) if isinstance(a, list) else UNDEFINED,
+    "IS_DEFINED": lambda v: v is not UNDEFINED,
+    "IS_NULL": lambda v: v is None,
+    "IS_STRING": lambda v: isinstance(v, str),
+    "IS_NUMBER": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "CONTAINS": _string_function(lambda s, sub, ignore_case=False: sub.lower() in s.lower() if ignore_case else sub in s),
+    "STARTSWITH": _string_function(lambda s, prefix, ignore_case=False: s.lower().startswith(prefix.lower()) if ignore_case else s.startswith(prefix)),
+    "LOWER": _string_function(lambda s: s.lower()),
+    "UPPER": _string_function(lambda s: s.upper()),
+    "LEFT": lambda s, n: s[:n] if isinstance(s, str) else UNDEFINED,
+}
+
+
+def _truthy(value: Any) -> bool:
+    return value is True
+
+
+def evaluate(node: tuple, doc: Dict[str, Any], alias: str, params: Dict[str, Any]) -> Any:
+    """Evaluate an expression against a single document."""
+    kind = node[0]
+    if kind == "path":
+        path = node[1]
+        if path[0] != alias:
+            raise QuerySyntaxError(f"Unknown identifier {path[0]}")
+        value: Any = doc
+        for part in path[1:]:
+            if isinstance(value, dict) and isinstance(part, str):
+                value = value.get(part, UNDEFINED)
+            elif isinstance(value, list) and isinstance(part, int) and 0 <= part < len(value):
+                value = value[part]
+            else:
+                return UNDEFINED
+        return value
+    if kind == "const":
+        return node[1]
+    if kind == "param":
+        if node[1] not in params:
+            raise QuerySyntaxError(f"Missing parameter {node[1]}")
+        return params[node[1]]
+    if kind == "and":
+        left = evaluate(node[1], doc, alias, params)
+        if left is False:
+            return False
+        right = evaluate(node[2], doc, alias, params)
+        if left is True and isinstance(right, bool):
+            return right
+        return False if right is False else UNDEFINED
+    if kind == "or":
+        left = evaluate(node[1], doc, alias, params)
+        if left is True:
+            return True
+        right = evaluate(node[2], doc, alias, params)
+        if right is True:
+            return True
+        return False if left is False and right is False else UNDEFINED
+    if kind == "not":
+        value = evaluate(node[1], doc, alias, params)
+        return (not value) if isinstance(value, bool) else UNDEFINED
+    if kind == "cmp":
+        return _compare(node[1], evaluate(node[2], doc, alias, params), evaluate(node[3], doc, alias, params))
+    if kind == "in":
+        value = evaluate(node[1], doc, alias, params)
+        if value is UNDEFINED:
+            return UNDEFINED
+        return any(_compare("=", value, evaluate(item, doc, alias, params)) is True for item in node[2])
+    if kind == "arith":
+        left = evaluate(node[2], doc, alias, params)
+        right = evaluate(node[3], doc, alias, params)
+        if _type_rank(left) != 3 or _type_rank(right) != 3:
+            return UNDEFINED
+        op = node[1]
+        if op == "+":
+            return left + right
+        if op == "-":
+            return left - right
+        if op == "*":
+            return left * right
+        if right == 0:
+            return UNDEFINED
+        return left / right if op == "/" else left % right
+    if kind == "array":
+        return [evaluate(item, doc, alias, params) for item in node[1]]
+    if kind == "func":
+        args = [evaluate(arg, doc, alias, params) for arg in node[2]]
+        return FUNCTIONS[node[1]](*args)
+    if kind == "agg":
+        raise QuerySyntaxError("Aggregates are only allowed in the SELECT clause")
+    raise QuerySyntaxError(f"Unsupported expression {kind}")
+
+
+def _contains_aggregate(node: Any) -> bool:
+    if not isinstance(node, tuple):
+        return False
+    if node[0] == "agg":
+        return True
+    return any(
+        _contains_aggregate(child) or (isinstance(child, list) and any(_contains_aggregate(c) for c in child))
+        for child in node[1:]
+    )
+
+
+def _evaluate_group(node: tuple, rows: List[Dict[str, Any]], alias: str, params: Dict[str, Any]) -> Any:
+    """Evaluate a SELECT expression over a group of documents."""
+    if node[0] == "agg":
+        name = node[1]
+        values = [evaluate(node[2], row, alias, params) for row in rows]
+        if name == "COUNT":
+            return sum(1 for value in values if value is not UNDEFINED)
+        numbers = [value for value in values if _type_rank(value) == 3]
+        if name == "SUM":
+            return sum(numbers)
+        if name == "AVG":
+            return sum(numbers) / len(numbers) if numbers else UNDEFINED
+        comparable = [value for value in values if _type_rank(value) in (1, 2, 3, 4)]
+        if not comparable:
+            return UNDEFINED
+        return (min if name == "MIN" else max)(comparable, key=sort_key)
+    if not _contains_aggregate(node):
+        return evaluate(node, rows[0], alias, params) if rows else UNDEFINED
+    if node[0] == "arith":
+        left = _evaluate_group(node[2], rows, alias, params)
+        right = _evaluate_group(node[3], rows, alias, params)
+        return evaluate(("arith", node[1], ("const", left), ("const", right)), {}, alias, params)
+    raise QuerySyntaxError("Unsupported aggregate expression")
+
+
+def _output_name(expr: tuple, alias: Optional[str], index: int) -> str:
+    if alias:
+        return alias
+    if expr[0] == "path" and len(expr[1]) > 1 and isinstance(expr[1][-1], str):
+        return expr[1][-1]
+    return f"${index + 1}"
+
+
+class CompiledQuery:
+    """A parsed query that can be executed against an iterable of documents."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.ast = _Parser(text).parse_query()
+        self.alias = self.ast["alias"]
+        select = self.ast["select"] or []
+        self.aggregate = bool(self.ast["group_by"]) or any(_contains_aggregate(expr) for expr, _ in select)
+
+    def equality_filters(self, path: str, params: Dict[str, Any]) -> Optional[List[Any]]:
+        """Values a top-level `c.<path> = x` or `ARRAY_CONTAINS(x, c.<path>)` conjunct restricts to."""
+        for node in self._conjuncts(self.ast["where"]):
+            if node[0] == "cmp" and node[1] == "=":
+                for field, other in ((node[2], node[3]), (node[3], node[2])):
+                    if self._is_field(field, path) and other[0] in ("param", "const"):
+                        return [evaluate(other, {}, self.alias, params)]
+            if node[0] == "func" and node[1] == "ARRAY_CONTAINS" and len(node[2]) == 2:
+                array, field = node[2]
+                if self._is_field(field, path) and array[0] in ("param", "const", "array"):
+                    values = evaluate(array, {}, self.alias, params)
+                    if isinstance(values, list):
+                        return values
+        return None
+
+    def range_filters(self, path: str, params: Dict[str, Any]) -> Tuple[Optional[Tuple[Any, bool]], Optional[Tuple[Any, bool]]]:
+        """Lower and upper bounds on `c.<path>` implied by top-level conjuncts.
+
+        Each bound is a (value, inclusive) tuple or None.
+        """
+        lower = upper = None
+        flipped = {"<": ">", "<=": ">=", ">": "<", ">=": "<=", "=": "="}
+        for node in self._conjuncts(self.ast["where"]):
+            if node[0] != "cmp" or node[1] == "!=":
+                continue
+            op, left, right = node[1], node[2], node[3]
+            if self._is_field(right, path):
+                op, left, right = flipped[op], right, left
+            if not self._is_field(left, path) or right[0] not in ("param", "const"):
+                continue
+            value = evaluate(right, {}, self.alias, params)
+            if op in (">", ">=", "="):
+                lower = (value, op != ">")
+            if op in ("<", "<=", "="):
+                upper = (value, op != "<")
+        return lower, upper
+
+    def _is_field(self, node: tuple, path: str) -> bool:
+        return node[0] == "path" and node[1] == (self.alias, *path.split("."))
+
+    def _conjuncts(self, node: Optional[tuple]) -> Iterable[tuple]:
+        if node is None:
+            return
+        if node[0] == "and":
+            yield from self._conjuncts(node[1])
+            yield from self._conjuncts(node[2])
+        else:
+            yield node
+
+    def execute(self, documents: Iterable[Dict[str, Any]], parameters: Optional[List[Dict[str, Any]]] = None) -> List[Any]:
+        """Run the query and return the projected results."""
+        params = {p["name"]: p["value"] for p in (parameters or [])}
+        ast = self.ast
+        alias = self.alias
+        where = ast["where"]
+        rows = [doc for doc in documents if where is None or _truthy(evaluate(where, doc, alias, params))]
+
+        if ast["order_by"] and not self.aggregate:
+            for expr, descending in reversed(ast["order_by"]):
+                rows.sort(key=lambda doc: sort_key(evaluate(expr, doc, alias, params)), reverse=descending)
+
+        if self.aggregate:
+            results = self._aggregate(rows, params)
+        elif ast["select"] is None:
+            results = rows
+        else:
+            results = [self._project(lambda expr: evaluate(expr, doc, alias, params)) for doc in rows]
+        results = [result for result in results if result is not UNDEFINED]
+
+        if ast["offset"] is not None:
+            offset = evaluate(ast["offset"], {}, alias, params)
+            limit = evaluate(ast["limit"], {}, alias, params)
+            results = results[offset:offset + limit]
+        if ast["top"] is not None:
+            results = results[:ast["top"]]
+        return results
+
+    def _aggregate(self, rows: List[Dict[str, Any]], params: Dict[str, Any]) -> List[Any]:
+        ast = self.ast
+        alias = self.alias
+        if ast["group_by"]:
+            groups: Dict[Tuple[Any, ...], List[Dict[str, Any]]] = {}
+            for doc in rows:
+                key = tuple(repr(evaluate(expr, doc, alias, params)) for expr in ast["group_by"])
+                groups.setdefault(key, []).append(doc)
+            grouped = list(groups.values())
+        else:
+            grouped = [rows]
+        return [self._project(lambda expr: _evaluate_group(expr, group, alias, params)) for group in grouped]
+
+    def _project(self, evaluate_expr: Callable[[tuple], Any]) -> Any:
+        select = self.ast["select"]
+        if self.ast["value"]:
+            return evaluate_expr(select[0][0])
+        result = {}
+        for index, (expr, alias) in enumerate(select):
+            value = evaluate_expr(expr)
+            if value is not UNDEFINED:
+                result[_output_name(expr, alias, index)] = value
+        return result
+
+
+@lru_cache(maxsize=256)
+def compile_query(text: str) -> CompiledQuery:
+    """Parse a query, caching the result by query text."""
+    return CompiledQuery(text)
@@ -0,0 +1,435 @@
+import base64
+import binascii
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID
+
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+from app.core.config import settings
+from app.db.cosmos_db import MAX_BATCH_OPERATIONS
+from app.db.diagnostics import cosmos_diagnostics
+from app.db.storage import Storage, storage
+from app.utils.cache import TTLCache
+
+# Every household-owned container is partitioned on the `pk` field, which the
+# *DB models set to the household ID.
+HOUSEHOLD_PARTITION_KEY = "/pk"
+
+
+class InvalidContinuationToken(ValueError):
+    """Raised when a client sends a continuation token we did not issue."""
+
+
+def encode_continuation(token: Optional[str]) -> Optional[str]:
+    """Wrap a Cosmos continuation token into an opaque, URL-safe cursor."""
+    if token is None:
+        return None
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_continuation(cursor: Optional[str]) -> Optional[str]:
+    """Turn a cursor produced by encode_continuation back into a Cosmos token."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidContinuationToken("Invalid continuation token") from e
+
+
+def to_patch_operations(changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Translate a partial document into Cosmos `set` patch operations on its top-level fields."""
+    return [{"op": "set", "path": f"/{key}", "value": value} for key, value in changes.items()]
+
+
+def batch_item_id(operation: Tuple[Any, ...]) -> str:
+    """The ID of the document a transactional batch operation writes."""
+    operation_type, args = operation[0].lower(), operation[1]
+    if operation_type in ("create", "upsert"):
+        return str(args[0]["id"])
+    return str(args[0])
+
+
+class HouseholdRepository:
+    """Data access for a container partitioned by household.
+
+    Single-document access is always a point read on (id, household), so no
+    request issues a cross-partition query.
+    """
+
+    def __init__(self, container_id: str, db: Storage = storage, default_ttl: Optional[int] = None):
+        self.container_id = container_id
+        self.db = db
+        # Applied if the container is created on first use
+        self.default_ttl = default_ttl
+
+    async def container(self):
+        """Return the underlying container proxy."""
+        return await self.db.get_container(
+            self.container_id,
+            partition_key=HOUSEHOLD_PARTITION_KEY,
+            default_ttl=self.default_ttl
+        )
+
+    async def get(self, item_id: Union[str, UUID], household_id: Union[str, UUID]) -> Optional[Dict[str, Any]]:
+        """Point read a document, returning None when it does not exist in the household."""
+        container = await self.container()
+        try:
+            with cosmos_diagnostics.track(self.container_id, "read") as call:
+                item = await container.read_item(
+                    item=str(item_id),
+                    partition_key=str(household_id),
+                    response_hook=call.hook
+                )
+                call.add_items()
+            return item
+        except CosmosResourceNotFoundError:
+            return None
+
+    async def get_many(
+        self,
+        item_ids: Iterable[Union[str, UUID]],
+        household_id: Union[str, UUID],
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fetch several documents of one household in a single query, keyed by ID."""
+        ids = sorted({str(item_id) for item_id in item_ids})
+        if not ids:
+            return {}
+        query = "SELECT * FROM c WHERE ARRAY_CONTAINS(@ids, c.id)"
+        params = [{"name": "@ids", "value": ids}]
+        return {item["id"]: item async for item in self.query(query, params, household_id)}
+
+    async def query(
+        self,
+        query: str,
+        parameters: List[Dict[str, Any]],
+        household_id: Union[str, UUID],
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Run a query scoped to a single household partition."""
+        container = await self.container()
+        with cosmos_diagnostics.track(self.container_id, "query", query) as call:
+            async for item in container.query_items(
+                query=query,
+                parameters=parameters,
+                partition_key=str(household_id),
+                response_hook=call.hook
+            ):
+                call.add_items()
+                yield item
+
+    async def query_page(
+        self,
+        query: str,
+        parameters: List[Dict[str, Any]],
+        household_id: Union[str, UUID],
+        page_size: int,
+        continuation: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Fetch one page of a household-scoped query.
+
+        ``continuation`` is a cursor returned by a previous call; the second
+        element of the result is the cursor for the next page, or None when
+        the query is exhausted.
+        """
+        container = await self.container()
+        with cosmos_diagnostics.track(self.container_id, "query_page", query) as call:
+            pages = container.query_items(
+                query=query,
+                parameters=parameters,
+                partition_key=str(household_id),
+                max_item_count=page_size,
+                response_hook=call.hook
+            ).by_page(decode_continuation(continuation))
+            try:
+                page = await pages.__anext__()
+            except StopAsyncIteration:
+                return [], None
+            items = [item async for item in page]
+            call.add_items(len(items))
+        return items, encode_continuation(pages.continuation_token)
+
+    async def query_pages(
+        self,
+        query: str,
+        parameters: List[Dict[str, Any]],
+        household_id: Union[str, UUID],
+        page_size: int,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Run a household-scoped query, yielding its results one page at a time.
+
+        Only one page is held in memory, however large the result.
+        """
+        container = await self.container()
+        with cosmos_diagnostics.track(self.container_id, "query_pages", query) as call:
+            pages = container.query_items(
+                query=query,
+                parameters=parameters,
+                partition_key=str(household_id),
+                max_item_count=page_size,
+                response_hook=call.hook
+            ).by_page()
+            async for page in pages:
+                items = [item async for item in page]
+                call.add_items(len(items))
+                yield items
+
+    async def create(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a document."""
+        container = await self.container()
+        with cosmos_diagnostics.track(self.container_id, "create") as call:
+            created = await container.create_item(body=item, response_hook=call.hook)
+            call.add_items()
+        return created
+
+    async def upsert(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a document or replace it if it already exists."""
+        container = await self.container()
+        with cosmos_diagnostics.track(self.container_id, "upsert") as call:
+            upserted = await container.upsert_item(body=item, response_hook=call.hook)
+            call.add_items()
+        return upserted
+
+    async def replace(self, item: Dict[str, Any], etag: Optional[str] = None) -> Dict[str, Any]:
+        """Replace a document with a new body.
+
+        With ``etag`` the replace only succeeds if the stored document is
+        unchanged, otherwise CosmosAccessConditionFailedError is raised.
+        """
+        container = await self.container()
+        conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+        with cosmos_diagnostics.track(self.container_id, "replace") as call:
+            replaced = await container.replace_item(
+                item=str(item["id"]),
+                body=item,
+                response_hook=call.hook,
+                **conditions
+            )
+            call.add_items()
+        return replaced
+
+    async def patch(
+        self,
+        item_id: Union[str, UUID],
+        household_id: Union[str, UUID],
+        operations: List[Dict[str, Any]],
+        etag: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Apply partial update operations to a document and return the patched document.
+
+        With ``etag`` the patch only succeeds if the stored document is
+        unchanged, otherwise CosmosAccessConditionFailedError is raised.
+        """
+        container = await self.container()
+        conditions = {"etag": etag, "match_condition": MatchConditions.IfNotModified} if etag else {}
+        with cosmos_diagnostics.track(self.container_id, "patch") as call:
+            patched = await container.patch_item(
+                item=str(item_id),
+                partition_key=str(household_id),
+                patch_operations=operations,
+                response_hook=call.hook,
+                **conditions
+            )
+            call.add_items()
+        return patched
+
+    async def execute_batch(
+        self,
+        household_id: Union[str, UUID],
+        operations: List[Tuple[Any, ...]],
+    ) -> List[Dict[str, Any]]:
+        """Run up to MAX_BATCH_OPERATIONS operations as one transactional batch.
+
+        Operations use the tuple format of ``execute_item_batch``, e.g.
+        ``("create", (item,))`` or ``("patch", (item_id, operations), {"if_match_etag": etag})``.
+        Either every operation is applied or, with CosmosBatchOperationError,
+        none is.
+        """
+        container = await self.container()
+        with cosmos_diagnostics.track(self.container_id, "batch") as call:
+            results = await container.execute_item_batch(
+                batch_operations=operations,
+                partition_key=str(household_id),
+                response_hook=call.hook
+            )
+            call.add_items(len(operations))
+        return results
+
+    async def delete(self, item_id: Union[str, UUID], household_id: Union[str, UUID]) -> None:
+        """Delete a document from the household partition."""
+        container = await self.container()
+        with cosmos_diagnostics.track(self.container_id, "delete") as call:
+            await container.delete_item(item=str(item_id), partition_key=str(household_id), response_hook=call.hook)
+
+
+class CachedHouseholdRepository(HouseholdRepository):
+    """HouseholdRepository with a read-through cache for point reads.
+
+    Entries are keyed by (household, id). Every write made through the
+    repository invalidates the affected entry; callers doing a
+    read-modify-write should pass ``cached=False`` to read the latest version.
+
+    A read that was in flight while its key was invalidated does not fill
+    the cache, as it may have returned the version before the write. Keys
+    being read carry a generation that every invalidation bumps.
+    """
+
+    def __init__(self, container_id: str, cache: TTLCache, db: Storage = storage):
+        super().__init__(container_id, db)
+        self.cache = cache
+        # key -> (reads in flight, generation), only for keys being read
+        self._reads: Dict[Tuple[str, str], List[int]] = {}
+
+    def _begin_read(self, key: Tuple[str, str]) -> int:
+        """Register a read of ``key`` and return its current generation."""
+        state = self._reads.setdefault(key, [0, 0])
+        state[0] += 1
+        return state[1]
+
+    def _end_read(self, key: Tuple[str, str], generation: int, item: Optional[Dict[str, Any]]) -> None:
+        """Cache what a read returned unless the key was invalidated meanwhile."""
+        state = self._reads[key]
+        if item is not None and state[1] == generation:
+            self.cache.set(key, item)
+        state[0] -= 1
+        if not state[0]:
+            del self._reads[key]
+
+    async def get(
+        self,
+        item_id: Union[str, UUID],
+        household_id: Union[str, UUID],
+        cached: bool = True,
+    ) -> Optional[Dict[str, Any]]:
+        key = (str(household_id), str(item_id))
+        if cached:
+            item = self.cache.get(key)
+            if item is not None:
+                return dict(item)
+        generation = self._begin_read(key)
+        item = None
+        try:
+            item = await super().get(item_id, household_id)
+        finally:
+            self._end_read(key, generation, item)
+        return dict(item) if item is not None else None
+
+    async def get_many(
+        self,
+        item_ids: Iterable[Union[str, UUID]],
+        household_id: Union[str, UUID],
+        cached: bool = True,
+    ) -> Dict[str, Dict[str, Any]]:
+        household_id = str(household_id)
+        items = {}
+        missing = []
+        for item_id in {str(item_id) for item_id in item_ids}:
+            item = self.cache.get((household_id, item_id)) if cached else None
+            if item is None:
+                missing.append(item_id)
+            else:
+                items[item_id] = dict(item)
+        if missing:
+            generations = {item_id: self._begin_read((household_id, item_id)) for item_id in missing}
+            fetched: Dict[str, Dict[str, Any]] = {}
+            try:
+                fetched = await super().get_many(missing, household_id)
+            finally:
+                for item_id, generation in generations.items():
+                    self._end_read((household_id, item_id), generation, fetched.get(item_id))
+            for item_id, item in fetched.items():
+                items[item_id] = dict(item)
+        return items
+
+    async def create(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        self.invalidate(item["id"], item["pk"])
+        return await super().create(item)
+
+    async def upsert(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        self.invalidate(item["id"], item["pk"])
+        try:
+            return await super().upsert(item)
+        finally:
+            self.invalidate(item["id"], item["pk"])
+
+    async def replace(self, item: Dict[str, Any], etag: Optional[str] = None) -> Dict[str, Any]:
+        self.invalidate(item["id"], item["pk"])
+        try:
+            return await super().replace(item, etag)
+        finally:
+            self.invalidate(item["id"], item["pk"])
+
+    async def patch(
+        self,
+        item_id: Union[str, UUID],
+        household_id: Union[str, UUID],
+        operations: List[Dict[str, Any]],
+        etag: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        self.invalidate(item_id, household_id)
+        try:
+            return await super().patch(item_id, household_id, operations, etag)
+        finally:
+            self.invalidate(item_id, household_id)
+
+    async def delete(self, item_id: Union[str, UUID], household_id: Union[str, UUID]) -> None:
+        self.invalidate(item_id, household_id)
+        try:
+            await super().delete(item_id, household_id)
+        finally:
+            self.invalidate(item_id, household_id)
+
+    async def execute_batch(
+        self,
+        household_id: Union[str, UUID],
+        operations: List[Tuple[Any, ...]],
+    ) -> List[Dict[str, Any]]:
+        item_ids = [batch_item_id(operation) for operation in operations]
+        for item_id in item_ids:
+            self.invalidate(item_id, household_id)
+        try:
+            return await super().execute_batch(household_id, operations)
+        finally:
+            for item_id in item_ids:
+                self.invalidate(item_id, household_id)
+
+    def invalidate(self, item_id: Union[str, UUID], household_id: Union[str, UUID]) -> None:
+        """Drop a cached document and keep reads in flight from caching it again."""
+        key = (str(household_id), str(item_id))
+        self.cache.pop(key)
+        state = self._reads.get(key)
+        if state is not None:
+            state[1] += 1
+
+
+meal_cache = TTLCache(
+    max_size=settings.MEAL_CACHE_MAX_SIZE,
+    ttl_seconds=settings.MEAL_CACHE_TTL_SECONDS,
+)
+
+meals_repository = CachedHouseholdRepository("meals", meal_cache)
+meal_plans_repository = HouseholdRepository("meal_plans")
+meal_ratings_repository = HouseholdRepository("meal_ratings")
+meal_plan_rollups_repository = HouseholdRepository("meal_plan_rollups")
+meal_plan_templates_repository = HouseholdRepository("meal_plan_templates")
+tombstones_repository = HouseholdRepository("tombstones", default_ttl=-1)
+# Change feed leases, partitioned by processor name rather than household
+leases_repository = HouseholdRepository("leases")
+
+HOUSEHOLD_REPOSITORIES = [
+    meals_repository,
+    meal_plans_repository,
+    meal_ratings_repository,
+    meal_plan_rollups_repository,
+    meal_plan_templates_repository,
+    tombstones_repository,
+    leases_repository,
+]
+
+
+async def open_containers() -> None:
+    """Open every household container, so one on an outdated partition key
+    raises PartitionKeyMismatch at startup instead of failing requests."""
+    for repository in HOUSEHOLD_REPOSITORIES:
+        await repository.container()
@@ -0,0 +1,95 @@
+"""
+Storage backend selection.
+
+The routes only depend on the operations below, which both the Cosmos DB
+backend (AsyncCosmosDB) and the in-memory backend (InMemoryDB) provide.
+The backend is chosen with the STORAGE_BACKEND setting.
+"""
+from typing import Any, AsyncIterable, Dict, List, Mapping, Optional, Protocol, Tuple, Union
+
+from app.core.config import settings
+from app.db.cosmos_db import async_cosmos_db
+
+
+class StorageContainer(Protocol):
+    """Container operations used by the repositories (a subset of the aio ContainerProxy)."""
+
+    async def read_item(self, item: Union[str, Mapping[str, Any]], partition_key: Any, **kwargs: Any) -> Dict[str, Any]:
+        ...
+
+    def query_items(
+        self,
+        query: str,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        partition_key: Any = None,
+        max_item_count: Optional[int] = None,
+        **kwargs: Any,
+    ) -> Any:
+        ...
+
+    async def create_item(self, body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        ...
+
+    async def upsert_item(self, body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        ...
+
+    async def replace_item(self, item: Union[str, Mapping[str, Any]], body: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        ...
+
+    async def delete_item(self, item: Union[str, Mapping[str, Any]], partition_key: Any, **kwargs: Any) -> None:
+        ...
+
+    async def patch_item(
+        self,
+        item: Union[str, Mapping[str, Any]],
+        partition_key: Any,
+        patch_operations: List[Dict[str, Any]],
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        ...
+
+    async def execute_item_batch(
+        self,
+        batch_operations: List[Tuple[Any, ...]],
+        partition_key: Any,
+        **kwargs: Any,
+    ) -> List[Dict[str, Any]]:
+        ...
+
+    def read_feed_ranges(self, **kwargs: Any) -> AsyncIterable[Dict[str, Any]]:
+        ...
+
+    def query_items_change_feed(self, **kwargs: Any) -> Any:
+        ...
+
+
+class Storage(Protocol):
+    """A storage backend: a connection lifecycle plus named containers."""
+
+    async def connect(self) -> None:
+        ...
+
+    async def close(self) -> None:
+        ...
+
+    async def get_container(
+        self,
+        container_id: str,
+        partition_key: str = "/id",
+        default_ttl: Optional[int] = None,
+    ) -> StorageContainer:
+        ...
+
+
+def create_storage(backend: str) -> Storage:
+    """Return the storage backend with the given name."""
+    if backend == "cosmos":
+        return async_cosmos_db
+    if backend == "memory":
+        # Imported lazily so the Cosmos deployment never loads the query evaluator
+        from app.db.memory_db import InMemoryDB
+        return InMemoryDB()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+storage = create_storage(settings.STORAGE_BACKEND)
@@ -7,8 +7,15 @@ from fastapi.security import OAuth2PasswordBearer
 import logging
 
 from app.api.api import api_router
+from app.api.pagination import CONTINUATION_HEADER
 from app.core.config import settings
-from app.db.cosmos_db import cosmos_db
+from app.core.oidc import get_token_data, jwks_cache, token_cache
+from app.db.change_feed import change_feed_host
+from app.db.diagnostics import cosmos_diagnostics
+from app.db.repository import meal_cache, open_containers
+from app.db.storage import storage
+from app.services.events import event_broker
+from app.services.jobs import job_queue
 
 # Configure logging
 logging.basicConfig(
@@ -19,9 +26,16 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    cosmos_db.connect()
+    await storage.connect()
+    await open_containers()
+    job_queue.start()
+    change_feed_host.start()
     yield
-    # (Optional) Add any cleanup logic here
+    event_broker.close()
+    await change_feed_host.stop()
+    await job_queue.stop(settings.JOB_QUEUE_SHUTDOWN_TIMEOUT_SECONDS)
+    await jwks_cache.close()
+    await storage.close()
 
 app = FastAPI(
     title="FoodPal API",
@@ -39,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CONTINUATION_HEADER, "ETag"],
 )
 
 # Include API router
@@ -83,6 +98,19 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False, dependencies=[Depends(get_token_data)])
+    async def metrics():
+        return {
+            "cosmos": cosmos_diagnostics.snapshot(),
+            "meal_cache": meal_cache.stats(),
+            "jwks_cache": jwks_cache.stats(),
+            "token_cache": token_cache.stats(),
+            "jobs": job_queue.stats(),
+            "events": event_broker.stats(),
+            "change_feed": change_feed_host.stats(),
+        }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
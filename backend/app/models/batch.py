@@ -0,0 +1,41 @@
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from pydantic import Field
+
+from app.core.config import settings
+from app.models.sync import SyncEntity
+from app.schemas import BaseSchema
+
+
+class BatchOperationType(str, Enum):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+class BatchOperation(BaseSchema):
+    op: BatchOperationType
+    entity: SyncEntity
+    id: Optional[UUID] = None  # Required for update and delete; optional client-generated ID for create
+    body: Optional[Dict[str, Any]] = None  # Create or Update model of the entity
+    if_match: Optional[str] = None  # Only apply if the document still has this ETag
+    
+    class Config:
+        use_enum_values = True
+
+
+class BatchRequest(BaseSchema):
+    operations: List[BatchOperation] = Field(..., max_length=settings.BATCH_MAX_OPERATIONS)
+
+
+class BatchOperationResult(BaseSchema):
+    status: int  # HTTP status the operation would have had on its own endpoint
+    id: Optional[UUID] = None
+    etag: Optional[str] = None
+    item: Optional[Dict[str, Any]] = None  # The document after a create or update
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseSchema):
+    results: List[BatchOperationResult]  # In the order of the operations
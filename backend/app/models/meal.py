@@ -90,6 +90,11 @@ class MealDB(MealBase):
     created_by: UUID
     household_id: UUID
     rating: Optional[MealRating] = None
+    # Running rating aggregates, None until the meal's ratings have been aggregated
+    rating_sum: Optional[int] = None
+    rating_count: Optional[int] = None
+    rating_distribution: Optional[Dict[str, int]] = None  # Rating value -> count
+    rating_seed: Optional[str] = None  # Id of the count the aggregates were last seeded from
     # For CosmosDB
     pk: str = ""  # Partition key (will be set to household_id)
     
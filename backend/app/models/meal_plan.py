@@ -81,7 +81,7 @@ class MealPlanEntry(MealPlanEntryBase):
 
 
 class MealPlanEntryWithMeal(MealPlanEntry):
-    meal: Meal
+    meal: Optional[Meal] = None  # None when the meal no longer exists
     
     class Config:
         use_enum_values = True
@@ -110,3 +110,24 @@ class MealPlanStatistics(BaseSchema):
     class Config:
         use_enum_values = True
 
+
+
+class MealPlanRangeStatistics(BaseSchema):
+    start_date: date
+    end_date: date
+    total_planned: int
+    planned_count: int
+    prepared_count: int
+    skipped_count: int
+    replaced_count: int
+    total_calories: int
+    rating_count: int
+    average_rating: Optional[float] = None
+    favorite_meal_id: Optional[UUID] = None
+    favorite_meal_name: Optional[str] = None
+    most_common_category: Optional[str] = None
+    meal_counts: Dict[str, int] = {}  # Meal ID -> prepared count
+    category_counts: Dict[str, int] = {}  # Category -> prepared count
+    
+    class Config:
+        use_enum_values = True
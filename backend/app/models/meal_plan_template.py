@@ -0,0 +1,97 @@
+from datetime import date, datetime
+from typing import List, Optional
+from uuid import UUID, uuid4
+from pydantic import Field
+
+from app.models.meal import MealType
+from app.schemas import BaseSchema
+
+
+class MealPlanTemplateSlot(BaseSchema):
+    week: int = Field(0, ge=0)  # Week of the rotation, below rotation_weeks
+    weekday: int = Field(..., ge=0, le=6)  # 0 = Monday
+    meal_type: MealType
+    meal_id: UUID
+    serving_count: int = 1
+    notes: Optional[str] = None
+    
+    class Config:
+        use_enum_values = True
+
+
+class MealPlanTemplateBase(BaseSchema):
+    name: str
+    description: Optional[str] = None
+    slots: List[MealPlanTemplateSlot] = []
+    # The slots repeat every rotation_weeks weeks, counted from the week of starts_on
+    rotation_weeks: int = Field(1, ge=1, le=52)
+    starts_on: date = Field(default_factory=date.today)
+    ends_on: Optional[date] = None  # Last day the template applies to, if it expires
+    
+    class Config:
+        use_enum_values = True
+
+
+class MealPlanTemplateCreate(MealPlanTemplateBase):
+    pass
+
+
+class MealPlanTemplateUpdate(BaseSchema):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    slots: Optional[List[MealPlanTemplateSlot]] = None
+    rotation_weeks: Optional[int] = Field(None, ge=1, le=52)
+    starts_on: Optional[date] = None
+    ends_on: Optional[date] = None
+    
+    class Config:
+        use_enum_values = True
+
+
+class MealPlanTemplateDB(MealPlanTemplateBase):
+    id: UUID = Field(default_factory=uuid4)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    created_by: UUID
+    household_id: UUID
+    
+    # For CosmosDB
+    pk: str = ""  # Partition key (will be set to household_id)
+    
+    def __init__(self, **data):
+        super().__init__(**data)
+        if self.household_id:
+            self.pk = str(self.household_id)
+    
+    class Config:
+        use_enum_values = True
+        populate_by_name = True
+        arbitrary_types_allowed = True
+
+
+class MealPlanTemplate(MealPlanTemplateBase):
+    id: UUID
+    created_at: datetime
+    updated_at: datetime
+    created_by: UUID
+    household_id: UUID
+    
+    class Config:
+        use_enum_values = True
+        orm_mode = True
+
+
+class MealPlanTemplateApply(BaseSchema):
+    start_date: date
+    end_date: date  # Inclusive
+    skip_existing: bool = True  # Leave days and meal types that already have an entry alone
+
+
+class MealPlanCopy(BaseSchema):
+    source_start_date: date
+    source_end_date: date  # Inclusive
+    target_start_date: date
+    # Inclusive; defaults to a range as long as the source. A longer target
+    # range repeats the source range.
+    target_end_date: Optional[date] = None
+    skip_existing: bool = True  # Leave days and meal types that already have an entry alone
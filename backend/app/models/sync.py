@@ -0,0 +1,49 @@
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from app.models.meal import Meal
+from app.models.meal_plan import MealPlanEntry
+from app.models.meal_rating import MealRating
+from app.schemas import BaseSchema
+
+
+class SyncEntity(str, Enum):
+    MEAL = "meal"
+    MEAL_PLAN = "meal_plan"
+    MEAL_RATING = "meal_rating"
+
+
+class SyncTombstone(BaseSchema):
+    entity: SyncEntity
+    id: UUID
+    deleted_at: datetime
+    
+    class Config:
+        use_enum_values = True
+
+
+class SyncResponse(BaseSchema):
+    cursor: str  # Pass back as `cursor` on the next sync
+    reset: bool = False  # True when this is a full snapshot replacing everything the client has
+    meals: List[Meal] = []
+    meal_plans: List[MealPlanEntry] = []
+    meal_ratings: List[MealRating] = []
+    deleted: List[SyncTombstone] = []
+
+
+class ChangeEventType(str, Enum):
+    UPSERT = "upsert"
+    DELETE = "delete"
+    RESYNC = "resync"  # Events were dropped; the client should sync instead
+
+
+class ChangeEvent(BaseSchema):
+    type: ChangeEventType
+    entity: Optional[SyncEntity] = None
+    id: Optional[UUID] = None
+    item: Optional[Dict[str, Any]] = None  # The document as its endpoints return it, for upserts
+    
+    class Config:
+        use_enum_values = True
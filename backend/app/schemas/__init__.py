@@ -1,3 +1,5 @@
+from functools import lru_cache
+from typing import Any, ClassVar, Dict
 from pydantic import BaseModel, model_validator
 import re
 from uuid import UUID
@@ -9,39 +11,63 @@ def to_camel(string: str) -> str:
     parts = string.split('_')
     return parts[0] + ''.join(word.capitalize() for word in parts[1:])
 
+@lru_cache(maxsize=4096)
 def camel_to_snake(name: str) -> str:
     s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
 
+def convert_key(key: Any, known_keys: Dict[str, str]) -> Any:
+    """Map an input key to its snake_case field name, memoizing keys that are not fields."""
+    field_name = known_keys.get(key)
+    if field_name is not None:
+        return field_name
+    return camel_to_snake(key) if isinstance(key, str) else key
+
 class BaseSchema(BaseModel):
+    # Field name and alias of every field -> field name, built once per model
+    __snake_case_keys__: ClassVar[Dict[str, str]] = {}
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs):
+        super().__pydantic_init_subclass__(**kwargs)
+        keys = {}
+        for name, field in cls.model_fields.items():
+            keys[name] = name
+            if field.alias:
+                keys[field.alias] = name
+        cls.__snake_case_keys__ = keys
+
     @model_validator(mode="before")
     @classmethod
     def convert_camel_to_snake(cls, values):
-        def process(data):
-            if isinstance(data, dict):
-                return {camel_to_snake(k): process(v) for k, v in data.items()}
-            elif isinstance(data, list):
-                return [process(i) for i in data]
-            else:
-                return data
-        return process(values)
-
-    def model_dump(self, *args, **kwargs):
         """
-        Override model_dump to recursively cast UUIDs to strings and datetime to timestamps in the output dict.
+        Accept camelCase keys by renaming them to their snake_case field names.
+        
+        Only the model's own keys are converted; nested models convert theirs
+        when they are validated. Input that is already snake_case is passed
+        through without being copied.
+        """
+        if not isinstance(values, dict):
+            return values
+        known_keys = cls.__snake_case_keys__
+        for key in values:
+            if convert_key(key, known_keys) != key:
+                break
+        else:
+            return values
+        return {convert_key(k, known_keys): v for k, v in values.items()}
+
+    def to_db(self, **kwargs) -> Dict[str, Any]:
+        """
+        Serialize the model into the document stored in Cosmos DB.
+        
+        Keys are the snake_case field names that queries filter on. UUIDs,
+        enums, dates and datetimes are turned into JSON values in a single
+        pass of the model's compiled serializer; datetimes are written as
+        ISO 8601 strings, which parse back to the same values. Extra keyword
+        arguments (e.g. ``exclude_unset``) are passed on to ``model_dump``.
         """
-        def cast_for_db(obj):
-            if isinstance(obj, dict):
-                return {k: cast_for_db(v) for k, v in obj.items()}
-            elif isinstance(obj, list):
-                return [cast_for_db(i) for i in obj]
-            elif isinstance(obj, UUID):
-                return str(obj)
-            elif isinstance(obj, datetime):
-                return int(obj.timestamp())
-            else:
-                return obj
-        return cast_for_db(super().model_dump(*args, **kwargs))
+        return self.model_dump(mode="json", by_alias=False, **kwargs)
 
     model_config = {
         "alias_generator": to_camel,
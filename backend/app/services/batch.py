@@ -0,0 +1,267 @@
+"""
+Replay of a client's queued mutations as Cosmos DB transactional batches.
+
+Operations are executed in order. Consecutive operations on the same
+container are grouped into one transactional batch of up to
+MAX_BATCH_OPERATIONS, so a batch either applies completely or not at all. A
+batch ends early when an operation touches a document already written in
+it, so every operation is prepared against the document as left by the
+operations before it.
+
+A failing batch does not stop the ones after it: every operation gets its
+own result, with 424 for the operations rolled back because another one in
+their batch failed.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from azure.cosmos.exceptions import CosmosBatchOperationError
+from pydantic import ValidationError
+
+from app.db.repository import (
+    MAX_BATCH_OPERATIONS,
+    HouseholdRepository,
+    meal_plans_repository,
+    meal_ratings_repository,
+    meals_repository,
+    to_patch_operations,
+)
+from app.models.batch import BatchOperation, BatchOperationResult, BatchOperationType
+from app.models.meal import Meal, MealCreate, MealDB, MealUpdate
+from app.models.meal_plan import MealPlanEntry, MealPlanEntryCreate, MealPlanEntryDB, MealPlanEntryUpdate
+from app.models.meal_rating import MealRating, MealRatingCreate, MealRatingDB, MealRatingUpdate
+from app.models.sync import SyncEntity
+from app.schemas import BaseSchema
+from app.services.events import publish_delete, publish_upsert
+from app.services.rating_aggregates import read_rating_seeds, schedule_rating_delta
+from app.services.rollups import meal_plan_rollups
+from app.services.sync import record_deletion
+
+logger = logging.getLogger(__name__)
+
+
+class BatchEntity:
+    """How batch operations on one kind of document are validated and stored."""
+
+    def __init__(
+        self,
+        repository: HouseholdRepository,
+        create_model: Type[BaseSchema],
+        update_model: Type[BaseSchema],
+        db_model: Type[BaseSchema],
+        response_model: Type[BaseSchema],
+        owner_field: str,
+        owner_only: bool = False,
+    ):
+        self.repository = repository
+        self.create_model = create_model
+        self.update_model = update_model
+        self.db_model = db_model
+        self.response_model = response_model
+        # Field holding the user who created the document, and whether only
+        # that user may change it
+        self.owner_field = owner_field
+        self.owner_only = owner_only
+
+
+BATCH_ENTITIES: Dict[SyncEntity, BatchEntity] = {
+    SyncEntity.MEAL: BatchEntity(meals_repository, MealCreate, MealUpdate, MealDB, Meal, "created_by"),
+    SyncEntity.MEAL_PLAN: BatchEntity(
+        meal_plans_repository, MealPlanEntryCreate, MealPlanEntryUpdate, MealPlanEntryDB, MealPlanEntry, "created_by"
+    ),
+    SyncEntity.MEAL_RATING: BatchEntity(
+        meal_ratings_repository, MealRatingCreate, MealRatingUpdate, MealRatingDB, MealRating, "user_id",
+        owner_only=True
+    ),
+}
+
+
+class BatchError(Exception):
+    """An operation that cannot be executed, with the status it is reported with."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class PreparedOperation:
+    """A validated operation and the transactional batch operation carrying it out."""
+
+    def __init__(
+        self,
+        index: int,
+        op: BatchOperationType,
+        item_id: str,
+        batch_operation: Tuple[Any, ...],
+        old: Optional[Dict[str, Any]],
+    ):
+        self.index = index
+        self.op = op
+        self.item_id = item_id
+        self.batch_operation = batch_operation
+        self.old = old
+
+
+class BatchExecutor:
+    """Executes one request's operations for a household."""
+
+    def __init__(self, household_id: str, user_id: str, operations: List[BatchOperation]):
+        self.household_id = household_id
+        self.user_id = user_id
+        self.operations = operations
+        self.results: List[Optional[BatchOperationResult]] = [None] * len(operations)
+        # Latest known version of the documents the operations touch; None
+        # for documents known not to exist
+        self.documents: Dict[Tuple[SyncEntity, str], Optional[Dict[str, Any]]] = {}
+        # Rating aggregate seeds of the rated meals, read before any write
+        self.rating_seeds: Dict[str, Optional[str]] = {}
+        self.batches = 0
+
+    async def run(self) -> List[BatchOperationResult]:
+        await self._load_documents()
+        entity: Optional[SyncEntity] = None
+        pending: List[PreparedOperation] = []
+        for index, operation in enumerate(self.operations):
+            operation_entity = SyncEntity(operation.entity)
+            item_id = str(operation.id) if operation.id else None
+            if pending and (
+                operation_entity != entity
+                or len(pending) == MAX_BATCH_OPERATIONS
+                or any(prepared.item_id == item_id for prepared in pending)
+            ):
+                await self._execute(entity, pending)
+                pending = []
+            entity = operation_entity
+            try:
+                pending.append(self._prepare(index, operation_entity, operation))
+            except BatchError as e:
+                self.results[index] = BatchOperationResult(status=e.status, id=operation.id, error=str(e))
+        if pending:
+            await self._execute(entity, pending)
+        return self.results
+
+    async def _load_documents(self) -> None:
+        """Read the documents that updates and deletes refer to, one query per container,
+        and the rating aggregate seeds of the meals the rating operations are for."""
+        ids: Dict[SyncEntity, set] = {}
+        for operation in self.operations:
+            if operation.op != BatchOperationType.CREATE.value and operation.id:
+                ids.setdefault(SyncEntity(operation.entity), set()).add(str(operation.id))
+        for entity, item_ids in ids.items():
+            found = await BATCH_ENTITIES[entity].repository.get_many(item_ids, self.household_id)
+            for item_id in item_ids:
+                self.documents[(entity, item_id)] = found.get(item_id)
+        meal_ids = set()
+        for operation in self.operations:
+            if SyncEntity(operation.entity) != SyncEntity.MEAL_RATING:
+                continue
+            existing = self.documents.get((SyncEntity.MEAL_RATING, str(operation.id)))
+            meal_id = (existing or operation.body or {}).get("meal_id")
+            if meal_id:
+                meal_ids.add(str(meal_id))
+        if meal_ids:
+            self.rating_seeds = await read_rating_seeds(meal_ids, self.household_id)
+
+    def _prepare(self, index: int, entity: SyncEntity, operation: BatchOperation) -> PreparedOperation:
+        config = BATCH_ENTITIES[entity]
+        op = BatchOperationType(operation.op)
+        try:
+            if op == BatchOperationType.CREATE:
+                body = config.create_model(**(operation.body or {}))
+                fields = {"id": operation.id} if operation.id else {}
+                document = config.db_model(
+                    **body.model_dump(),
+                    **fields,
+                    **{config.owner_field: self.user_id},
+                    household_id=self.household_id
+                ).to_db()
+                return PreparedOperation(index, op, document["id"], ("create", (document,)), None)
+            if operation.id is None:
+                raise BatchError(400, f"{op.value.capitalize()} operations need an id")
+            item_id = str(operation.id)
+            name = entity.value.replace("_", " ")
+            existing = self.documents.get((entity, item_id))
+            if existing is None:
+                raise BatchError(404, f"{name.capitalize()} with ID {item_id} not found")
+            if config.owner_only and str(existing.get(config.owner_field)) != self.user_id:
+                raise BatchError(403, f"You don't have permission to {op.value} this {name}")
+            # Conditional on the version the operation was prepared against
+            options = {"if_match_etag": operation.if_match or existing["_etag"]}
+            if op == BatchOperationType.DELETE:
+                return PreparedOperation(index, op, item_id, ("delete", (item_id,), options), existing)
+            update_data = config.update_model(**(operation.body or {})).to_db(exclude_unset=True)
+            update_data["updated_at"] = datetime.utcnow().isoformat()
+            patch = ("patch", (item_id, to_patch_operations(update_data)), options)
+            return PreparedOperation(index, op, item_id, patch, existing)
+        except ValidationError as e:
+            raise BatchError(422, str(e))
+
+    async def _execute(self, entity: SyncEntity, pending: List[PreparedOperation]) -> None:
+        config = BATCH_ENTITIES[entity]
+        self.batches += 1
+        try:
+            responses = await config.repository.execute_batch(
+                self.household_id,
+                [prepared.batch_operation for prepared in pending]
+            )
+        except CosmosBatchOperationError as e:
+            for position, prepared in enumerate(pending):
+                response = e.operation_responses[position] if e.operation_responses else {}
+                status = response.get("statusCode", 424)
+                if position == e.error_index:
+                    error = response.get("message") or f"Failed with status {status}"
+                else:
+                    error = "Rolled back because another operation in its batch failed"
+                self.results[prepared.index] = BatchOperationResult(status=status, id=prepared.item_id, error=error)
+            return
+        except Exception as e:
+            logger.error(f"Batch of {len(pending)} {entity.value} operations failed for household {self.household_id}: {e}")
+            for prepared in pending:
+                self.results[prepared.index] = BatchOperationResult(status=500, id=prepared.item_id, error=str(e))
+            return
+
+        for prepared, response in zip(pending, responses):
+            document = response.get("resourceBody")
+            self.documents[(entity, prepared.item_id)] = document
+            item = None
+            if document is not None:
+                item = config.response_model(**document).model_dump(mode="json", by_alias=True)
+            self.results[prepared.index] = BatchOperationResult(
+                status=response.get("statusCode", 200),
+                id=prepared.item_id,
+                etag=response.get("eTag"),
+                item=item
+            )
+            await self._after_write(entity, prepared, document)
+
+    async def _after_write(self, entity: SyncEntity, prepared: PreparedOperation, document: Optional[Dict[str, Any]]) -> None:
+        """The side effects the single-document endpoints have for the same write."""
+        if prepared.op == BatchOperationType.DELETE:
+            await record_deletion(entity, prepared.item_id, self.household_id)
+            publish_delete(entity, prepared.item_id, self.household_id)
+        elif document is not None:
+            publish_upsert(entity, document)
+        config = BATCH_ENTITIES[entity]
+        old = config.db_model(**prepared.old) if prepared.old is not None else None
+        new = config.db_model(**document) if document is not None else None
+        if entity == SyncEntity.MEAL_PLAN:
+            await meal_plan_rollups.record_plan_change(self.household_id, old, new)
+        elif entity == SyncEntity.MEAL_RATING:
+            await meal_plan_rollups.record_rating_change(self.household_id, old, new)
+            # Ratings cannot move to another meal, so one delta covers the change
+            delta: Dict[int, int] = {}
+            for rating, sign in ((old, -1), (new, 1)):
+                if rating is not None:
+                    delta[rating.rating] = delta.get(rating.rating, 0) + sign
+            if any(delta.values()):
+                meal_id = str((new or old).meal_id)
+                schedule_rating_delta(meal_id, self.household_id, delta, self.rating_seeds.get(meal_id))
+
+
+async def execute_operations(household_id: str, user_id: str, operations: List[BatchOperation]) -> List[BatchOperationResult]:
+    """Execute a client's queued mutations in order and return one result per operation."""
+    executor = BatchExecutor(household_id, user_id, operations)
+    results = await executor.run()
+    logger.info(f"Executed {len(operations)} operations in {executor.batches} batches for household {household_id}")
+    return results
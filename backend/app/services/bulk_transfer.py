@@ -0,0 +1,225 @@
+"""
+NDJSON export and import of a household's meals, meal plan entries and ratings.
+
+Every line is a JSON object ``{"type": <entity>, "data": <document>}`` with
+the document in its stored (snake_case) form, minus Cosmos system
+properties. An export ends with ``{"type": "end", "counts": {...}}`` so a
+truncated file can be told from a complete one; imports skip that line.
+
+Both directions stream: exports are written one Cosmos page at a time and
+imports are parsed line by line from the request body, with a bounded
+number of upserts in flight.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple, Type
+
+import orjson
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.db.repository import HouseholdRepository
+from app.models.meal import MealDB
+from app.models.meal_plan import MealPlanEntryDB
+from app.models.meal_rating import MealRatingDB
+from app.models.sync import SyncEntity
+from app.schemas import BaseSchema
+from app.services.events import publish_resync
+from app.services.rating_aggregates import reset_rating_aggregates, schedule_rating_delta
+from app.services.rollups import meal_plan_rollups
+from app.services.sync import SYNC_REPOSITORIES
+
+logger = logging.getLogger(__name__)
+
+END_TYPE = "end"
+
+# Entities in export order: meals first so that a partial import still has
+# the meals its plan entries and ratings refer to
+EXPORT_ENTITIES: List[Tuple[SyncEntity, Type[BaseSchema]]] = [
+    (SyncEntity.MEAL, MealDB),
+    (SyncEntity.MEAL_PLAN, MealPlanEntryDB),
+    (SyncEntity.MEAL_RATING, MealRatingDB),
+]
+DB_MODELS: Dict[str, Type[BaseSchema]] = {entity.value: model for entity, model in EXPORT_ENTITIES}
+
+# Aggregates recomputed after an import rather than trusted from the file
+MEAL_AGGREGATE_FIELDS = ("rating_sum", "rating_count", "rating_distribution", "rating_seed")
+
+
+def _export_line(entity: SyncEntity, document: Dict[str, Any]) -> bytes:
+    data = {key: value for key, value in document.items() if not key.startswith("_")}
+    return orjson.dumps({"type": entity.value, "data": data}) + b"\n"
+
+
+async def export_household(household_id: str) -> AsyncIterator[bytes]:
+    """Yield a household's documents as NDJSON, one chunk per Cosmos page."""
+    query = "SELECT * FROM c WHERE c.household_id = @household_id"
+    params = [{"name": "@household_id", "value": household_id}]
+    counts = {}
+    for entity, _ in EXPORT_ENTITIES:
+        repository = SYNC_REPOSITORIES[entity]
+        counts[entity.value] = 0
+        async for page in repository.query_pages(query, params, household_id, settings.MAX_PAGE_SIZE):
+            counts[entity.value] += len(page)
+            yield b"".join(_export_line(entity, document) for document in page)
+    yield orjson.dumps({"type": END_TYPE, "counts": counts}) + b"\n"
+    logger.info(f"Exported household {household_id}: {counts}")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Split a byte stream into numbered lines.
+
+    Lines longer than ``max_line_bytes`` are not buffered; they are yielded
+    as None so the caller can report them. Only the trailing partial line of
+    a chunk is carried over, so splitting is linear in the stream size.
+    """
+    buffer = b""
+    line_number = 0
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line, start = buffer[start:end], end + 1
+            line_number += 1
+            if skipping or len(line) > max_line_bytes:
+                skipping = False
+                yield line_number, None
+            else:
+                yield line_number, line
+        buffer = buffer[start:]
+        if len(buffer) > max_line_bytes:
+            buffer = b""
+            skipping = True
+    if skipping or buffer:
+        yield line_number + 1, None if skipping else buffer
+
+
+class ImportReport:
+    """Counts, throughput and the first errors of an import."""
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.lines = 0
+        self.imported: Dict[str, int] = {entity.value: 0 for entity, _ in EXPORT_ENTITIES}
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.started = time.monotonic()
+
+    def error(self, line_number: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line_number, "error": message})
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        imported = sum(self.imported.values())
+        return {
+            "lines": self.lines,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "documents_per_second": round(imported / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+def parse_import_line(line: bytes, household_id: str) -> Optional[Tuple[SyncEntity, Dict[str, Any]]]:
+    """Validate one import line and return the document to store in the household.
+
+    Returns None for the end line of an export. Raises ValueError (including
+    pydantic's ValidationError) for invalid lines.
+    """
+    record = orjson.loads(line)
+    if isinstance(record, dict) and record.get("type") == END_TYPE:
+        return None
+    if not isinstance(record, dict) or not isinstance(record.get("data"), dict):
+        raise ValueError('Expected an object with "type" and "data"')
+    model = DB_MODELS.get(record.get("type"))
+    if model is None:
+        raise ValueError(f"Unknown type {record.get('type')!r}")
+    document = model(**{**record["data"], "household_id": household_id}).to_db()
+    if model is MealDB:
+        for field in MEAL_AGGREGATE_FIELDS:
+            document[field] = None
+    return SyncEntity(record["type"]), document
+
+
+async def import_household(household_id: str, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """
+    Upsert the documents of an NDJSON stream into a household.
+
+    Documents keep their IDs and are moved into the household. Lines that do
+    not parse or validate, or fail to write, are reported by line number
+    without stopping the import. Rollups and the rating aggregates of the
+    affected meals are recomputed afterwards.
+    """
+    report = ImportReport(settings.IMPORT_MAX_REPORTED_ERRORS)
+    slots = asyncio.Semaphore(settings.IMPORT_CONCURRENCY)
+    writes: Set[asyncio.Task] = set()
+    imported_meals: Set[str] = set()
+    rated_meals: Set[str] = set()
+
+    async def write(line_number: int, entity: SyncEntity, repository: HouseholdRepository, document: Dict[str, Any]) -> None:
+        try:
+            await repository.upsert(document)
+            report.imported[entity.value] += 1
+            if entity == SyncEntity.MEAL:
+                imported_meals.add(document["id"])
+            elif entity == SyncEntity.MEAL_RATING:
+                rated_meals.add(document["meal_id"])
+        except Exception as e:
+            report.error(line_number, f"Failed to write: {e}")
+        finally:
+            slots.release()
+
+    async for line_number, line in iter_lines(chunks, settings.IMPORT_MAX_LINE_BYTES):
+        if line is None:
+            report.lines += 1
+            report.error(line_number, f"Line is longer than {settings.IMPORT_MAX_LINE_BYTES} bytes")
+            continue
+        if not line.strip():
+            continue
+        report.lines += 1
+        try:
+            parsed = parse_import_line(line, household_id)
+        except ValidationError as e:
+            report.error(line_number, f"Invalid document: {e.errors(include_url=False)}")
+            continue
+        except ValueError as e:
+            report.error(line_number, f"Invalid line: {e}")
+            continue
+        if parsed is None:
+            continue
+        entity, document = parsed
+        await slots.acquire()
+        task = asyncio.create_task(write(line_number, entity, SYNC_REPOSITORIES[entity], document))
+        writes.add(task)
+        task.add_done_callback(writes.discard)
+    if writes:
+        await asyncio.gather(*writes)
+
+    # Imported plan entries and ratings bypassed the rollups
+    if report.imported[SyncEntity.MEAL_PLAN.value] or report.imported[SyncEntity.MEAL_RATING.value]:
+        await meal_plan_rollups.invalidate(household_id)
+    # Imported meals were stored without aggregates; meals that only gained
+    # ratings have theirs dropped first
+    for meal_id in imported_meals:
+        schedule_rating_delta(meal_id, household_id, {}, None)
+    for meal_id in rated_meals - imported_meals:
+        await reset_rating_aggregates(meal_id, household_id)
+    # Too many changes to send one by one
+    if sum(report.imported.values()):
+        publish_resync(household_id)
+
+    result = report.as_dict()
+    logger.info(
+        f"Imported {sum(report.imported.values())} documents into household {household_id} "
+        f"({report.failed} failed) at {result['documents_per_second']} documents/s"
+    )
+    return result
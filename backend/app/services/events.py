@@ -0,0 +1,282 @@
+"""
+Push of a household's changes to connected clients as Server-Sent Events.
+
+Writes publish their change to the in-process EventBroker, which hands it
+to the subscriptions of the household. Publishing never waits for a
+client: every subscription has a bounded queue, and a client that falls
+that far behind has its queue dropped and gets a single resync event, after
+which it catches up with /sync. Households without subscribers cost a
+dictionary lookup, and connected clients cost no Cosmos calls at all.
+
+A worker only sees the writes it handles itself. With several workers, set
+EVENTS_CHANGE_FEED: every worker then runs change feed processors on the
+synced containers and publishes what they deliver, deletions included
+through their tombstones, and writes no longer publish locally.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Type, Union
+from uuid import UUID
+
+from app.core.config import settings
+from app.db.change_feed import ChangeFeedHost, change_feed_host
+from app.db.repository import tombstones_repository
+from app.models.meal import Meal
+from app.models.meal_plan import MealPlanEntry
+from app.models.meal_rating import MealRating
+from app.models.sync import ChangeEvent, ChangeEventType, SyncEntity
+from app.schemas import BaseSchema
+from app.services.sync import SYNC_REPOSITORIES
+
+logger = logging.getLogger(__name__)
+
+# Shapes the documents are sent in, the same as their endpoints return
+EVENT_MODELS: Dict[SyncEntity, Type[BaseSchema]] = {
+    SyncEntity.MEAL: Meal,
+    SyncEntity.MEAL_PLAN: MealPlanEntry,
+    SyncEntity.MEAL_RATING: MealRating,
+}
+
+# Sent first: how long the browser waits before reconnecting, in milliseconds
+RETRY_MESSAGE = b"retry: 5000\n\n"
+# A comment line, ignored by EventSource but keeping proxies from timing out
+HEARTBEAT_MESSAGE = b": heartbeat\n\n"
+# Queued to end a subscription's stream
+CLOSED = b""
+
+
+def event_message(event: ChangeEvent) -> bytes:
+    """Encode an event as one SSE message."""
+    return b"data: " + event.model_dump_json(by_alias=True, exclude_none=True).encode("utf-8") + b"\n\n"
+
+
+RESYNC_MESSAGE = event_message(ChangeEvent(type=ChangeEventType.RESYNC))
+
+
+class TooManySubscriptions(Exception):
+    """Raised when a household already has EVENTS_MAX_SUBSCRIPTIONS_PER_HOUSEHOLD streams open."""
+
+
+class Subscription:
+    """One client's stream of a household's events."""
+
+    def __init__(self, household_id: str, queue_size: int):
+        self.household_id = household_id
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.resyncs = 0
+
+    def offer(self, message: bytes) -> None:
+        """Queue a message without waiting; a full queue is replaced by a resync."""
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self._drain()
+            self.queue.put_nowait(RESYNC_MESSAGE)
+            self.resyncs += 1
+
+    def close(self) -> None:
+        """End the stream once the client has read what is queued up to now."""
+        try:
+            self.queue.put_nowait(CLOSED)
+        except asyncio.QueueFull:
+            self._drain()
+            self.queue.put_nowait(CLOSED)
+
+    def _drain(self) -> None:
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    async def next_message(self, timeout: float) -> Optional[bytes]:
+        """Return the next queued message, or None when none arrives within ``timeout`` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """In-process fan-out of change events to the subscriptions of each household."""
+
+    def __init__(self, queue_size: int = 256, max_subscriptions_per_household: int = 20):
+        self.queue_size = queue_size
+        self.max_subscriptions_per_household = max_subscriptions_per_household
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+
+    def check_capacity(self, household_id: Union[str, UUID]) -> None:
+        """Raise TooManySubscriptions if the household cannot open another stream."""
+        subscriptions = self._subscriptions.get(str(household_id), ())
+        if len(subscriptions) >= self.max_subscriptions_per_household:
+            raise TooManySubscriptions(
+                f"At most {self.max_subscriptions_per_household} event streams can be open per household"
+            )
+
+    def subscribe(self, household_id: Union[str, UUID]) -> Subscription:
+        household_id = str(household_id)
+        self.check_capacity(household_id)
+        subscription = Subscription(household_id, self.queue_size)
+        self._subscriptions.setdefault(household_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.household_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        self.resyncs += subscription.resyncs
+        if not subscriptions:
+            del self._subscriptions[subscription.household_id]
+
+    def has_subscribers(self, household_id: Union[str, UUID]) -> bool:
+        return str(household_id) in self._subscriptions
+
+    def publish(self, household_id: Union[str, UUID], event: ChangeEvent) -> None:
+        """Queue an event for every subscription of the household."""
+        subscriptions = self._subscriptions.get(str(household_id))
+        if not subscriptions:
+            return
+        message = event_message(event)
+        self.published += 1
+        for subscription in subscriptions:
+            subscription.offer(message)
+            self.delivered += 1
+
+    def close(self) -> None:
+        """End every open stream, e.g. on shutdown."""
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+    def stats(self) -> Dict[str, Any]:
+        subscriptions = [subscription for group in self._subscriptions.values() for subscription in group]
+        return {
+            "households": len(self._subscriptions),
+            "subscriptions": len(subscriptions),
+            "queued": sum(subscription.queue.qsize() for subscription in subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "resyncs": self.resyncs + sum(subscription.resyncs for subscription in subscriptions),
+        }
+
+
+event_broker = EventBroker(
+    queue_size=settings.EVENTS_QUEUE_SIZE,
+    max_subscriptions_per_household=settings.EVENTS_MAX_SUBSCRIPTIONS_PER_HOUSEHOLD,
+)
+
+
+def _publish_upsert(entity: SyncEntity, document: Dict[str, Any]) -> None:
+    household_id = document.get("household_id")
+    if household_id is None or not event_broker.has_subscribers(household_id):
+        return
+    item = EVENT_MODELS[entity](**document).model_dump(mode="json", by_alias=True)
+    event_broker.publish(household_id, ChangeEvent(type=ChangeEventType.UPSERT, entity=entity, id=document["id"], item=item))
+
+
+def _publish_delete(entity: SyncEntity, item_id: Union[str, UUID], household_id: Union[str, UUID]) -> None:
+    event_broker.publish(household_id, ChangeEvent(type=ChangeEventType.DELETE, entity=entity, id=item_id))
+
+
+def publish_upsert(entity: SyncEntity, document: Dict[str, Any]) -> None:
+    """Tell the document's household that it was created or changed.
+
+    ``document`` is the stored (snake_case) document. Does nothing when the
+    change feed is the source of events.
+    """
+    if settings.EVENTS_CHANGE_FEED:
+        return
+    try:
+        _publish_upsert(entity, document)
+    except Exception as e:
+        logger.error(f"Failed to publish change of {entity.value} {document.get('id')}: {e}")
+
+
+def publish_delete(entity: SyncEntity, item_id: Union[str, UUID], household_id: Union[str, UUID]) -> None:
+    """Tell a household that one of its documents was deleted.
+
+    Does nothing when the change feed is the source of events.
+    """
+    if settings.EVENTS_CHANGE_FEED:
+        return
+    _publish_delete(entity, item_id, household_id)
+
+
+def publish_resync(household_id: Union[str, UUID]) -> None:
+    """Tell a household's clients to sync, for changes too large to send one by one."""
+    event_broker.publish(household_id, ChangeEvent(type=ChangeEventType.RESYNC))
+
+
+async def stream_events(
+    household_id: Union[str, UUID],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    heartbeat_seconds: float,
+) -> AsyncIterator[bytes]:
+    """Subscribe to a household's events and yield them as SSE messages, with
+    a heartbeat whenever the stream is idle.
+
+    The subscription only exists while the stream is iterated, so a client
+    that goes away before the first message leaves nothing behind. Callers
+    check capacity beforehand to answer with an error; a household that
+    filled up in between gets an empty stream.
+    """
+    try:
+        subscription = event_broker.subscribe(household_id)
+    except TooManySubscriptions:
+        return
+    try:
+        yield RETRY_MESSAGE
+        while True:
+            message = await subscription.next_message(heartbeat_seconds)
+            if message is None:
+                if await is_disconnected():
+                    break
+                yield HEARTBEAT_MESSAGE
+            elif message == CLOSED:
+                break
+            else:
+                yield message
+    finally:
+        event_broker.unsubscribe(subscription)
+
+
+async def _relay_deletions(tombstones: List[Dict[str, Any]]) -> None:
+    for tombstone in tombstones:
+        _publish_delete(SyncEntity(tombstone["entity"]), tombstone["item_id"], tombstone["household_id"])
+
+
+def register_change_feed_events(host: ChangeFeedHost) -> None:
+    """Publish the changes of the synced containers, and their tombstones, from the change feed.
+
+    The processors are broadcast ones: any worker may hold a stream of any
+    household, and clients that were not connected catch up with /sync, so
+    nothing is checkpointed.
+    """
+    for entity, repository in SYNC_REPOSITORIES.items():
+        async def relay(changes: List[Dict[str, Any]], entity: SyncEntity = entity) -> None:
+            # A document that fails to render must not hold up the ones after it
+            for document in changes:
+                try:
+                    _publish_upsert(entity, document)
+                except Exception as e:
+                    logger.error(f"Failed to publish change of {entity.value} {document.get('id')}: {e}")
+
+        host.register(
+            f"events-{entity.value}",
+            repository.container_id,
+            relay,
+            broadcast=True,
+            poll_interval=settings.EVENTS_CHANGE_FEED_POLL_SECONDS
+        )
+    host.register(
+        "events-tombstones",
+        tombstones_repository.container_id,
+        _relay_deletions,
+        broadcast=True,
+        poll_interval=settings.EVENTS_CHANGE_FEED_POLL_SECONDS
+    )
+
+
+if settings.EVENTS_CHANGE_FEED:
+    register_change_feed_events(change_feed_host)
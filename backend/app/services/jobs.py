@@ -0,0 +1,167 @@
+"""
+In-process queue for side effects that do not need to finish before the
+response is sent.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Any], Awaitable[None]]
+
+
+class Job:
+    """A pending call of ``handler(payload)``."""
+
+    def __init__(self, key: Hashable, handler: JobHandler, payload: Any, merge: Optional[Callable[[Any, Any], Any]]):
+        self.key = key
+        self.handler = handler
+        self.payload = payload
+        self.merge = merge
+        self.enqueued_at = time.monotonic()
+        self.coalesced = 0
+
+
+class JobQueue:
+    """Keyed async job queue with coalescing, bounded concurrency and retries.
+
+    At most one job per key is pending. Enqueuing a key that is already
+    pending merges the payloads with the job's ``merge`` function (or keeps
+    the pending one) instead of adding another job. Jobs for the same key
+    never run concurrently: a job enqueued while its key is running starts
+    once the running one is done. Failed jobs are retried with exponential
+    backoff and logged once they run out of attempts.
+    """
+
+    def __init__(self, concurrency: int = 4, max_attempts: int = 3, retry_delay: float = 0.5):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._pending: Dict[Hashable, Job] = {}
+        self._running: Set[Hashable] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.enqueued = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_run_ms = 0.0
+        self.max_run_ms = 0.0
+
+    def start(self) -> None:
+        """Start the worker tasks on the running event loop."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        for key in self._pending:
+            if key not in self._running:
+                self._queue.put_nowait(key)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"Started job queue with {self.concurrency} workers")
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Wait up to ``timeout`` seconds for queued jobs, then cancel the workers."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping job queue with {len(self._pending)} pending jobs")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def enqueue(
+        self,
+        key: Hashable,
+        handler: JobHandler,
+        payload: Any = None,
+        merge: Optional[Callable[[Any, Any], Any]] = None,
+    ) -> bool:
+        """Queue ``handler(payload)`` under ``key``.
+
+        Returns False if the job was coalesced into a pending job for the same key.
+        """
+        self.enqueued += 1
+        pending = self._pending.get(key)
+        if pending is not None:
+            if pending.merge is not None:
+                pending.payload = pending.merge(pending.payload, payload)
+            pending.coalesced += 1
+            self.coalesced += 1
+            return False
+        self._pending[key] = Job(key, handler, payload, merge)
+        if self._queue is not None and key not in self._running:
+            self._queue.put_nowait(key)
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            key = await self._queue.get()
+            job = self._pending.pop(key)
+            self._running.add(key)
+            try:
+                await self._run(job)
+            finally:
+                self._running.discard(key)
+                if key in self._pending:
+                    self._queue.put_nowait(key)
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        started = time.monotonic()
+        wait_ms = (started - job.enqueued_at) * 1000
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await job.handler(job.payload)
+                self.completed += 1
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self.failed += 1
+                    logger.error(f"Job {job.key!r} failed after {attempt} attempts: {e}")
+                    break
+                self.retried += 1
+                logger.warning(f"Job {job.key!r} failed on attempt {attempt}, retrying: {e}")
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+        run_ms = (time.monotonic() - started) * 1000
+        self.total_run_ms += run_ms
+        self.max_run_ms = max(self.max_run_ms, run_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, outcome counters and latencies."""
+        finished = self.completed + self.failed
+        return {
+            "workers": len(self._workers),
+            "pending": len(self._pending),
+            "running": len(self._running),
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "avg_wait_ms": self.total_wait_ms / finished if finished else 0.0,
+            "max_wait_ms": self.max_wait_ms,
+            "avg_run_ms": self.total_run_ms / finished if finished else 0.0,
+            "max_run_ms": self.max_run_ms,
+        }
+
+
+job_queue = JobQueue(
+    concurrency=settings.JOB_QUEUE_CONCURRENCY,
+    max_attempts=settings.JOB_QUEUE_MAX_ATTEMPTS,
+    retry_delay=settings.JOB_QUEUE_RETRY_DELAY_SECONDS,
+)
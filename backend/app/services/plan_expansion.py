@@ -0,0 +1,188 @@
+"""
+Server-side creation of many meal plan entries at once: applying a plan
+template to a date range and copying one date range onto another.
+
+The new entries are written as transactional batches in the household
+partition, so filling a month costs a handful of Cosmos calls instead of one
+request per entry. Each batch is handed to the rollups with one
+``record_plan_changes`` call, which queues counting its entries in the
+background.
+"""
+import logging
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Set, Tuple
+
+from app.core.config import settings
+from app.db.repository import MAX_BATCH_OPERATIONS, meal_plans_repository
+from app.models.meal_plan import MealPlanEntryDB, MealPlanStatus
+from app.models.meal_plan_template import MealPlanTemplateBase, MealPlanTemplateSlot
+from app.models.sync import SyncEntity
+from app.services.events import publish_upsert
+from app.services.rollups import meal_plan_rollups
+
+logger = logging.getLogger(__name__)
+
+Slot = Tuple[date, str]  # (planned date, meal type)
+
+
+class InvalidExpansion(ValueError):
+    """Raised for a template or date range that cannot be expanded."""
+
+
+def check_date_range(start_date: date, end_date: date) -> None:
+    """Reject ranges that are reversed or longer than PLAN_EXPANSION_MAX_DAYS."""
+    if end_date < start_date:
+        raise InvalidExpansion("The end date must not be before the start date")
+    if (end_date - start_date).days + 1 > settings.PLAN_EXPANSION_MAX_DAYS:
+        raise InvalidExpansion(f"Date ranges are limited to {settings.PLAN_EXPANSION_MAX_DAYS} days")
+
+
+def check_template(template: MealPlanTemplateBase) -> None:
+    """Reject templates whose slots fall outside the rotation or whose end precedes their start."""
+    for slot in template.slots:
+        if slot.week >= template.rotation_weeks:
+            raise InvalidExpansion(f"Slot week {slot.week} is outside the {template.rotation_weeks}-week rotation")
+    if template.ends_on is not None and template.ends_on < template.starts_on:
+        raise InvalidExpansion("The template must not end before it starts")
+
+
+def _days(start_date: date, end_date: date) -> Iterator[date]:
+    for offset in range((end_date - start_date).days + 1):
+        yield start_date + timedelta(days=offset)
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def expand_template(
+    template: MealPlanTemplateBase,
+    start_date: date,
+    end_date: date,
+) -> List[Tuple[date, MealPlanTemplateSlot]]:
+    """Return the (day, slot) pairs a template produces between two dates, inclusive."""
+    first = max(start_date, template.starts_on)
+    last = min(end_date, template.ends_on) if template.ends_on is not None else end_date
+    slots: Dict[Tuple[int, int], List[MealPlanTemplateSlot]] = {}
+    for slot in template.slots:
+        slots.setdefault((slot.week, slot.weekday), []).append(slot)
+
+    rotation_start = _week_start(template.starts_on)
+    expanded = []
+    for day in _days(first, last):
+        week = ((_week_start(day) - rotation_start).days // 7) % template.rotation_weeks
+        for slot in slots.get((week, day.weekday()), []):
+            expanded.append((day, slot))
+    return expanded
+
+
+async def planned_slots(household_id: str, start_date: date, end_date: date) -> Set[Slot]:
+    """Return the (day, meal type) pairs that already have an entry between two dates."""
+    query = """
+    SELECT c.planned_date, c.meal_type
+    FROM c
+    WHERE c.household_id = @household_id AND c.planned_date >= @start_date AND c.planned_date <= @end_date
+    """
+    params = [
+        {"name": "@household_id", "value": household_id},
+        {"name": "@start_date", "value": start_date.isoformat()},
+        {"name": "@end_date", "value": end_date.isoformat()}
+    ]
+    return {
+        (date.fromisoformat(row["planned_date"]), row["meal_type"])
+        async for row in meal_plans_repository.query(query, params, household_id)
+    }
+
+
+async def template_entries(
+    template: MealPlanTemplateBase,
+    household_id: str,
+    user_id: str,
+    start_date: date,
+    end_date: date,
+    skip_existing: bool = True,
+) -> List[MealPlanEntryDB]:
+    """Build the meal plan entries of applying a template to a date range."""
+    occupied = await planned_slots(household_id, start_date, end_date) if skip_existing else set()
+    return [
+        MealPlanEntryDB(
+            meal_id=slot.meal_id,
+            planned_date=day,
+            meal_type=slot.meal_type,
+            notes=slot.notes,
+            status=MealPlanStatus.PLANNED,
+            serving_count=slot.serving_count,
+            created_by=user_id,
+            household_id=household_id
+        )
+        for day, slot in expand_template(template, start_date, end_date)
+        if (day, slot.meal_type) not in occupied
+    ]
+
+
+async def copied_entries(
+    household_id: str,
+    user_id: str,
+    source_start_date: date,
+    source_end_date: date,
+    target_start_date: date,
+    target_end_date: date,
+    skip_existing: bool = True,
+) -> List[MealPlanEntryDB]:
+    """
+    Build the meal plan entries of copying one date range onto another.
+
+    Day N of the target range gets the entries of day N of the source range,
+    repeating the source range when the target range is longer. Copies are
+    planned again whatever the status of the original.
+    """
+    query = """
+    SELECT * FROM c
+    WHERE c.household_id = @household_id AND c.planned_date >= @start_date AND c.planned_date <= @end_date
+    """
+    params = [
+        {"name": "@household_id", "value": household_id},
+        {"name": "@start_date", "value": source_start_date.isoformat()},
+        {"name": "@end_date", "value": source_end_date.isoformat()}
+    ]
+    by_day: Dict[date, List[MealPlanEntryDB]] = {}
+    async for plan in meal_plans_repository.query(query, params, household_id):
+        entry = MealPlanEntryDB(**plan)
+        by_day.setdefault(entry.planned_date, []).append(entry)
+
+    occupied = await planned_slots(household_id, target_start_date, target_end_date) if skip_existing else set()
+    span = (source_end_date - source_start_date).days + 1
+    entries = []
+    for day in _days(target_start_date, target_end_date):
+        source_day = source_start_date + timedelta(days=(day - target_start_date).days % span)
+        for original in by_day.get(source_day, []):
+            if (day, original.meal_type) in occupied:
+                continue
+            entries.append(MealPlanEntryDB(
+                meal_id=original.meal_id,
+                planned_date=day,
+                meal_type=original.meal_type,
+                notes=original.notes,
+                status=MealPlanStatus.PLANNED,
+                serving_count=original.serving_count,
+                created_by=user_id,
+                household_id=household_id
+            ))
+    return entries
+
+
+async def write_entries(household_id: str, entries: List[MealPlanEntryDB]) -> List[MealPlanEntryDB]:
+    """
+    Create meal plan entries with transactional batches of MAX_BATCH_OPERATIONS.
+
+    Each batch is all-or-nothing; a failing batch raises after the batches
+    before it were written and counted in the rollups.
+    """
+    for start in range(0, len(entries), MAX_BATCH_OPERATIONS):
+        chunk = entries[start:start + MAX_BATCH_OPERATIONS]
+        responses = await meal_plans_repository.execute_batch(household_id, [("create", (entry.to_db(),)) for entry in chunk])
+        await meal_plan_rollups.record_plan_changes(household_id, [(None, entry) for entry in chunk])
+        for response in responses:
+            publish_upsert(SyncEntity.MEAL_PLAN, response["resourceBody"])
+    logger.info(f"Created {len(entries)} meal plan entries for household {household_id}")
+    return entries
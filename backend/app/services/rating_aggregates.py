@@ -0,0 +1,196 @@
+"""
+Running rating aggregates stored on meal documents.
+
+A meal carries ``rating_sum``, ``rating_count`` and ``rating_distribution``
+(rating value -> count) next to its rounded average ``rating``. Rating writes
+adjust them with a single conditional patch instead of rescanning the meal's
+ratings, so their cost does not grow with the rating history.
+
+Meals without aggregates are seeded by counting their ratings, and every
+seed gets a new id (``rating_seed``). Rating writes read the meal's seed
+before they commit, so a write made under the seed the meal still has was
+made after that seed counted and is added to the aggregates. A write made
+under an older seed may or may not have been counted by the current one;
+the meal is seeded again instead, which counts it exactly once.
+"""
+import logging
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+from uuid import UUID, uuid4
+
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError, CosmosResourceNotFoundError
+
+from app.db.repository import meal_ratings_repository, meals_repository
+from app.models.meal import MealRating
+from app.models.sync import SyncEntity
+from app.services.events import publish_upsert
+from app.services.jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+MAX_PATCH_ATTEMPTS = 5
+
+RATING_VALUES = [rating.value for rating in MealRating]
+
+
+class RatingDelta:
+    """A change of a meal's rating counts (rating value -> count change) and
+    the seeds of the meal that the writes behind it were made under."""
+
+    def __init__(self, counts: Dict[int, int], seeds: Set[Optional[str]]):
+        self.counts = counts
+        self.seeds = seeds
+
+
+def average_rating(rating_sum: int, rating_count: int) -> Optional[int]:
+    """Round an average to the nearest rating value, or None without ratings."""
+    return round(rating_sum / rating_count) if rating_count else None
+
+
+async def count_meal_ratings(meal_id: Union[str, UUID], household_id: str) -> Dict[int, int]:
+    """Count a meal's ratings per value by scanning them."""
+    query = """
+    SELECT c.rating, COUNT(1) AS count
+    FROM c
+    WHERE c.household_id = @household_id AND c.meal_id = @meal_id
+    GROUP BY c.rating
+    """
+    params = [
+        {"name": "@household_id", "value": household_id},
+        {"name": "@meal_id", "value": str(meal_id)}
+    ]
+    return {row["rating"]: row["count"] async for row in meal_ratings_repository.query(query, params, household_id)}
+
+
+async def read_rating_seed(meal_id: Union[str, UUID], household_id: str) -> Optional[str]:
+    """The seed of a meal's aggregates, to read before writing one of its ratings."""
+    meal = await meals_repository.get(meal_id, household_id, cached=False)
+    return meal.get("rating_seed") if meal is not None else None
+
+
+async def read_rating_seeds(meal_ids: Iterable[Union[str, UUID]], household_id: str) -> Dict[str, Optional[str]]:
+    """The seeds of several meals' aggregates with one query, by meal id."""
+    meals = await meals_repository.get_many(meal_ids, household_id, cached=False)
+    return {meal_id: meal.get("rating_seed") for meal_id, meal in meals.items()}
+
+
+def seed_operations(counts: Dict[int, int], seed: str) -> List[Dict[str, Any]]:
+    """Patch operations that set all aggregates from absolute rating counts, counted by ``seed``."""
+    rating_sum = sum(value * count for value, count in counts.items())
+    rating_count = sum(counts.values())
+    return [
+        {"op": "set", "path": "/rating_seed", "value": seed},
+        {"op": "set", "path": "/rating_sum", "value": rating_sum},
+        {"op": "set", "path": "/rating_count", "value": rating_count},
+        {"op": "set", "path": "/rating_distribution", "value": {str(value): counts.get(value, 0) for value in RATING_VALUES}},
+        {"op": "set", "path": "/rating", "value": average_rating(rating_sum, rating_count)},
+    ]
+
+
+def increment_operations(meal: Dict[str, Any], delta: Dict[int, int]) -> List[Dict[str, Any]]:
+    """Patch operations that add ``delta`` (rating value -> count change) to the aggregates."""
+    sum_delta = sum(value * count for value, count in delta.items())
+    count_delta = sum(delta.values())
+    operations = [
+        {"op": "incr", "path": "/rating_sum", "value": sum_delta},
+        {"op": "incr", "path": "/rating_count", "value": count_delta},
+    ]
+    for value, count in delta.items():
+        if count:
+            operations.append({"op": "incr", "path": f"/rating_distribution/{value}", "value": count})
+    operations.append({
+        "op": "set",
+        "path": "/rating",
+        "value": average_rating(meal["rating_sum"] + sum_delta, meal["rating_count"] + count_delta)
+    })
+    return operations
+
+
+def needs_seed(meal: Dict[str, Any], delta: RatingDelta) -> bool:
+    """Whether the meal's aggregates must be counted instead of adjusted by ``delta``.
+
+    That is the case without aggregates, and when some of the writes behind
+    the delta were made under another seed, which the current seed may
+    already have counted.
+    """
+    if meal.get("rating_count") is None or meal.get("rating_seed") is None:
+        return True
+    return delta.seeds != {meal["rating_seed"]}
+
+
+async def apply_rating_delta(meal_id: Union[str, UUID], household_id: str, delta: RatingDelta) -> None:
+    """
+    Adjust a meal's rating aggregates by ``delta``.
+
+    The patch is conditional on the ETag of the meal that the new average was
+    computed from and is retried on conflict, so concurrent ratings are not
+    lost. Meals without aggregates, or seeded since the change was made, are
+    seeded from their ratings, which already include the change being
+    applied.
+    """
+    for _ in range(MAX_PATCH_ATTEMPTS):
+        meal = await meals_repository.get(meal_id, household_id, cached=False)
+        if meal is None:
+            return
+        if needs_seed(meal, delta):
+            counts = await count_meal_ratings(meal_id, household_id)
+            operations = seed_operations(counts, str(uuid4()))
+        else:
+            operations = increment_operations(meal, delta.counts)
+        try:
+            patched = await meals_repository.patch(meal_id, household_id, operations, etag=meal.get("_etag"))
+            # Clients showing the meal get its new average
+            publish_upsert(SyncEntity.MEAL, patched)
+            return
+        except CosmosAccessConditionFailedError:
+            logger.info(f"Meal {meal_id} changed while updating its rating aggregates, retrying")
+    raise RuntimeError(f"Meal {meal_id} kept changing after {MAX_PATCH_ATTEMPTS} attempts")
+
+
+def merge_rating_deltas(pending: RatingDelta, new: RatingDelta) -> RatingDelta:
+    """Combine two rating deltas into one."""
+    merged = dict(pending.counts)
+    for value, count in new.counts.items():
+        merged[value] = merged.get(value, 0) + count
+    return RatingDelta(merged, pending.seeds | new.seeds)
+
+
+def schedule_rating_delta(
+    meal_id: Union[str, UUID],
+    household_id: str,
+    delta: Dict[int, int],
+    seed: Optional[str],
+) -> None:
+    """
+    Queue a rating aggregate update for a meal.
+
+    ``seed`` is the meal's ``rating_seed`` as read before the rating write.
+    Updates for the same meal that are still waiting are merged, so a burst
+    of ratings for one meal costs a single patch. Call it once the rating
+    write has committed.
+    """
+    job_queue.enqueue(
+        ("meal_rating", household_id, str(meal_id)),
+        partial(apply_rating_delta, meal_id, household_id),
+        RatingDelta(delta, {seed}),
+        merge=merge_rating_deltas,
+    )
+
+
+async def reset_rating_aggregates(meal_id: Union[str, UUID], household_id: str) -> None:
+    """
+    Drop a meal's rating aggregates and queue seeding them again from its ratings.
+
+    For writes that add ratings without going through the rating endpoints,
+    such as imports. A rating delta for the meal that is still pending is
+    merged into the seeding job, whose count already includes it.
+    """
+    operations = [
+        {"op": "set", "path": f"/{field}", "value": None}
+        for field in ("rating_sum", "rating_count", "rating_distribution", "rating_seed")
+    ]
+    try:
+        await meals_repository.patch(meal_id, household_id, operations)
+    except CosmosResourceNotFoundError:
+        return
+    schedule_rating_delta(meal_id, household_id, {}, None)
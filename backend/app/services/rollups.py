@@ -0,0 +1,519 @@
+"""
+Per-day rollups of meal plan and rating activity.
+
+The counters of each household are kept per day in a Fenwick tree over
+date ordinals: node ``i`` sums the days ``(i - lowbit(i), i]``, where
+``lowbit(i)`` is the lowest set bit of ``i``. A change to one day updates
+the at most TREE_DEPTH + 1 nodes covering it, and the total up to any day
+is the sum of as many nodes, so the totals for a date range are the
+difference of two prefix sums, read in one query, whatever the length of
+the history. Only nodes with counters are stored.
+
+Every meal plan entry and rating counted in the rollups also has a
+contribution document with the day and the counters it added. Changes are
+applied by recounting the changed entries and adding the difference to
+their contributions, so an edit or deletion takes back exactly what was
+counted, even after the entry's meal was edited or deleted.
+
+Counters are flat ``{name: number}`` maps:
+
+- ``total`` and ``status:<status>``: meal plan entries by status
+- ``meal:<meal_id>`` and ``category:<category>``: prepared entries
+- ``calories``: servings times calories per serving of prepared entries
+- ``rating_count`` and ``rating_sum``: ratings by the day they were consumed
+"""
+import asyncio
+import logging
+import operator
+import time
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from uuid import UUID
+
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+from pydantic import TypeAdapter
+
+from app.db.change_feed import INSTANCE_ID
+from app.db.repository import (
+    MAX_BATCH_OPERATIONS,
+    HouseholdRepository,
+    meal_plan_rollups_repository,
+    meal_plans_repository,
+    meal_ratings_repository,
+    meals_repository,
+)
+from app.models.meal import MealDB
+from app.models.meal_plan import MealPlanEntryDB, MealPlanStatus
+from app.models.meal_rating import MealRatingDB
+from app.services.jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+Counters = Dict[str, int]
+
+META_ID = "meta"
+
+# Fenwick tree over date.toordinal(), which is at most 3,652,059
+TREE_DEPTH = 22
+TREE_SIZE = 1 << TREE_DEPTH
+
+# Kinds of contribution documents, whose IDs are "<kind>:<item id>"
+PLAN_CONTRIBUTION = "plan"
+RATING_CONTRIBUTION = "rating"
+
+# How long a worker holds a household's rollup lock before others may take
+# it over, and how often a waiting worker checks whether it is free
+LOCK_SECONDS = 60
+LOCK_POLL_SECONDS = 0.1
+
+_date_adapter = TypeAdapter(date)
+_datetime_adapter = TypeAdapter(datetime)
+
+
+def plan_counters(
+    status: str,
+    meal_id: Union[str, UUID],
+    meal: Optional[MealDB],
+    count: int = 1,
+    servings: int = 1,
+) -> Counters:
+    """Counters contributed by ``count`` meal plan entries with the same status and meal."""
+    counters = {"total": count, f"status:{status}": count}
+    if status == MealPlanStatus.PREPARED.value:
+        counters[f"meal:{meal_id}"] = count
+        if meal is not None:
+            for category in meal.categories:
+                counters[f"category:{category}"] = count
+            if meal.calories_per_serving:
+                counters["calories"] = meal.calories_per_serving * servings
+    return counters
+
+
+def rating_counters(rating: int, count: int = 1) -> Counters:
+    """Counters contributed by ``count`` ratings with the same value."""
+    return {"rating_count": count, "rating_sum": rating * count}
+
+
+def add_counters(target: Counters, delta: Counters, sign: int = 1) -> Counters:
+    """Add ``sign * delta`` to ``target`` in place, dropping counters that reach zero."""
+    for key, value in delta.items():
+        total = target.get(key, 0) + sign * value
+        if total:
+            target[key] = total
+        else:
+            target.pop(key, None)
+    return target
+
+
+def contribution_id(kind: str, item_id: Union[str, UUID]) -> str:
+    return f"{kind}:{item_id}"
+
+
+def plan_contribution(entry: Dict[str, Any], meal: Optional[MealDB]) -> Tuple[date, Counters]:
+    """The day and counters a stored meal plan entry contributes, given its meal."""
+    day = _date_adapter.validate_python(entry["planned_date"])
+    return day, plan_counters(entry.get("status"), entry.get("meal_id"), meal, servings=entry.get("serving_count") or 0)
+
+
+def rating_contribution(rating: Dict[str, Any]) -> Tuple[date, Counters]:
+    """The day and counters a stored meal rating contributes."""
+    return _datetime_adapter.validate_python(rating["date_consumed"]).date(), rating_counters(rating["rating"])
+
+
+def update_indexes(ordinal: int) -> Iterator[int]:
+    """Indexes of the tree nodes whose range includes the day ``ordinal``."""
+    while ordinal <= TREE_SIZE:
+        yield ordinal
+        ordinal += ordinal & -ordinal
+
+
+def prefix_indexes(ordinal: int) -> Iterator[int]:
+    """Indexes of the tree nodes that sum the days up to and including ``ordinal``."""
+    while ordinal > 0:
+        yield ordinal
+        ordinal -= ordinal & -ordinal
+
+
+def node_id(index: int) -> str:
+    return f"node:{index}"
+
+
+def counters_with_prefix(counters: Counters, prefix: str) -> Counters:
+    """Return the counters under ``prefix`` (e.g. ``"meal:"``) keyed without it."""
+    return {key[len(prefix):]: value for key, value in counters.items() if key.startswith(prefix)}
+
+
+class RollupService:
+    """Maintains the per-day rollup documents of each household.
+
+    Rollups are built from the raw entries by a background job queued on
+    the first statistics read of a household; until it is done, reads count
+    the requested range from the entries directly. The ``meta`` document
+    marks the rollups as built and is the household's lock: builds and
+    updates take it with an ETag-conditioned write, so one worker at a time
+    changes a household's rollups. Reads never take it, and request
+    handlers never wait for it: writes only queue their entries for a
+    background job that recounts them, so the statistics can trail the
+    latest writes briefly. Until the rollups are built changes are not
+    tracked, as the build counts them anyway. If an update fails the
+    rollups are marked unbuilt and rebuilt in the background rather than
+    left inconsistent.
+    """
+
+    def __init__(self, repository: HouseholdRepository, owner: str = INSTANCE_ID):
+        self.repository = repository
+        self.owner = owner
+
+    async def is_built(self, household_id: str) -> bool:
+        """Return whether the household's rollups have been built."""
+        meta = await self.repository.get(META_ID, household_id)
+        return meta is not None and meta.get("built_at") is not None
+
+    async def ensure_built(self, household_id: str) -> None:
+        """Build the household's rollups if they do not exist yet.
+
+        Waits for the household's lock, so it is for jobs and scripts, not
+        request handlers.
+        """
+        if not await self.is_built(household_id):
+            await self._build(household_id, force=False)
+
+    async def rebuild(self, household_id: str) -> None:
+        """Recompute all rollups of a household from its meal plans and ratings, waiting for the lock."""
+        await self._build(household_id, force=True)
+
+    async def invalidate(self, household_id: str) -> None:
+        """Queue a rebuild of the household's rollups, e.g. after writes that bypassed them."""
+        self._schedule_build(household_id, force=True)
+
+    async def get_range_totals(self, household_id: str, start_date: date, end_date: date) -> Counters:
+        """Return the counters summed over ``start_date`` to ``end_date`` inclusive.
+
+        Served from the rollups as last written, whether or not a worker
+        holds the lock. A household without rollups gets them built in the
+        background and is answered by counting the range directly.
+        """
+        if not await self.is_built(household_id):
+            self._schedule_build(household_id, force=False)
+            return await self._count_range(household_id, start_date, end_date)
+        # Nodes in both prefix sums cancel out
+        through_end = set(prefix_indexes(end_date.toordinal()))
+        before_start = set(prefix_indexes(start_date.toordinal() - 1))
+        added, subtracted = through_end - before_start, before_start - through_end
+        nodes = await self.repository.get_many((node_id(index) for index in added | subtracted), household_id)
+        totals: Counters = {}
+        for index in added:
+            add_counters(totals, nodes.get(node_id(index), {}).get("counters", {}))
+        for index in subtracted:
+            add_counters(totals, nodes.get(node_id(index), {}).get("counters", {}), -1)
+        return totals
+
+    async def record_plan_change(
+        self,
+        household_id: str,
+        old: Optional[MealPlanEntryDB],
+        new: Optional[MealPlanEntryDB],
+    ) -> None:
+        """Queue counting a created (``old`` is None), updated or deleted (``new`` is None) meal plan entry."""
+        await self.record_plan_changes(household_id, [(old, new)])
+
+    async def record_plan_changes(
+        self,
+        household_id: str,
+        changes: Iterable[Tuple[Optional[MealPlanEntryDB], Optional[MealPlanEntryDB]]],
+    ) -> None:
+        """Queue counting several ``(old, new)`` meal plan entry changes, once they are stored."""
+        self._schedule(household_id, {
+            contribution_id(PLAN_CONTRIBUTION, (new or old).id) for old, new in changes if new or old
+        })
+
+    async def record_rating_change(
+        self,
+        household_id: str,
+        old: Optional[MealRatingDB],
+        new: Optional[MealRatingDB],
+    ) -> None:
+        """Queue counting a created (``old`` is None) or deleted (``new`` is None) meal rating."""
+        rating = new or old
+        if rating is not None:
+            self._schedule(household_id, {contribution_id(RATING_CONTRIBUTION, rating.id)})
+
+    def _schedule(self, household_id: str, contribution_ids: Set[str]) -> None:
+        """Queue a recount of entries, merged with the ones of the household still waiting."""
+        if not contribution_ids:
+            return
+        job_queue.enqueue(
+            ("rollups", household_id),
+            partial(self._recount, household_id),
+            contribution_ids,
+            merge=set.union,
+        )
+
+    def _schedule_build(self, household_id: str, force: bool) -> None:
+        """Queue a build of the household's rollups; ``force`` rebuilds them even if built."""
+        job_queue.enqueue(
+            ("rollups-build", household_id),
+            partial(self._build, household_id),
+            force,
+            merge=operator.or_,
+        )
+
+    async def _lock(self, household_id: str, create: bool = False) -> Optional[Dict[str, Any]]:
+        """Take the household's rollup lock, waiting while another holder's is unexpired.
+
+        Returns the meta document holding the lock, or None if there is no
+        meta document and ``create`` is not set.
+        """
+        while True:
+            meta = await self.repository.get(META_ID, household_id)
+            now = time.time()
+            if meta is None:
+                if not create:
+                    return None
+                try:
+                    return await self.repository.create({
+                        "id": META_ID,
+                        "pk": household_id,
+                        "household_id": household_id,
+                        "type": "meta",
+                        "built_at": None,
+                        "locked_by": self.owner,
+                        "locked_until": now + LOCK_SECONDS,
+                    })
+                except CosmosResourceExistsError:
+                    continue
+            if meta.get("locked_by") is not None and meta.get("locked_until", 0) > now:
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+                continue
+            meta["locked_by"] = self.owner
+            meta["locked_until"] = now + LOCK_SECONDS
+            try:
+                return await self.repository.replace(meta, etag=meta["_etag"])
+            except (CosmosAccessConditionFailedError, CosmosResourceNotFoundError):
+                continue
+
+    async def _unlock(self, meta: Dict[str, Any], **fields: Any) -> None:
+        """Release the lock, storing ``fields`` in the meta document with it."""
+        meta.update(fields, locked_by=None, locked_until=None)
+        try:
+            await self.repository.replace(meta, etag=meta["_etag"])
+        except (CosmosAccessConditionFailedError, CosmosResourceNotFoundError):
+            logger.warning(f"Rollup lock of household {meta['household_id']} expired and was taken over")
+
+    async def _build(self, household_id: str, force: bool) -> None:
+        meta = await self._lock(household_id, create=True)
+        # Another worker may have built the rollups while this one waited
+        built_at = None if force else meta.get("built_at")
+        try:
+            if built_at is None:
+                meta["days"] = await self._rebuild(household_id)
+                built_at = datetime.utcnow().isoformat()
+        finally:
+            await self._unlock(meta, built_at=built_at)
+
+    async def _recount(self, household_id: str, contribution_ids: Set[str]) -> None:
+        """Count changed entries and ratings again and apply what changed in their contributions."""
+        meta = await self._lock(household_id)
+        if meta is None:
+            return
+        built_at = meta.get("built_at")
+        try:
+            if built_at is not None:
+                await self._apply_contributions(household_id, contribution_ids)
+        except Exception as e:
+            logger.error(f"Failed to update rollups of household {household_id}, scheduling a rebuild: {e}")
+            built_at = None
+        finally:
+            await self._unlock(meta, built_at=built_at)
+
+    async def _apply_contributions(self, household_id: str, contribution_ids: Set[str]) -> None:
+        counted = await self.repository.get_many(contribution_ids, household_id)
+        current = await self._contributions(household_id, contribution_ids)
+        deltas: Dict[date, Counters] = {}
+        writes: List[Tuple[Any, ...]] = []
+        for item_id in contribution_ids:
+            old, new = counted.get(item_id), current.get(item_id)
+            if old is not None and new is not None and (old["day"], old["counters"]) == (new["day"], new["counters"]):
+                continue
+            if old is not None:
+                add_counters(deltas.setdefault(_date_adapter.validate_python(old["day"]), {}), old["counters"], -1)
+            if new is not None:
+                add_counters(deltas.setdefault(_date_adapter.validate_python(new["day"]), {}), new["counters"])
+                writes.append(("upsert", (new,)))
+            else:
+                writes.append(("delete", (item_id,)))
+        # Node and contribution writes share batches, so small changes apply atomically
+        writes = await self._node_writes(household_id, deltas) + writes
+        await self._write(household_id, writes)
+
+    async def _contributions(self, household_id: str, contribution_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the contribution documents of the given entries and ratings as they are stored now."""
+        item_ids: Dict[str, List[str]] = {PLAN_CONTRIBUTION: [], RATING_CONTRIBUTION: []}
+        for contribution in contribution_ids:
+            kind, item_id = contribution.split(":", 1)
+            item_ids[kind].append(item_id)
+        plans, ratings = await asyncio.gather(
+            meal_plans_repository.get_many(item_ids[PLAN_CONTRIBUTION], household_id),
+            meal_ratings_repository.get_many(item_ids[RATING_CONTRIBUTION], household_id),
+        )
+        meals = await self._prepared_meals(household_id, plans.values())
+        documents = {}
+        for entry in plans.values():
+            day, counters = plan_contribution(entry, meals.get(entry.get("meal_id")))
+            document = self._contribution_document(household_id, contribution_id(PLAN_CONTRIBUTION, entry["id"]), day, counters)
+            documents[document["id"]] = document
+        for rating in ratings.values():
+            day, counters = rating_contribution(rating)
+            document = self._contribution_document(household_id, contribution_id(RATING_CONTRIBUTION, rating["id"]), day, counters)
+            documents[document["id"]] = document
+        return documents
+
+    @staticmethod
+    async def _prepared_meals(household_id: str, entries: Iterable[Dict[str, Any]]) -> Dict[str, MealDB]:
+        """The meals of the prepared entries, which their counters depend on."""
+        meal_ids = {entry.get("meal_id") for entry in entries if entry.get("status") == MealPlanStatus.PREPARED.value}
+        meal_docs = await meals_repository.get_many(meal_ids, household_id)
+        return {meal_id: MealDB(**meal) for meal_id, meal in meal_docs.items()}
+
+    async def _write(self, household_id: str, writes: List[Tuple[Any, ...]]) -> None:
+        for start in range(0, len(writes), MAX_BATCH_OPERATIONS):
+            await self.repository.execute_batch(household_id, writes[start:start + MAX_BATCH_OPERATIONS])
+
+    async def _node_writes(self, household_id: str, deltas: Dict[date, Counters]) -> List[Tuple[Any, ...]]:
+        """Batch operations adding per-day deltas to the tree nodes covering each day.
+
+        Existing nodes are replaced on their ETag, so a worker whose lock was
+        taken over fails instead of overwriting the new holder's counts.
+        """
+        node_deltas: Dict[int, Counters] = {}
+        for day, delta in deltas.items():
+            for index in update_indexes(day.toordinal()):
+                add_counters(node_deltas.setdefault(index, {}), delta)
+        node_deltas = {index: delta for index, delta in node_deltas.items() if delta}
+        existing = await self.repository.get_many((node_id(index) for index in node_deltas), household_id)
+        writes: List[Tuple[Any, ...]] = []
+        for index, delta in sorted(node_deltas.items()):
+            node = existing.get(node_id(index))
+            if node is None:
+                writes.append(("create", (self._node_document(household_id, index, dict(delta)),)))
+                continue
+            add_counters(node["counters"], delta)
+            if node["counters"]:
+                writes.append(("replace", (node["id"], node), {"if_match_etag": node["_etag"]}))
+            else:
+                writes.append(("delete", (node["id"],), {"if_match_etag": node["_etag"]}))
+        return writes
+
+    async def _count_range(self, household_id: str, start_date: date, end_date: date) -> Counters:
+        """Count the counters of a date range from its entries and ratings, grouped in Cosmos."""
+        plans_query = """
+        SELECT c.status, c.meal_id, c.serving_count, COUNT(1) AS count
+        FROM c
+        WHERE c.household_id = @household_id AND c.planned_date >= @start_date AND c.planned_date <= @end_date
+        GROUP BY c.status, c.meal_id, c.serving_count
+        """
+        # date_consumed is an ISO datetime, so the day after the range bounds it
+        ratings_query = """
+        SELECT c.rating, COUNT(1) AS count
+        FROM c
+        WHERE c.household_id = @household_id AND c.date_consumed >= @start_date AND c.date_consumed < @after_end_date
+        GROUP BY c.rating
+        """
+        params = [
+            {"name": "@household_id", "value": household_id},
+            {"name": "@start_date", "value": start_date.isoformat()},
+            {"name": "@end_date", "value": end_date.isoformat()},
+            {"name": "@after_end_date", "value": (end_date + timedelta(days=1)).isoformat()}
+        ]
+
+        async def rows(repository: HouseholdRepository, query: str) -> List[Dict[str, Any]]:
+            return [row async for row in repository.query(query, params, household_id)]
+
+        plan_rows, rating_rows = await asyncio.gather(
+            rows(meal_plans_repository, plans_query),
+            rows(meal_ratings_repository, ratings_query),
+        )
+        meals = await self._prepared_meals(household_id, plan_rows)
+        totals: Counters = {}
+        for row in plan_rows:
+            servings = (row.get("serving_count") or 0) * row["count"]
+            add_counters(totals, plan_counters(row.get("status"), row.get("meal_id"), meals.get(row.get("meal_id")), row["count"], servings))
+        for row in rating_rows:
+            add_counters(totals, rating_counters(row["rating"], row["count"]))
+        return totals
+
+    async def _rebuild(self, household_id: str) -> int:
+        """Recount every entry and rating of the household and return the number of days with activity."""
+        params = [{"name": "@household_id", "value": household_id}]
+        daily: Dict[date, Counters] = {}
+        contributions: List[Dict[str, Any]] = []
+
+        def count(kind: str, item_id: str, day: date, counters: Counters) -> None:
+            add_counters(daily.setdefault(day, {}), counters)
+            contributions.append(self._contribution_document(household_id, contribution_id(kind, item_id), day, counters))
+
+        # Only the fields the counters depend on
+        plans_query = """
+        SELECT c.id, c.planned_date, c.status, c.meal_id, c.serving_count
+        FROM c
+        WHERE c.household_id = @household_id
+        """
+        plan_rows = [row async for row in meal_plans_repository.query(plans_query, params, household_id)]
+        meals = await self._prepared_meals(household_id, plan_rows)
+        for row in plan_rows:
+            count(PLAN_CONTRIBUTION, row["id"], *plan_contribution(row, meals.get(row.get("meal_id"))))
+
+        ratings_query = "SELECT c.id, c.date_consumed, c.rating FROM c WHERE c.household_id = @household_id"
+        async for row in meal_ratings_repository.query(ratings_query, params, household_id):
+            count(RATING_CONTRIBUTION, row["id"], *rating_contribution(row))
+
+        existing_query = "SELECT c.id FROM c WHERE c.household_id = @household_id"
+        stale_ids = {row["id"] async for row in self.repository.query(existing_query, params, household_id)}
+
+        nodes: Dict[int, Counters] = {}
+        for day, counters in daily.items():
+            for index in update_indexes(day.toordinal()):
+                add_counters(nodes.setdefault(index, {}), counters)
+        documents = [self._node_document(household_id, index, counters) for index, counters in nodes.items() if counters]
+        documents.extend(contributions)
+        await self._write(household_id, [("upsert", (document,)) for document in documents])
+        # Including the documents of earlier rollup layouts
+        stale_ids.difference_update(document["id"] for document in documents)
+        stale_ids.discard(META_ID)
+        await self._write(household_id, [("delete", (item_id,)) for item_id in sorted(stale_ids)])
+
+        logger.info(
+            f"Rebuilt rollups of household {household_id} "
+            f"({len(daily)} days, {len(documents) - len(contributions)} nodes, {len(contributions)} contributions)"
+        )
+        return len(daily)
+
+    @staticmethod
+    def _node_document(household_id: str, index: int, counters: Counters) -> Dict[str, Any]:
+        return {
+            "id": node_id(index),
+            "pk": household_id,
+            "household_id": household_id,
+            "type": "node",
+            "index": index,
+            "counters": counters,
+        }
+
+    @staticmethod
+    def _contribution_document(household_id: str, item_id: str, day: date, counters: Counters) -> Dict[str, Any]:
+        return {
+            "id": item_id,
+            "pk": household_id,
+            "household_id": household_id,
+            "type": "contribution",
+            "day": day.isoformat(),
+            "counters": counters,
+        }
+
+
+meal_plan_rollups = RollupService(meal_plan_rollups_repository)
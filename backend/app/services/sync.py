@@ -0,0 +1,139 @@
+"""
+Delta sync of a household's meals, meal plan entries and ratings.
+
+A sync cursor is the highest Cosmos ``_ts`` (seconds) the client has seen.
+Changed documents are found with ``_ts >= cursor`` in each container;
+deletions leave a tombstone document in the ``tombstones`` container, which
+Cosmos expires after ``SYNC_TOMBSTONE_TTL_SECONDS``. A cursor older than
+that may have missed expired tombstones, so it gets a full snapshot instead.
+
+The comparison is inclusive because ``_ts`` only has second resolution: a
+write landing in the same second as the cursor must not be missed, at the
+cost of re-sending the documents of that second.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+from uuid import UUID
+
+from app.core.config import settings
+from app.db.repository import (
+    HouseholdRepository,
+    InvalidContinuationToken,
+    decode_continuation,
+    encode_continuation,
+    meal_plans_repository,
+    meal_ratings_repository,
+    meals_repository,
+    tombstones_repository,
+)
+from app.models.sync import SyncEntity
+
+logger = logging.getLogger(__name__)
+
+# Writes in flight while a sync runs can commit with a `_ts` slightly behind
+# the clock, so a cursor never gets closer than this to the present.
+CURSOR_LAG_SECONDS = 60
+
+SYNC_REPOSITORIES: Dict[SyncEntity, HouseholdRepository] = {
+    SyncEntity.MEAL: meals_repository,
+    SyncEntity.MEAL_PLAN: meal_plans_repository,
+    SyncEntity.MEAL_RATING: meal_ratings_repository,
+}
+
+
+def encode_cursor(since: int) -> str:
+    """Wrap a `_ts` high-water mark into an opaque cursor."""
+    return encode_continuation(json.dumps({"ts": since}))
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Return the `_ts` high-water mark of a cursor, or None without one."""
+    token = decode_continuation(cursor)
+    if token is None:
+        return None
+    try:
+        since = json.loads(token)["ts"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidContinuationToken("Invalid sync cursor") from e
+    if not isinstance(since, int):
+        raise InvalidContinuationToken("Invalid sync cursor")
+    return since
+
+
+def tombstone_id(entity: SyncEntity, item_id: Union[str, UUID]) -> str:
+    return f"{entity.value}:{item_id}"
+
+
+async def record_deletion(entity: SyncEntity, item_id: Union[str, UUID], household_id: Union[str, UUID]) -> None:
+    """Leave a tombstone for a deleted document so syncing clients drop it too.
+
+    Failures are logged rather than raised: the document is already gone, and
+    failing the request would not bring the tombstone back.
+    """
+    tombstone = {
+        "id": tombstone_id(entity, item_id),
+        "pk": str(household_id),
+        "household_id": str(household_id),
+        "entity": entity.value,
+        "item_id": str(item_id),
+        "deleted_at": datetime.utcnow().isoformat(),
+        "ttl": settings.SYNC_TOMBSTONE_TTL_SECONDS,
+    }
+    try:
+        await tombstones_repository.upsert(tombstone)
+    except Exception as e:
+        logger.error(f"Failed to record deletion of {entity.value} {item_id} for household {household_id}: {e}")
+
+
+async def _changed(repository: HouseholdRepository, household_id: str, since: int) -> List[Dict[str, Any]]:
+    query = "SELECT * FROM c WHERE c.household_id = @household_id AND c._ts >= @since"
+    params = [
+        {"name": "@household_id", "value": household_id},
+        {"name": "@since", "value": since},
+    ]
+    return [item async for item in repository.query(query, params, household_id)]
+
+
+async def changes_since(household_id: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """Collect the documents changed and deleted in a household since ``cursor``.
+
+    Returns the changed documents per entity, the tombstones, the next cursor
+    and whether the result is a full snapshot (``reset``). Raises
+    InvalidContinuationToken for a cursor we did not issue.
+    """
+    since = decode_cursor(cursor)
+    now = int(time.time())
+    reset = since is None or since < now - settings.SYNC_TOMBSTONE_TTL_SECONDS
+    if reset:
+        since = 0
+
+    entities = list(SYNC_REPOSITORIES)
+    lookups = [_changed(SYNC_REPOSITORIES[entity], household_id, since) for entity in entities]
+    if not reset:
+        lookups.append(_changed(tombstones_repository, household_id, since))
+    results = await asyncio.gather(*lookups)
+
+    changed = dict(zip(entities, results))
+    tombstones = results[len(entities)] if not reset else []
+
+    # A document re-created after its deletion is current again
+    present = {(entity.value, item["id"]) for entity, items in changed.items() for item in items}
+    deleted = [
+        {"entity": tombstone["entity"], "id": tombstone["item_id"], "deleted_at": tombstone["deleted_at"]}
+        for tombstone in tombstones
+        if (tombstone["entity"], tombstone["item_id"]) not in present
+    ]
+
+    # Everything committed before now - CURSOR_LAG_SECONDS was visible to the
+    # queries above, so the next sync starts there; newer documents are sent
+    # again rather than risk skipping one that commits late
+    return {
+        "cursor": encode_cursor(max(since, now - CURSOR_LAG_SECONDS)),
+        "reset": reset,
+        "changed": changed,
+        "deleted": deleted,
+    }
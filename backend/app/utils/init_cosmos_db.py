@@ -20,9 +20,15 @@ logger = logging.getLogger(__name__)
 # Define containers that need to be created
 CONTAINERS = [
     {"id": "users", "partition_key": "/id"},
-    {"id": "meals", "partition_key": "/id"},
-    {"id": "meal_plans", "partition_key": "/userId"},
-    {"id": "meal_ratings", "partition_key": "/mealId"},
+    {"id": "meals", "partition_key": "/pk"},
+    {"id": "meal_plans", "partition_key": "/pk"},
+    {"id": "meal_ratings", "partition_key": "/pk"},
+    {"id": "meal_plan_rollups", "partition_key": "/pk"},
+    {"id": "meal_plan_templates", "partition_key": "/pk"},
+    # Deletions for /sync, expired through their per-document ttl
+    {"id": "tombstones", "partition_key": "/pk", "default_ttl": -1},
+    # Change feed processor leases and checkpoints
+    {"id": "leases", "partition_key": "/pk"},
     # Add other containers as needed
 ]
 
@@ -37,7 +43,11 @@ def init_db():
             container_id = container_config["id"]
             partition_key = container_config["partition_key"]
             logger.info(f"Creating container: {container_id}")
-            cosmos_db.get_container(container_id=container_id, partition_key=partition_key)
+            cosmos_db.get_container(
+                container_id=container_id,
+                partition_key=partition_key,
+                default_ttl=container_config.get("default_ttl")
+            )
         logger.info("Database initialization complete!")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
@@ -0,0 +1,99 @@
+"""
+Utility script to move containers created on an older partition key to the
+one the application expects (see CONTAINERS in init_cosmos_db).
+
+Cosmos DB cannot change the partition key of a container, so every outdated
+container is copied to a staging container on the new key, dropped,
+recreated on the new key and filled from the staging container, which is
+then dropped. Stop the API while it runs. An interrupted run can be
+started again: documents are upserted, and a staging container left behind
+is copied back first.
+"""
+import logging
+import sys
+import os
+from typing import Any, Dict, Optional
+
+# Add the parent directory to the path so we can import our app modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from azure.cosmos import PartitionKey
+from azure.cosmos.exceptions import CosmosResourceNotFoundError
+
+from app.db.cosmos_db import cosmos_db
+from app.utils.init_cosmos_db import CONTAINERS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STAGING_SUFFIX = "-pk-migration"
+# Properties Cosmos DB sets on every document, which cannot be written back
+SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts")
+
+
+def read_properties(container_id: str) -> Any:
+    """Return the properties of a container, or None when it does not exist."""
+    try:
+        return cosmos_db.database.get_container_client(container_id).read()
+    except CosmosResourceNotFoundError:
+        return None
+
+
+def to_document(item: Dict[str, Any], container_id: str, partition_key: str) -> Dict[str, Any]:
+    document = {key: value for key, value in item.items() if key not in SYSTEM_PROPERTIES}
+    # Household documents written before `pk` was populated carry only household_id
+    if partition_key == "/pk" and not document.get("pk"):
+        document["pk"] = document.get("household_id")
+        if not document["pk"]:
+            raise ValueError(f"Document {document.get('id')} of {container_id} has neither pk nor household_id")
+    return document
+
+
+def copy_documents(source_id: str, target_id: str, partition_key: str, default_ttl: Optional[int] = None) -> int:
+    """Upsert every document of one container into another, created on ``partition_key`` if missing."""
+    source = cosmos_db.database.get_container_client(source_id)
+    target = cosmos_db.database.create_container_if_not_exists(
+        id=target_id,
+        partition_key=PartitionKey(path=partition_key),
+        default_ttl=default_ttl
+    )
+    copied = 0
+    for item in source.query_items(query="SELECT * FROM c", enable_cross_partition_query=True):
+        target.upsert_item(body=to_document(item, source_id, partition_key))
+        copied += 1
+    logger.info(f"Copied {copied} documents from {source_id} to {target_id}")
+    return copied
+
+
+def migrate_container(container_config: Dict[str, Any]) -> None:
+    container_id = container_config["id"]
+    partition_key = container_config["partition_key"]
+    default_ttl = container_config.get("default_ttl")
+    staging_id = container_id + STAGING_SUFFIX
+
+    properties = read_properties(container_id)
+    paths = properties.get("partitionKey", {}).get("paths", []) if properties else None
+    if properties is not None and paths != [partition_key]:
+        logger.info(f"Container {container_id} is partitioned on {', '.join(paths)}, moving it to {partition_key}")
+        copy_documents(container_id, staging_id, partition_key, default_ttl)
+        cosmos_db.database.delete_container(container_id)
+    if read_properties(staging_id) is not None:
+        copy_documents(staging_id, container_id, partition_key, default_ttl)
+        cosmos_db.database.delete_container(staging_id)
+        logger.info(f"Container {container_id} is now partitioned on {partition_key}")
+
+
+def migrate():
+    """Move every container of CONTAINERS that is on an outdated partition key."""
+    try:
+        cosmos_db.connect()
+        for container_config in CONTAINERS:
+            migrate_container(container_config)
+        logger.info("Partition key migration complete!")
+    except Exception as e:
+        logger.error(f"Failed to migrate partition keys: {e}")
+        raise
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,89 @@
+"""
+GET /meals served by validating the stored documents into response models,
+against FAST_LIST_RESPONSES, which projects them straight to JSON.
+
+Requests go through the whole application with a TestClient; the household
+is taken from an overridden get_token_data, so no token is needed.
+
+    python -m benchmarks.list_responses --meals 100 1000 10000
+"""
+import argparse
+import logging
+import os
+import time
+import uuid
+from typing import List, Tuple
+
+os.environ["STORAGE_BACKEND"] = "memory"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.oidc import TokenData, get_token_data  # noqa: E402
+from app.db.storage import storage  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.meal import MealDB  # noqa: E402
+
+
+def percentiles(times: List[float]) -> Tuple[float, float]:
+    times = sorted(times)
+    return times[len(times) // 2], times[min(len(times) - 1, int(len(times) * 0.99))]
+
+
+def requests_for(meals: int, requests: int) -> int:
+    # Enough for a p99 on small lists without spending minutes on large ones
+    return requests or max(10, min(200, 200_000 // meals))
+
+
+def run(client: TestClient, meals: int, requests: int) -> None:
+    household_id = str(uuid.uuid4())
+    app.dependency_overrides[get_token_data] = lambda: TokenData(sub=household_id)
+
+    async def seed() -> None:
+        container = await storage.get_container("meals", "/pk")
+        for i in range(meals):
+            meal = MealDB(
+                name=f"Meal {i}",
+                meal_type="dinner",
+                categories=["italian", "quick"],
+                notes="n" * 40,
+                calories_per_serving=500,
+                created_by=household_id,
+                household_id=household_id,
+            )
+            await container.create_item(meal.to_db())
+
+    client.portal.call(seed)
+    results = {}
+    for fast in (False, True):
+        settings.FAST_LIST_RESPONSES = fast
+        times = []
+        for _ in range(requests_for(meals, requests)):
+            started = time.perf_counter()
+            response = client.get(f"{settings.API_V1_STR}/meals/")
+            times.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+        results[fast] = percentiles(times)
+    print(
+        f"{meals:>6} meals: validated p50 {results[False][0]:6.1f} ms p99 {results[False][1]:6.1f} ms"
+        f" | fast p50 {results[True][0]:6.1f} ms p99 {results[True][1]:6.1f} ms"
+    )
+
+
+def main(args: argparse.Namespace) -> None:
+    logging.disable(logging.INFO)
+    fast_list_responses = settings.FAST_LIST_RESPONSES
+    try:
+        with TestClient(app) as client:
+            for meals in args.meals:
+                run(client, meals, args.requests)
+    finally:
+        settings.FAST_LIST_RESPONSES = fast_list_responses
+        app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--meals", type=int, nargs="+", default=[100, 1000, 10000], help="household sizes to list")
+    parser.add_argument("--requests", type=int, default=0, help="requests per variant; 0 scales them with the size")
+    main(parser.parse_args())
@@ -0,0 +1,100 @@
+"""
+Resolving the meals of meal plan entries: one point read per entry, as
+GET /meal-plans used to, against the single batched read it does now.
+
+Every Cosmos call is given ``--latency-ms`` of simulated round trip, since
+the in-memory backend answers without one and the number of round trips is
+what the batched read saves.
+
+    python -m benchmarks.meal_plan_meals --entries 100 --meals 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import date, timedelta
+
+os.environ["STORAGE_BACKEND"] = "memory"
+
+from app.db.diagnostics import cosmos_diagnostics  # noqa: E402
+from app.db.memory_db import InMemoryContainer  # noqa: E402
+from app.db.repository import meal_plans_repository, meals_repository  # noqa: E402
+from app.db.storage import storage  # noqa: E402
+from app.models.meal import MealDB  # noqa: E402
+from app.models.meal_plan import MealPlanEntryDB  # noqa: E402
+
+
+def add_latency(seconds: float) -> None:
+    """Delay every read of the in-memory containers by ``seconds``."""
+    read_item = InMemoryContainer.read_item
+    query_items = InMemoryContainer.query_items
+
+    async def slow_read_item(self, *args, **kwargs):
+        await asyncio.sleep(seconds)
+        return await read_item(self, *args, **kwargs)
+
+    async def slow_query_items(self, *args, **kwargs):
+        await asyncio.sleep(seconds)
+        async for item in query_items(self, *args, **kwargs):
+            yield item
+
+    InMemoryContainer.read_item = slow_read_item
+    InMemoryContainer.query_items = slow_query_items
+
+
+async def seed(household_id: str, entries: int, meals: int) -> None:
+    meal_ids = []
+    for i in range(meals):
+        meal = MealDB(name=f"Meal {i}", meal_type="dinner", created_by=household_id, household_id=household_id)
+        await meals_repository.create(meal.to_db())
+        meal_ids.append(meal.id)
+    for i in range(entries):
+        entry = MealPlanEntryDB(
+            meal_id=meal_ids[i % meals],
+            planned_date=date(2024, 1, 1) + timedelta(days=i % 28),
+            meal_type="dinner",
+            created_by=household_id,
+            household_id=household_id,
+        )
+        await meal_plans_repository.create(entry.to_db())
+
+
+async def per_entry(household_id: str, plans) -> None:
+    for plan in plans:
+        await meals_repository.get(plan["meal_id"], household_id, cached=False)
+
+
+async def batched(household_id: str, plans) -> None:
+    meals_repository.cache.clear()
+    await meals_repository.get_many((plan["meal_id"] for plan in plans), household_id)
+
+
+async def main(args: argparse.Namespace) -> None:
+    logging.disable(logging.INFO)
+    await storage.connect()
+    household_id = str(uuid.uuid4())
+    await seed(household_id, args.entries, args.meals)
+    add_latency(args.latency_ms / 1000)
+    plans = [plan async for plan in meal_plans_repository.query("SELECT * FROM c", [], household_id)]
+
+    print(f"{len(plans)} entries over {args.meals} meals, {args.latency_ms} ms per Cosmos call")
+    for name, resolve in (("per-entry reads", per_entry), ("batched read", batched)):
+        cosmos_diagnostics.reset()
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            await resolve(household_id, plans)
+            times.append((time.perf_counter() - started) * 1000)
+        calls = sum(call["calls"] for call in cosmos_diagnostics.snapshot()["calls"]) // args.repeat
+        print(f"{name:>16}: {calls:>4} Cosmos calls, {sorted(times)[len(times) // 2]:8.1f} ms (median of {args.repeat})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100, help="meal plan entries to resolve")
+    parser.add_argument("--meals", type=int, default=20, help="distinct meals they refer to")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated round trip per Cosmos call")
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,86 @@
+"""
+Building Meal models from Cosmos-shaped documents, with the key conversion
+of BaseSchema against the one it replaced, which ran two regex
+substitutions on every key of every nested dict.
+
+The replaced conversion is reproduced here as ``regex_keys``; the baseline
+runs it and then validates its already snake_case output, which is what the
+old validator amounted to.
+
+    python -m benchmarks.schema_keys --documents 1000
+"""
+import argparse
+import re
+import timeit
+import uuid
+from typing import Any, Dict, List
+
+from app.models.meal import Meal
+from app.schemas import camel_to_snake
+
+
+def regex_camel_to_snake(name: str) -> str:
+    s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
+    return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
+
+
+def regex_keys(data: Any) -> Any:
+    if isinstance(data, dict):
+        return {regex_camel_to_snake(key): regex_keys(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [regex_keys(item) for item in data]
+    return data
+
+
+def documents(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "pk": "household",
+            "name": f"Meal {i}",
+            "mealType": "dinner",
+            "categories": ["italian", "quick"],
+            "recipeId": None,
+            "notes": "Notes",
+            "servingCount": 2,
+            "caloriesPerServing": 400,
+            "preparationTimeMinutes": 20,
+            "isFavorite": False,
+            "customCategories": [],
+            "createdAt": 1700000000,
+            "updatedAt": 1700000000,
+            "createdBy": str(uuid.uuid4()),
+            "householdId": str(uuid.uuid4()),
+            "rating": 4,
+            "_etag": '"etag"',
+            "_ts": 1700000000,
+            "_rid": "rid",
+            "_self": "self",
+            "_attachments": "attachments/",
+        }
+        for i in range(count)
+    ]
+
+
+def main(args: argparse.Namespace) -> None:
+    camel = documents(args.documents)
+    snake = [{camel_to_snake(key): value for key, value in document.items()} for document in camel]
+    for name, data in (("camelCase", camel), ("snake_case", snake)):
+        timings = {}
+        for variant, build in (
+            ("regex keys", lambda data=data: [Meal(**regex_keys(document)) for document in data]),
+            ("BaseSchema", lambda data=data: [Meal(**document) for document in data]),
+        ):
+            timings[variant] = min(timeit.repeat(build, number=args.number, repeat=args.repeat)) / args.number * 1000
+        print(
+            f"{name:>10} documents: regex keys {timings['regex keys']:7.1f} ms, "
+            f"BaseSchema {timings['BaseSchema']:7.1f} ms per {args.documents}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--number", type=int, default=5, help="runs per timing")
+    parser.add_argument("--repeat", type=int, default=5, help="timings, of which the fastest is shown")
+    main(parser.parse_args())
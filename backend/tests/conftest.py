@@ -0,0 +1,4 @@
+import os
+
+# The repositories bind to the storage backend when they are imported
+os.environ["STORAGE_BACKEND"] = "memory"
@@ -0,0 +1,63 @@
+"""A local stand-in for an identity provider's JWKS endpoint."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from authlib.jose import JsonWebKey
+
+
+def generate_key(kid: str) -> Any:
+    """Return a new RSA signing key with the given `kid`."""
+    return JsonWebKey.generate_key("RSA", 2048, is_private=True, options={"kid": kid})
+
+
+def public_jwk(key: Any) -> Dict[str, Any]:
+    jwk = key.as_dict(is_private=False)
+    jwk["kid"] = key.kid
+    return jwk
+
+
+class JWKSServer:
+    """Serves a JWKS over HTTP on localhost and counts the downloads.
+
+    ``delay`` seconds are spent on every response, so concurrent callers
+    overlap with a download in flight. Replace ``keys`` to rotate them.
+    """
+
+    def __init__(self, keys: List[Any], delay: float = 0.0):
+        self.keys = keys
+        self.delay = delay
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.delay)
+                body = json.dumps({"keys": [public_jwk(key) for key in server.keys]}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def uri(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/discovery/v2.0/keys"
+
+    def start(self) -> "JWKSServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from app.core.jwks import JWKSCache, UnknownSigningKeyError
+from tests.jwks_server import JWKSServer, generate_key
+
+
+@pytest.fixture
+def jwks_server():
+    server = JWKSServer([generate_key("k1")], delay=0.2).start()
+    yield server
+    server.stop()
+
+
+@pytest.mark.asyncio
+async def test_cold_cache_concurrent_callers_share_one_download(jwks_server):
+    cache = JWKSCache(jwks_server.uri)
+    try:
+        keys = await asyncio.gather(*(cache.get_key("k1") for _ in range(20)))
+    finally:
+        await cache.close()
+
+    assert all(key is keys[0] for key in keys)
+    assert jwks_server.requests == 1
+    assert cache.stats()["refreshes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_refreshes_once_for_rotated_key(jwks_server):
+    cache = JWKSCache(jwks_server.uri, min_refresh_interval=0)
+    try:
+        await cache.get_key("k1")
+        jwks_server.keys = jwks_server.keys + [generate_key("k2")]
+
+        keys = await asyncio.gather(*(cache.get_key("k2") for _ in range(10)))
+    finally:
+        await cache.close()
+
+    assert all(key is keys[0] for key in keys)
+    assert jwks_server.requests == 2
+    assert cache.stats()["misses"] == 10
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_refresh_is_rate_limited(jwks_server):
+    cache = JWKSCache(jwks_server.uri, min_refresh_interval=60)
+    try:
+        await cache.get_key("k1")
+        for _ in range(3):
+            with pytest.raises(UnknownSigningKeyError):
+                await cache.get_key("missing")
+    finally:
+        await cache.close()
+
+    assert jwks_server.requests == 1
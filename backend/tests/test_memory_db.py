@@ -0,0 +1,159 @@
+import uuid
+
+import pytest
+import pytest_asyncio
+
+from app.db.memory_db import InMemoryDB
+from app.db.repository import HouseholdRepository, InvalidContinuationToken
+
+
+@pytest.fixture
+def household_id():
+    return str(uuid.uuid4())
+
+
+@pytest_asyncio.fixture
+async def repository(household_id):
+    repository = HouseholdRepository("meals", InMemoryDB())
+    other_household = str(uuid.uuid4())
+    documents = [
+        {"id": "a", "name": "Soup", "meal_type": "dinner", "categories": ["quick"], "rating": 4, "comments": "Good", "day": "2024-01-03"},
+        {"id": "b", "name": "Salad", "meal_type": "lunch", "categories": ["quick", "vegan"], "rating": 5, "comments": "", "day": "2024-01-01"},
+        {"id": "c", "name": "Stew", "meal_type": "dinner", "categories": [], "rating": 4, "day": "2024-01-05"},
+        {"id": "d", "name": "Curry", "meal_type": "dinner", "categories": ["vegan"], "rating": 3, "comments": "Spicy", "day": "2024-01-02"},
+        {"id": "e", "name": "Toast", "meal_type": "breakfast", "rating": 5, "comments": 7, "day": "2024-01-04"},
+    ]
+    for document in documents:
+        await repository.create({**document, "pk": household_id, "household_id": household_id})
+    await repository.create({**documents[0], "pk": other_household, "household_id": other_household})
+    return repository
+
+
+async def run(repository, query, **parameters):
+    """Run a query in the partition of its @household_id parameter."""
+    params = [{"name": f"@{name}", "value": value} for name, value in parameters.items()]
+    return [item async for item in repository.query(query, params, parameters["household_id"])]
+
+
+@pytest.mark.asyncio
+async def test_queries_are_scoped_to_the_household(repository, household_id):
+    items = await run(repository, "SELECT * FROM c WHERE c.household_id = @household_id", household_id=household_id)
+
+    assert sorted(item["id"] for item in items) == ["a", "b", "c", "d", "e"]
+    assert all(item["_etag"] and item["_ts"] for item in items)
+
+
+@pytest.mark.asyncio
+async def test_array_contains_with_parameter_array(repository, household_id):
+    items = await repository.get_many(["a", "c", "missing"], household_id)
+
+    assert sorted(items) == ["a", "c"]
+
+
+@pytest.mark.asyncio
+async def test_array_contains_on_document_array_and_equality(repository, household_id):
+    query = "SELECT * FROM c WHERE c.household_id = @household_id AND c.meal_type = @meal_type AND ARRAY_CONTAINS(c.categories, @category)"
+    items = await run(repository, query, household_id=household_id, meal_type="dinner", category="vegan")
+
+    # "e" has no categories at all, which is undefined rather than an error
+    assert [item["id"] for item in items] == ["d"]
+
+
+@pytest.mark.asyncio
+async def test_range_filter_with_projection(repository, household_id):
+    query = """
+    SELECT c.day, c.comments
+    FROM c
+    WHERE c.household_id = @household_id AND c.day >= @start AND c.day <= @end
+    """
+    items = await run(repository, query, household_id=household_id, start="2024-01-02", end="2024-01-05")
+
+    # Missing properties are left out of the projection
+    assert sorted(items, key=lambda item: item["day"]) == [
+        {"day": "2024-01-02", "comments": "Spicy"},
+        {"day": "2024-01-03", "comments": "Good"},
+        {"day": "2024-01-04", "comments": 7},
+        {"day": "2024-01-05"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_top_with_order_by_descending(repository, household_id):
+    query = """
+    SELECT TOP 1 c.name
+    FROM c
+    WHERE c.household_id = @household_id AND c.day <= @day
+    ORDER BY c.day DESC
+    """
+    items = await run(repository, query, household_id=household_id, day="2024-01-04")
+
+    assert items == [{"name": "Toast"}]
+
+
+@pytest.mark.asyncio
+async def test_type_checks_and_inequality_skip_undefined(repository, household_id):
+    query = """
+    SELECT TOP 5 c.comments
+    FROM c
+    WHERE c.household_id = @household_id
+    AND IS_STRING(c.comments)
+    AND c.comments != ''
+    ORDER BY c.day DESC
+    """
+    items = await run(repository, query, household_id=household_id)
+
+    assert items == [{"comments": "Good"}, {"comments": "Spicy"}]
+
+
+@pytest.mark.asyncio
+async def test_group_by_with_count(repository, household_id):
+    query = """
+    SELECT c.rating, COUNT(1) AS count
+    FROM c
+    WHERE c.household_id = @household_id
+    GROUP BY c.rating
+    """
+    items = await run(repository, query, household_id=household_id)
+
+    assert sorted(items, key=lambda item: item["rating"]) == [
+        {"rating": 3, "count": 1},
+        {"rating": 4, "count": 2},
+        {"rating": 5, "count": 2},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_timestamp_filter(repository, household_id):
+    items = await run(repository, "SELECT * FROM c WHERE c.household_id = @household_id", household_id=household_id)
+    since = max(item["_ts"] for item in items)
+
+    query = "SELECT * FROM c WHERE c.household_id = @household_id AND c._ts >= @since"
+    assert len(await run(repository, query, household_id=household_id, since=since)) == 5
+    assert await run(repository, query, household_id=household_id, since=since + 1) == []
+
+
+@pytest.mark.asyncio
+async def test_continuation_pages_cover_the_results_once(repository, household_id):
+    query = "SELECT * FROM c WHERE c.household_id = @household_id"
+    params = [{"name": "@household_id", "value": household_id}]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        items, cursor = await repository.query_page(query, params, household_id, page_size=2, continuation=cursor)
+        seen.extend(item["id"] for item in items)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert sorted(seen) == ["a", "b", "c", "d", "e"]
+    paged = [[item["id"] for item in page] async for page in repository.query_pages(query, params, household_id, page_size=2)]
+    assert [len(page) for page in paged] == [2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_foreign_continuation_is_rejected(repository, household_id):
+    params = [{"name": "@household_id", "value": household_id}]
+
+    with pytest.raises(InvalidContinuationToken):
+        await repository.query_page("SELECT * FROM c WHERE c.household_id = @household_id", params, household_id, page_size=2, continuation="not a cursor!")
@@ -0,0 +1,51 @@
+import uuid
+
+import pytest
+
+from app.db.diagnostics import cosmos_diagnostics
+from app.db.repository import meal_ratings_repository, meals_repository
+from app.models.meal import MealDB
+from app.models.meal_rating import MealRatingDB
+from app.services.rating_aggregates import RatingDelta, apply_rating_delta, read_rating_seed
+
+
+async def rate(meal, household_id, value):
+    rating = MealRatingDB(meal_id=meal.id, rating=value, user_id=household_id, household_id=household_id)
+    await meal_ratings_repository.create(rating.to_db())
+    return rating
+
+
+async def aggregates(meal, household_id):
+    stored = await meals_repository.get(meal.id, household_id, cached=False)
+    return stored["rating_count"], stored["rating_sum"], stored["rating"]
+
+
+@pytest.mark.asyncio
+async def test_writes_are_counted_once_whenever_their_delta_arrives():
+    household_id = str(uuid.uuid4())
+    meal = MealDB(name="Soup", meal_type="dinner", created_by=household_id, household_id=household_id)
+    await meals_repository.create(meal.to_db())
+
+    # A rating whose delta is held up until after another write seeded the meal
+    seed = await read_rating_seed(meal.id, household_id)
+    first = await rate(meal, household_id, 4)
+    await apply_rating_delta(meal.id, household_id, RatingDelta({}, {None}))
+    assert await aggregates(meal, household_id) == (1, 4, 4)
+    await apply_rating_delta(meal.id, household_id, RatingDelta({4: 1}, {seed}))
+    assert await aggregates(meal, household_id) == (1, 4, 4)
+
+    # A rating made under the current seed is added without counting again
+    seed = await read_rating_seed(meal.id, household_id)
+    await rate(meal, household_id, 5)
+    cosmos_diagnostics.reset()
+    await apply_rating_delta(meal.id, household_id, RatingDelta({5: 1}, {seed}))
+    assert await aggregates(meal, household_id) == (2, 9, 4)
+    operations = {(call["container"], call["operation"]) for call in cosmos_diagnostics.snapshot()["calls"]}
+    assert ("meal_ratings", "query") not in operations
+
+    # A deletion whose delta arrives after a newer seed already left it out
+    seed = await read_rating_seed(meal.id, household_id)
+    await meal_ratings_repository.delete(first.id, household_id)
+    await apply_rating_delta(meal.id, household_id, RatingDelta({}, {None}))
+    await apply_rating_delta(meal.id, household_id, RatingDelta({4: -1}, {seed}))
+    assert await aggregates(meal, household_id) == (1, 5, 5)
@@ -0,0 +1,26 @@
+import uuid
+
+import pytest
+
+from app.db.memory_db import InMemoryDB
+from app.db.repository import CachedHouseholdRepository
+from app.utils.cache import TTLCache
+
+
+@pytest.mark.asyncio
+async def test_delete_drops_document_read_while_deleting():
+    repository = CachedHouseholdRepository("meals", TTLCache(max_size=10, ttl_seconds=60), InMemoryDB())
+    household_id = str(uuid.uuid4())
+    await repository.create({"id": "meal", "pk": household_id, "name": "Soup"})
+    container = await repository.container()
+    delete_item = container.delete_item
+
+    async def delete_after_read(*args, **kwargs):
+        # A request reading the document between the invalidation and the delete
+        assert await repository.get("meal", household_id) is not None
+        await delete_item(*args, **kwargs)
+
+    container.delete_item = delete_after_read
+    await repository.delete("meal", household_id)
+
+    assert await repository.get("meal", household_id) is None
@@ -0,0 +1,136 @@
+import asyncio
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.db.diagnostics import cosmos_diagnostics
+from app.db.repository import meal_plan_rollups_repository, meal_plans_repository, meal_ratings_repository, meals_repository
+from app.models.meal import MealDB
+from app.models.meal_plan import MealPlanEntryDB
+from app.models.meal_rating import MealRatingDB
+from app.services.jobs import job_queue
+from app.services.rollups import META_ID, TREE_DEPTH, meal_plan_rollups
+
+WRITE_OPERATIONS = {"create", "upsert", "replace", "patch", "delete", "batch"}
+
+
+async def seed(household_id):
+    meal = MealDB(name="Soup", meal_type="dinner", categories=["quick"], calories_per_serving=300, created_by=household_id, household_id=household_id)
+    await meals_repository.create(meal.to_db())
+    for planned_date, status in ((date(2024, 1, 1), "prepared"), (date(2024, 1, 1), "prepared"), (date(2024, 1, 2), "skipped")):
+        entry = MealPlanEntryDB(
+            meal_id=meal.id,
+            planned_date=planned_date,
+            meal_type="dinner",
+            status=status,
+            serving_count=2,
+            created_by=household_id,
+            household_id=household_id,
+        )
+        await meal_plans_repository.create(entry.to_db())
+    rating = MealRatingDB(meal_id=meal.id, rating=4, date_consumed=datetime(2024, 1, 1, 19), user_id=household_id, household_id=household_id)
+    await meal_ratings_repository.create(rating.to_db())
+    return meal
+
+
+@pytest.mark.asyncio
+async def test_statistics_do_not_wait_for_a_held_lock():
+    household_id = str(uuid.uuid4())
+    meal = await seed(household_id)
+    # Another worker holds the lock, e.g. while building the rollups
+    await meal_plan_rollups_repository.create({
+        "id": META_ID,
+        "pk": household_id,
+        "household_id": household_id,
+        "type": "meta",
+        "built_at": None,
+        "locked_by": "other",
+        "locked_until": time.time() + 60,
+    })
+
+    totals = await asyncio.wait_for(meal_plan_rollups.get_range_totals(household_id, date(2024, 1, 1), date(2024, 1, 7)), 1)
+
+    expected = {
+        "total": 3,
+        "status:prepared": 2,
+        "status:skipped": 1,
+        f"meal:{meal.id}": 2,
+        "category:quick": 2,
+        "calories": 1200,
+        "rating_count": 1,
+        "rating_sum": 4,
+    }
+    assert totals == expected
+
+    # Once the lock is free the queued build runs and the rollups agree
+    await meal_plan_rollups_repository.delete(META_ID, household_id)
+    job_queue.start()
+    await job_queue.stop()
+    assert await meal_plan_rollups.is_built(household_id)
+    assert await meal_plan_rollups.get_range_totals(household_id, date(2024, 1, 1), date(2024, 1, 7)) == expected
+    assert await meal_plan_rollups.get_range_totals(household_id, date(2024, 1, 2), date(2024, 1, 2)) == {"total": 1, "status:skipped": 1}
+
+
+@pytest.mark.asyncio
+async def test_recounts_keep_range_totals_exact_and_write_few_nodes():
+    household_id = str(uuid.uuid4())
+    meal = await seed(household_id)
+    rng = random.Random(7)
+    statuses = ["planned", "prepared", "skipped", "replaced"]
+
+    def random_day():
+        return date(2022, 1, 1) + timedelta(days=rng.randrange(730))
+
+    entries = []
+    for _ in range(150):
+        entry = MealPlanEntryDB(
+            meal_id=meal.id,
+            planned_date=random_day(),
+            meal_type="dinner",
+            status=rng.choice(statuses),
+            serving_count=rng.randint(1, 4),
+            created_by=household_id,
+            household_id=household_id,
+        )
+        await meal_plans_repository.create(entry.to_db())
+        entries.append(entry)
+    await meal_plan_rollups.get_range_totals(household_id, date(2022, 1, 1), date(2023, 12, 31))
+    job_queue.start()
+    await job_queue.stop()
+
+    for entry in rng.sample(entries, 40):
+        updated = entry.model_copy(update={"planned_date": random_day(), "status": rng.choice(statuses)})
+        await meal_plans_repository.replace(updated.to_db())
+        await meal_plan_rollups.record_plan_change(household_id, entry, updated)
+    for entry in rng.sample(entries, 10):
+        await meal_plans_repository.delete(entry.id, household_id)
+        await meal_plan_rollups.record_plan_change(household_id, entry, None)
+    job_queue.start()
+    await job_queue.stop()
+
+    for _ in range(30):
+        start_date = random_day()
+        end_date = start_date + timedelta(days=rng.randrange(400))
+        assert await meal_plan_rollups.get_range_totals(household_id, start_date, end_date) == \
+            await meal_plan_rollups._count_range(household_id, start_date, end_date)
+
+    # Moving one entry costs the nodes above its old and new day, not the history after them
+    cosmos_diagnostics.reset()
+    entry = MealPlanEntryDB(**await meal_plans_repository.get(entries[-1].id, household_id))
+    moved = entry.model_copy(update={"planned_date": date(2022, 1, 1), "status": "prepared"})
+    await meal_plans_repository.replace(moved.to_db())
+    await meal_plan_rollups.record_plan_change(household_id, entry, moved)
+    job_queue.start()
+    await job_queue.stop()
+
+    written = sum(
+        call["items"] if call["operation"] == "batch" else call["calls"]
+        for call in cosmos_diagnostics.snapshot()["calls"]
+        if call["container"] == "meal_plan_rollups" and call["operation"] in WRITE_OPERATIONS
+    )
+    assert 0 < written <= 2 * (TREE_DEPTH + 1) + 1
+    assert await meal_plan_rollups.get_range_totals(household_id, date(2022, 1, 1), date(2023, 12, 31)) == \
+        await meal_plan_rollups._count_range(household_id, date(2022, 1, 1), date(2023, 12, 31))
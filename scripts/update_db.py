@@ -13,9 +13,13 @@ DATABASE_ID = os.getenv("COSMOSDB_DATABASE_ID", "foodpal-dev")
 
 CONTAINERS = [
     {"id": "users", "partition_key": "/id"},
-    {"id": "meals", "partition_key": "/id"},
-    {"id": "meal_plans", "partition_key": "/userId"},
-    {"id": "meal_ratings", "partition_key": "/mealId"},
+    {"id": "meals", "partition_key": "/pk"},
+    {"id": "meal_plans", "partition_key": "/pk"},
+    {"id": "meal_ratings", "partition_key": "/pk"},
+    {"id": "meal_plan_rollups", "partition_key": "/pk"},
+    {"id": "meal_plan_templates", "partition_key": "/pk"},
+    {"id": "tombstones", "partition_key": "/pk", "default_ttl": -1},
+    {"id": "leases", "partition_key": "/pk"},
 ]
 
 def main():
@@ -27,10 +31,19 @@ def main():
 
     for container in CONTAINERS:
         try:
-            db.create_container_if_not_exists(
+            created = db.create_container_if_not_exists(
                 id=container["id"],
-                partition_key=partition_key.PartitionKey(path=container["partition_key"])
+                partition_key=partition_key.PartitionKey(path=container["partition_key"]),
+                default_ttl=container.get("default_ttl")
             )
+            # An existing container keeps its partition key; it has to be migrated
+            paths = created.read().get("partitionKey", {}).get("paths", [])
+            if paths != [container["partition_key"]]:
+                print(
+                    f"Container '{container['id']}' is partitioned on {', '.join(paths)} instead of "
+                    f"{container['partition_key']}; run `python -m app.utils.migrate_partition_keys` from backend/."
+                )
+                continue
             print(f"Container '{container['id']}' created or already exists.")
         except Exception as e:
             print(f"Failed to create container '{container['id']}': {e}")